@@ -3,30 +3,21 @@ Extract, Display, and Convert Atom Flight Logs
 """
 
 import toga
-from toga.style.pack import COLUMN, ROW, LEFT, RIGHT
+from toga.style.pack import COLUMN, Pack
 
 import mwhlogging
-from mwhlogging import mwhLogger 
+from fcdocument import FCDocument
 
 class AtomDataViewer(toga.App):
 
-	home = (40.1310941,-75.4461272)
-	drone = (40.1210654, -75.466978)
-
+	# File > Open (added by Toga for the document types) opens each log in
+	# its own FCDocument window. Until one is open, the main window only
+	# says how.
 	def startup(self):
-		self.map_view = toga.MapView(location=self.home)
-		self.map_view.pins.add(toga.MapPin(self.home,title="home"))
-		self.map_view.pins.add(toga.MapPin(self.drone,title="drone"))
-
-		self.table_view = toga.Table(headings=["A","B","C","D"])
-
-		container = toga.OptionContainer()
-		container.content.append("Map", self.map_view)
-		container.content.append("Table", self.table_view)
-
-		self.main_window = toga.MainWindow(title=self.formal_name, size=(800,600))
-		self.main_window.content = container
+		hint = toga.Label("Open a flight log (.fc2) with File > Open.", style=Pack(margin=20))
+		self.main_window = toga.MainWindow(title=self.formal_name, size=(400,120))
+		self.main_window.content = toga.Box(children=[hint], style=Pack(direction=COLUMN))
 		self.main_window.show()
 
 def main():
-	return AtomDataViewer()
+	return AtomDataViewer(document_types=[FCDocument])
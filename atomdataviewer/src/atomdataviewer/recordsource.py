@@ -0,0 +1,53 @@
+"""
+A Toga data source for the records of a flight log, decoded as they are shown
+"""
+
+from toga.sources import Source
+
+import fc2pages
+
+# One row of the table. The cells are looked up when the table draws them,
+# so making a row decodes nothing.
+class RecordRow:
+
+	def __init__(self, source, n):
+		self._source = source
+		self._n = n
+
+	def __getattr__(self, accessor):
+		column = self._source.columns.get(accessor)
+		if column == None:
+			raise AttributeError(accessor)
+		return self._source.records.row(self._n)[column]
+
+# The rows of an fc2pages.PagedRecords, for toga.Table(data=...). The
+# columns are named "field0", "field1" and so on, since several headings
+# would make the same accessor.
+class RecordSource(Source):
+
+	def __init__(self, records):
+		super().__init__()
+		self.records = records
+		self.headings = records.headings
+		self.accessors = [f"field{i}" for i in range(len(self.headings))]
+		self.columns = {accessor: i for i, accessor in enumerate(self.accessors)}
+
+	def __len__(self):
+		return len(self.records)
+
+	def __getitem__(self, index):
+		if index < 0:
+			index += len(self.records)
+		if index < 0 or index >= len(self.records):
+			raise IndexError(f"Row {index} is not in {self.records.fileName}")
+		return RecordRow(self, index)
+
+	def __iter__(self):
+		for n in range(len(self.records)):
+			yield RecordRow(self, n)
+
+	def index(self, row):
+		return row._n
+
+	def close(self):
+		self.records.close()
@@ -1,7 +1,147 @@
+"""
+A flight log opened in its own window, decoded in the background
+"""
+
+import asyncio
 import toga
+from toga.style.pack import COLUMN, ROW, Pack
+
+import fc2pages
+import fc2track
+from atomdataviewer.recordsource import RecordSource
+from mwhlogging import mwhLogger
+
+# Most track points to put on the map at once; each one is a pin.
+MAX_TRACK_PINS = 300
 
-class FCDocument(toga.document):
+# The map starts this far in; enough to see a whole flight.
+START_ZOOM = 16
+
+# The table is ready as soon as the file is mapped (see fc2pages), so the
+# window shows straight away. The positions for the map are decoded a chunk
+# of records at a time in a worker thread, and each chunk's part of the
+# path is drawn as soon as it is done, with the progress bar showing how far
+# along it is. Stop, or closing the window, cancels whatever is left.
+class FCDocument(toga.Document):
 	description = "Potensic Atom FC file."
 	extensions = [ "fc", "fc2" ]
 
 	def create(self):
+		self.records = None
+		self.track = None
+		self.marks = []
+		self.home = None
+		self.task = None
+
+		self.map_view = toga.MapView(zoom=START_ZOOM)
+		self.table_view = toga.Table(headings=["Loading"], style=Pack(flex=1))
+		self.table_box = toga.Box(children=[self.table_view], style=Pack(direction=COLUMN, flex=1))
+		container = toga.OptionContainer(style=Pack(flex=1))
+		container.content.append("Map", self.map_view)
+		container.content.append("Table", self.table_box)
+
+		self.progress = toga.ProgressBar(max=1, style=Pack(flex=1))
+		self.status = toga.Label("", style=Pack(margin_left=8))
+		self.stop_button = toga.Button("Stop", on_press=self.stop, style=Pack(margin_left=8))
+		status_bar = toga.Box(children=[self.progress, self.status, self.stop_button], style=Pack(direction=ROW, margin=4))
+
+		self.main_window = toga.DocumentMainWindow(doc=self, size=(800,600), on_close=self.on_close)
+		self.main_window.content = toga.Box(children=[container, status_bar], style=Pack(direction=COLUMN))
+		self.main_window.toolbar.add(
+			toga.Command(self.zoom_in, text="Zoom In", shortcut=toga.Key.MOD_1 + "="),
+			toga.Command(self.zoom_out, text="Zoom Out", shortcut=toga.Key.MOD_1 + "-"))
+
+	def read(self):
+		self.task = self.app.loop.create_task(self.load(str(self.path)))
+
+	async def load(self, fileName):
+		loop = asyncio.get_running_loop()
+		self.records = await loop.run_in_executor(None, fc2pages.PagedRecords, fileName)
+		flight = self.records.flight
+		self.show_table()
+		self.progress.max = max(flight.count, 1)
+		self.progress.start()
+		self.status.text = f"{flight.count} records"
+
+		chunks = flight.chunks([fc2track.LAT, fc2track.LON])
+		lat = []
+		lon = []
+		try:
+			while True:
+				part = await loop.run_in_executor(None, next, chunks, None)
+				if part == None:
+					break
+				records, columns = part
+				lat.append(columns[fc2track.LAT])
+				lon.append(columns[fc2track.LON])
+				partial = await loop.run_in_executor(None, fc2track.Track, lat[-1], lon[-1])
+				self.draw_partial(partial, records, flight.count)
+				self.progress.value = records.stop
+			self.track = await loop.run_in_executor(None, fc2track.Track, fc2track.concatenate(lat), fc2track.concatenate(lon))
+			self.marks = await loop.run_in_executor(None, fc2track.event_marks, self.track, flight)
+		except asyncio.CancelledError:
+			self.status.text = f"Stopped after {sum(len(part) for part in lat)} of {flight.count} records"
+			mwhLogger.info(f"Stopped loading {fileName}.")
+			raise
+		finally:
+			self.progress.stop()
+			self.stop_button.enabled = False
+		self.status.text = f"{flight.count} records, {len(self.track)} positions, {len(self.marks)} events"
+		mwhLogger.info(f"{flight.count} records, {len(self.track)} positions in {fileName}.")
+		self.draw_map()
+
+	# Stop decoding; what is already drawn stays.
+	def stop(self, widget, **kwargs):
+		if self.task != None:
+			self.task.cancel()
+
+	def on_close(self, window, **kwargs):
+		self.stop(window)
+		if self.records != None:
+			self.records.close()
+		return True
+
+	def show_table(self):
+		source = RecordSource(self.records)
+		self.table_view = toga.Table(headings=source.headings, accessors=source.accessors,
+			data=source, style=Pack(flex=1))
+		self.table_box.clear()
+		self.table_box.add(self.table_view)
+
+	# Add the part of the path in one chunk of records (a Track of just
+	# those) while the rest is still being decoded. Each chunk gets its share
+	# of MAX_TRACK_PINS.
+	def draw_partial(self, partial, records, count):
+		if len(partial) == 0:
+			return
+		if self.home == None:
+			self.home = partial.position(0)
+			self.map_view.location = self.home
+			self.map_view.pins.add(toga.MapPin(self.home, title="start"))
+		share = max(2, MAX_TRACK_PINS * len(records) // count)
+		tolerance, index = partial.for_zoom(self.map_view.zoom, share)
+		for n, location in zip(partial.record_numbers(index), partial.points(index)):
+			self.map_view.pins.add(toga.MapPin(location, title="track", subtitle=f"record {records.start + n}"))
+
+	# The track is drawn at the level of detail that suits the zoom (see
+	# fc2track), so it is drawn again whenever the zoom changes.
+	def zoom_in(self, command, **kwargs):
+		self.map_view.zoom = min(self.map_view.zoom + 1, 20)
+		self.draw_map()
+
+	def zoom_out(self, command, **kwargs):
+		self.map_view.zoom = max(self.map_view.zoom - 1, 0)
+		self.draw_map()
+
+	# Pin the start, the events and the track, once it is all decoded.
+	def draw_map(self):
+		if self.track == None or len(self.track) == 0:
+			return
+		self.map_view.pins.clear()
+		self.map_view.pins.add(toga.MapPin(self.home, title="start"))
+		for name, n, location in self.marks:
+			self.map_view.pins.add(toga.MapPin(location, title=name, subtitle=f"record {n}"))
+		tolerance, index = self.track.for_zoom(self.map_view.zoom, MAX_TRACK_PINS)
+		for n, location in zip(self.track.record_numbers(index), self.track.points(index)):
+			self.map_view.pins.add(toga.MapPin(location, title="track", subtitle=f"record {n}"))
+		mwhLogger.debug(f"Drew {len(index)} of {len(self.track)} track points, to {tolerance} m.")
@@ -9,12 +9,27 @@ import argparse
 import sys
 import struct
 import math
+import socket
 import datetime
+import concurrent.futures
 import mwhlogging
+import fc2archive
+import fc2cache
+import fc2csv
+import fc2decode
+import fc2derived
+import fc2flight
+import fc2manifest
+import fc2parallel
+import fc2reader
+import fc2resample
+import fc2seek
+import fc2segment
+import fc2sinks
+import fc2stats
+import fc2validate
 from mwhlogging import mwhLogger
 
-timeStamp: float
-
 class FLFD:
     def __init__(self, name, fmt_string, start_pos, length, scale=None):
         # This will be the header in the CSV. If it uses specific units, include
@@ -31,12 +46,9 @@ class FLFD:
 
     # radians to decimal degrees.
     def _r2d(data) -> float:
-        result = round((360 + data * 180/math.pi) % 360, 3)
-        if math.isnan(result):
-            # TODO: Figure out better handling of bad records.
-            mwhLogger.critical(f"Bad heading value {data} found.");
-            sys.exit(-1)
-        return result
+        # A NaN stays NaN, just as in fc2decode; fc2validate weeds out
+        # its record unless --no-validate is given.
+        return round((360 + data * 180/math.pi) % 360, 3)
 
     # Atom 2 use integers to store the decimal lat/long with 7 digits of precision.
     def _fix_lat_lon(data) -> float:
@@ -48,12 +60,12 @@ class FLFD:
     def _fix_alt(data) -> float:
         return abs(round(data,3))
 
-    # Convert the relative timestamp to an absolute timestamp.
-    def _fix_time(data) -> str:
-        global timeStamp
-        if timeStamp == None:
+    # Convert the relative timestamp to an absolute timestamp. The base time
+    # comes from the AtomContext of the file being converted.
+    def _fix_time(data, ctx) -> str:
+        if ctx == None or ctx.timeStamp == None:
             return None # error case.
-        dt = timeStamp + data/1000
+        dt = ctx.timeStamp + data/1000
         return dt
 
     def _flight_mode(data) -> str:
@@ -97,13 +109,16 @@ class FLFD:
     def _hex_dump8(data) -> str:
         return f"{data:016x}"
 
-    def getField(self,record) -> str:
-        data = struct.unpack(self.fmt_string,record[self.start_pos:self.start_pos+self.length])
+    def getField(self,record,ctx=None) -> str:
+        # unpack_from works in place on bytes or a memoryview of the record.
+        data = struct.unpack_from(self.fmt_string,record,self.start_pos)
         if data == ():
             return None
         data = data[0]
         if isinstance(self.scale,int) or isinstance(self.scale,float):
             data = data * self.scale
+        elif self.scale == FLFD._fix_time:
+            data = FLFD._fix_time(data, ctx)
         elif self.scale != None:
             data = self.scale(data)
         return data
@@ -148,71 +163,364 @@ ATOM2_FORMAT = [
 
 ATOM_RECORD_LEN = 512
 
-def atom_parse(fieldList, fileName):
-    global timeStamp
-    baseName = os.path.basename(fileName)
-    baseName, extension = os.path.splitext(baseName)
-    timeStamp = datetime.datetime.strptime(re.sub("-.*", "", baseName), "%Y%m%d%H%M%S").timestamp()*1000
-    csv_name=f"{baseName}.csv"
+# The drone mode and return to home fields. They are decoded along with the
+# fieldList and combined into the one "Drone Mode (text)" column.
+def atom_extra_fields() -> list:
+    return [FLFD("Drone Mode (text)", "<B", 456, 1, FLFD._drone_mode),
+            FLFD("Return to Home", "<B", 429,1)] # !0 if RTH is active.
+
+# Everything that is specific to converting one file. Keeping this out of
+# module globals lets several files be converted at the same time.
+class AtomContext:
+    def __init__(self, fileName):
+        self.fileName = fileName
+        baseName = os.path.basename(fileName)
+        baseName, extension = os.path.splitext(baseName)
+        self.baseName = baseName
+        # The file name is the time the log was started.
+        self.timeStamp = datetime.datetime.strptime(re.sub("-.*", "", baseName), "%Y%m%d%H%M%S").timestamp()*1000
+        self.rCount = 0
+        self.eCount = 0
+
+# Turn a row from the compiled decoder (fieldList plus the drone mode and RTH
+# fields) into a CSV row. Returns None for a bad record.
+def atom_row(fieldList, row):
+    for flfd, data in zip(fieldList, row):
+        if data == None:
+            mwhLogger.warning(f"Illegal value for {flfd.name}. Skipping.")
+            return None
 
-    mwhLogger.debug(f"Creating {csv_name}.")
+    # We combine these two fields into one.
+    dmode, rthome = row[-2:]
+    if rthome != 0 and dmode == "Flying":
+        dmode = "RTH"
+    return row[:-2] + (dmode,)
+
+# Add the derived fields in extra to the decoded columns of fields, then
+# resample them all if rate is given. Returns the fields to write and their
+# columns.
+def finish_columns(fields, columns, extra, rate, stats=None):
+    if len(extra) > 0:
+        with fc2stats.phase(stats, "derive"):
+            columns.update(fc2derived.derive(columns, extra))
+        fields = fields + extra
+    if rate != None:
+        with fc2stats.phase(stats, "resample"):
+            columns = fc2resample.resample(fields, columns, rate)
+    return fields, columns
+
+# Decode fileName and write <baseName>.csv. outputFormat can also name other
+# fc2sinks formats, comma separated (e.g. "csv,gpx,geojson"); they are all
+# written from the same decode. With outputFormat "columns" the decoded
+# columns are written to a <baseName>.columns directory instead (see
+# fc2cache). If cacheDir is set, decoded columns are cached there. If stats
+# (an fc2stats.Stats) is given, it is filled in with timings. window is a
+# (start, end) pair of fc2seek.parse_time() limits; only the records between
+# them are decoded. With derived, the fc2derived fields are added to the
+# output. If rate is given, the output is resampled to that many records a
+# second (see fc2resample). Derived fields and resampling require NumPy.
+# With chunks > 1, a big log is decoded in that many processes (see
+# fc2parallel). With validate, bad records are left out and listed in
+# <baseName>.quarantine.csv (see fc2validate).
+def atom_parse(fieldList, fileName, cacheDir=None, outputFormat="csv", stats=None, window=None, rate=None, derived=False, chunks=1, validate=True) -> AtomContext:
+    ctx = AtomContext(fileName)
+    if window != None:
+        # The cache holds whole files.
+        cacheDir = None
 
+    # These fields require special handling.
+    dm, rth = atom_extra_fields()
+    extra = fc2derived.available(fieldList) if derived else []
+
+    if outputFormat == "columns":
+        cols_name = f"{ctx.baseName}.columns"
+        mwhLogger.debug(f"Creating {cols_name}.")
+        with fc2stats.phase(stats, "read"):
+            flight = fc2flight.load_flight(fileName, fieldList + [dm, rth], window, cacheDir, stats, jobs=chunks)
+        with flight:
+            keep, ctx.eCount = fc2validate.check(flight, ctx.baseName, stats) if validate else (None, 0)
+            with fc2stats.phase(stats, "decode"):
+                columns = flight.columns([flfd.name for flfd in fieldList + [dm]])
+                if keep is not None:
+                    columns = fc2validate.select(columns, keep)
+            fields, columns = finish_columns(fieldList + [dm], columns, extra, rate, stats)
+            with fc2stats.phase(stats, "write"):
+                fc2cache.save_columns(cols_name, fields, columns)
+        ctx.rCount = len(columns[dm.name])
+        mwhLogger.info(f"{ctx.rCount} valid records in {cols_name}. {ctx.eCount} bad records in file.")
+        if stats != None:
+            stats.finish(ctx.rCount, flight.count * ATOM_RECORD_LEN)
+        return ctx
+
+    headings = [flfd.name for flfd in fieldList + [dm] + extra]
     try:
-        csv_file = open(csv_name, mode="w")
+        sinks = fc2sinks.FanOut(outputFormat.split(","), ctx.baseName, headings, ctx.timeStamp, stats)
     except:
-        mwhLogger.critical(f"Unable to create {csv_name}. Terminating.")
+        mwhLogger.critical(f"Unable to create the {outputFormat} output for {ctx.baseName}. Terminating.")
         sys.exit(-1)
+    out_names = ", ".join(sinks.file_names())
+    mwhLogger.debug(f"Creating {out_names}.")
 
-    # These fields require special handling.
-    dm = FLFD("Drone Mode (text)", "<B", 456, 1, FLFD._drone_mode)
-    rth = FLFD("Return to Home", "<B", 429,1) # !0 if RTH is active.
-
-    header=""
-    for flfd in fieldList:
-        header+=f"{flfd.name}, "
-    header+=f"{dm.name}"
-    print(header, file=csv_file)
+    with fc2stats.phase(stats, "read"):
+        flight = fc2flight.load_flight(fileName, fieldList + [dm, rth], window, cacheDir, stats, jobs=chunks)
 
-    with open(fileName, mode="rb") as flight_file:
+    with flight, sinks:
         rCount = 0
-        eCount = 0
-
-        while True:
-            record = flight_file.read(ATOM_RECORD_LEN)
-            if len(record) < 512:
-                break
-            rCount += 1
-
-            line=""
-            error = 0
-            for flfd in fieldList:
-                #mwhLogger.debug(f"extracting {flfd.name}")
-                data = flfd.getField(record)
-                if data == None:
-                    mwhLogger.warning(f"Illegal value for {flfd.name}. Skipping.")
-                    error = 1
+        keep, eCount = fc2validate.check(flight, ctx.baseName, stats) if validate else (None, 0)
+
+        if outputFormat == "csv" and len(extra) == 0 and rate == None and cacheDir == None and flight.can_split():
+            # Each worker decodes and formats its own part of the log.
+            with fc2stats.phase(stats, "decode"):
+                rCount, bad = fc2parallel.write_csv(fileName, fieldList + [dm, rth], fieldList + [dm], sinks, flight.count, chunks, keep)
+            eCount += bad
+        elif fc2decode.HAVE_NUMPY:
+            # Decode the whole file (or window) as columns and write it column by column.
+            with fc2stats.phase(stats, "decode"):
+                columns = flight.columns([flfd.name for flfd in fieldList + [dm]])
+                if keep is not None:
+                    columns = fc2validate.select(columns, keep)
+            fields, columns = finish_columns(fieldList + [dm], columns, extra, rate, stats)
+            with fc2stats.phase(stats, "format"):
+                # Only the columns that some sink wants are formatted.
+                sinks.write({flfd.name: fc2decode.column_values(flfd, columns[flfd.name])
+                             for flfd in fields if flfd.name in sinks.fields})
+            rCount = len(columns[dm.name])
+        else:
+            # Decode each record with a single precompiled struct.
+            for row in flight.rows(keep):
+                row = atom_row(fieldList, row)
+                if row == None:
                     eCount += 1
-                    break
-                line=line+f"{data}, "
+                else:
+                    sinks.write_row(row)
+                    rCount += 1
+
+    mwhLogger.info(f"{rCount} valid records in {out_names}. {eCount} bad records in file.")
+    ctx.rCount = rCount
+    ctx.eCount = eCount
+    if stats != None:
+        stats.finish(rCount, flight.count * ATOM_RECORD_LEN)
+    return ctx
+
+# Decode fileName once and write each flight in it to its own file (or
+# files), <baseName>-<flight>.csv (or .columns, .gpx...), along with an
+# index of the flights in <baseName>.flights.json. See fc2segment for how
+# flights are found. With trim, the records where the motors are off and the
+# drone is idle are left out. The other arguments are as for atom_parse();
+# derived fields and resampling are done for each flight on its own.
+def atom_split(fieldList, fileName, cacheDir=None, outputFormat="csv", stats=None, window=None, trim=False, rate=None, derived=False, chunks=1, validate=True) -> AtomContext:
+    ctx = AtomContext(fileName)
+    if window != None:
+        # The cache holds whole files.
+        cacheDir = None
 
-            if error == 0:
-                # We combine these two fields into one.
-                dmode = dm.getField(record)
-                rthome = rth.getField(record)
-                if rthome != 0 and dmode == "Flying":
-                    dmode = "RTH"
-                line += f"{dmode}"
-
-                print(line, file=csv_file)
+    # These fields require special handling.
+    dm, rth = atom_extra_fields()
+    extra = fc2derived.available(fieldList) if derived else []
+    headings = [flfd.name for flfd in fieldList + [dm] + extra]
+
+    with fc2stats.phase(stats, "read"):
+        log = fc2flight.load_flight(fileName, fieldList + [dm, rth], window, cacheDir, stats, jobs=chunks)
+
+    with log:
+        keep, ctx.eCount = fc2validate.check(log, ctx.baseName, stats) if validate else (None, 0)
+        with fc2stats.phase(stats, "decode"):
+            flights, active = fc2segment.find_flights(log.source)
+            if fc2decode.HAVE_NUMPY:
+                columns = log.columns([flfd.name for flfd in fieldList + [dm]])
+        if len(flights) == 0:
+            mwhLogger.warning(f"No flights found in {fileName}.")
+
+        for flight in flights:
+            records = fc2segment.flight_records(flight, active, trim)
+            if keep is not None:
+                records = fc2validate.keep_records(records, keep)
+            flightName = f"{ctx.baseName}-{flight['flight']}"
+            if fc2decode.HAVE_NUMPY:
+                part = {flfd.name: columns[flfd.name][records] for flfd in fieldList + [dm]}
+                fields, part = finish_columns(fieldList + [dm], part, extra, rate, stats)
+                written = len(part[dm.name])
+            if outputFormat == "columns":
+                flight["outputs"] = [f"{flightName}.columns"]
+                mwhLogger.debug(f"Creating {flight['outputs'][0]}.")
+                with fc2stats.phase(stats, "write"):
+                    fc2cache.save_columns(flight["outputs"][0], fields, part)
+            else:
+                with fc2sinks.FanOut(outputFormat.split(","), flightName, headings, ctx.timeStamp, stats) as sinks:
+                    flight["outputs"] = sinks.file_names()
+                    mwhLogger.debug(f"Creating {', '.join(flight['outputs'])}.")
+                    if fc2decode.HAVE_NUMPY:
+                        with fc2stats.phase(stats, "format"):
+                            sinks.write({flfd.name: fc2decode.column_values(flfd, part[flfd.name])
+                                         for flfd in fields if flfd.name in sinks.fields})
+                    else:
+                        written = 0
+                        for n in records:
+                            row = atom_row(fieldList, log.row(n))
+                            if row == None:
+                                ctx.eCount += 1
+                            else:
+                                sinks.write_row(row)
+                                written += 1
+            ctx.rCount += written
+            mwhLogger.info(f"Flight {flight['flight']} (counter {flight['counter']}): {written} records in {', '.join(flight['outputs'])}.")
+
+    with fc2stats.phase(stats, "write"):
+        fc2segment.save_index(f"{ctx.baseName}.flights.json", fileName, flights)
+    mwhLogger.info(f"{len(flights)} flights, {ctx.rCount} valid records from {fileName}. {ctx.eCount} bad records in file.")
+    if stats != None:
+        stats.finish(ctx.rCount, log.count * ATOM_RECORD_LEN)
+    return ctx
+
+# Convert a log that is still being written, like "tail -f". Each record is
+# written out as soon as it is complete: to <baseName>.csv, to stdout if
+# target is "-" or to a TCP connection if target is "host:port". Rows are
+# flushed after every poll, so they are never more than interval seconds
+# late. Stops after idleTimeout seconds without new records, or on Ctrl-C.
+def atom_follow(fieldList, fileName, target=None, interval=0.25, idleTimeout=None) -> AtomContext:
+    ctx = AtomContext(fileName)
 
-    mwhLogger.info(f"{rCount} valid records in {csv_name}. {eCount} bad records in file.")
+    # These fields require special handling.
+    dm, rth = atom_extra_fields()
+    names = [flfd.name for flfd in fieldList]
+    # Used to show how far into the flight the log has got.
+    elapsed = names.index("elapsed (ms)") if "elapsed (ms)" in names else None
+
+    headings = names + [dm.name]
+    connection = None
+    if target == None:
+        out_name = f"{ctx.baseName}.csv"
+        csv_file = fc2csv.CSVWriter(out_name, headings)
+    elif target == "-":
+        out_name = "stdout"
+        csv_file = fc2csv.CSVWriter(out_name, headings, csv_file=sys.stdout)
+    else:
+        out_name = target
+        host, port = target.rsplit(":", 1)
+        connection = socket.create_connection((host, int(port)))
+        csv_file = fc2csv.CSVWriter(out_name, headings, csv_file=connection.makefile(mode="w"))
+        csv_file.owned = True
+
+    mwhLogger.info(f"Following {fileName}, writing to {out_name}. Press Ctrl-C to stop.")
+    decode = fc2decode.compile_schema(fieldList + [dm, rth], ctx)
+    try:
+        with csv_file:
+            for records in fc2reader.follow_records(fileName, ATOM_RECORD_LEN, interval, idleTimeout):
+                for record in records:
+                    row = atom_row(fieldList, decode(record))
+                    if row == None:
+                        ctx.eCount += 1
+                    else:
+                        csv_file.write_row(row)
+                        ctx.rCount += 1
+                csv_file.flush()
+                if elapsed != None and row != None:
+                    mwhLogger.debug(f"{ctx.rCount} records, flight log is at {row[elapsed]} ms.")
+    except KeyboardInterrupt:
+        pass
+    except (BrokenPipeError, ConnectionError) as e:
+        mwhLogger.error(f"Lost {out_name}: {e}")
+    finally:
+        if connection != None:
+            connection.close()
+
+    mwhLogger.info(f"{ctx.rCount} valid records in {out_name}. {ctx.eCount} bad records in file.")
+    return ctx
+
+# The names of the files (or directory) that atom_parse() writes for
+# fileName, one per output format. For atom_split() this is the flight index.
+def output_names(fileName, outputFormat="csv", split=False) -> list:
+    baseName, extension = os.path.splitext(os.path.basename(fileName))
+    if split:
+        return [f"{baseName}.flights.json"]
+    return [f"{baseName}.{name}" for name in outputFormat.split(",")]
+
+# The options that change what is written for a log, for the manifest. A
+# log that was converted with different ones is converted again.
+def output_options(args) -> dict:
+    return {"split": args.split, "trim": args.trim, "rate": args.rate, "derived": args.derived,
+            "validate": not args.no_validate}
+
+# Convert fileName with atom_parse(), or with atom_split() if options has
+# "split" set. The rest of options are passed on.
+def convert(fileName, options, stats=None) -> AtomContext:
+    options = dict(options)
+    if options.pop("split", False):
+        return atom_split(ATOM2_FORMAT, fileName, stats=stats, **options)
+    options.pop("trim", None)
+    return atom_parse(ATOM2_FORMAT, fileName, stats=stats, **options)
+
+# Convert one file, in a worker process or not. options are passed on to
+# convert(). Failures are returned rather than raised so that one bad log
+# doesn't stop the rest of the batch.
+def convert_file(fileName, logLevel, options, wantStats=False):
+    mwhLogger.setLevel(logLevel)
+    mwhLogger.info(f"Parsing {fileName} as an Atom2 log file.")
+    stats = fc2stats.Stats(fileName) if wantStats else None
+    try:
+        ctx = convert(fileName, options, stats)
+    except SystemExit:
+        return (fileName, 0, 0, "conversion aborted", None)
+    except Exception as e:
+        return (fileName, 0, 0, f"{type(e).__name__}: {e}", None)
+    if stats != None:
+        fc2stats.report(stats.to_dict())
+        stats = stats.to_dict()
+    return (fileName, ctx.rCount, ctx.eCount, None, stats)
+
+# Fan the files out over a pool of worker processes. Returns the list of
+# files that could not be converted and the stats of the ones that were.
+def convert_parallel(files, jobs, options, wantStats=False):
+    rTotal = 0
+    eTotal = 0
+    failed = []
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(convert_file, f, mwhLogger.level, options, wantStats): f for f in files}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                fileName, rCount, eCount, error, stats = future.result()
+            except Exception as e:
+                # The worker itself died.
+                fileName, rCount, eCount, error, stats = futures[future], 0, 0, f"{type(e).__name__}: {e}", None
+            if error != None:
+                mwhLogger.error(f"Unable to convert {fileName}: {error}")
+                failed.append(fileName)
+            else:
+                rTotal += rCount
+                eTotal += eCount
+            if stats != None:
+                results.append(stats)
+
+    mwhLogger.info(f"{len(files) - len(failed)} of {len(files)} files converted. {rTotal} valid records, {eTotal} bad records.")
+    return failed, results
 
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Convert Potensic Flight Log files to Telemetry Overlay format.",
         epilog="Written by Michael Heinz, based on information provided by potdrownflightparser by koen-arts.")
     parser.add_argument("-l","--log", type=int, help="Set log level. 0=error, higher values increase logging.", default=2)
-    parser.add_argument("files", nargs="+", help="One or more FlightLog files to convert.")
+    parser.add_argument("-j","--jobs", type=int, help="Convert this many files at once. 0=one per CPU.", default=1)
+    parser.add_argument("--chunks", type=int, metavar="N", help="Decode each log in N record-aligned parts at once, in worker processes. 0=one per CPU. Helps with long logs.", default=1)
+    parser.add_argument("-c","--cache", action="store_const", const=fc2cache.CACHE_DIR, help=f"Cache decoded logs in {fc2cache.CACHE_DIR}. Requires NumPy.")
+    parser.add_argument("--cache-dir", dest="cache", help="Cache decoded logs in this directory instead. Requires NumPy.")
+    parser.add_argument("-f","--format", help=f"Comma separated output formats: {', '.join(fc2sinks.SINKS)}. Or columns, for a directory of .npy columns (requires NumPy).", default="csv")
+    parser.add_argument("-i","--incremental", action="store_true", help=f"Only convert logs that are new or have changed since the last run. Uses {fc2manifest.MANIFEST_NAME}.")
+    parser.add_argument("--force", action="store_true", help="Convert every log, even if it hasn't changed, and update the manifest.")
+    parser.add_argument("--stats", action="store_true", help="Report where the time goes, per phase and per field.")
+    parser.add_argument("--stats-json", metavar="JSON", help="Also save the --stats numbers to this JSON file.")
+    parser.add_argument("--from", dest="start", type=fc2seek.parse_time, metavar="TIME", help="Only convert the records from this time on: elapsed ms, a time of day (HH:MM:SS.s) or a date and time.")
+    parser.add_argument("--to", dest="end", type=fc2seek.parse_time, metavar="TIME", help="Only convert the records up to this time. Same formats as --from.")
+    parser.add_argument("-r","--rate", type=fc2resample.parse_rate, metavar="HZ", help="Resample the output to this many records a second, e.g. 10 or a video frame rate like 30000/1001. Requires NumPy.")
+    parser.add_argument("-d","--derived", action="store_true", help="Add power, battery use, distance travelled, vertical speed and ground speed to the output. Requires NumPy.")
+    parser.add_argument("-s","--split", action="store_true", help="Write each flight in a log to its own file, with an index of the flights in <log>.flights.json.")
+    parser.add_argument("--trim", action="store_true", help="With --split, leave out the records where the motors are off and the drone is idle.")
+    parser.add_argument("--no-validate", action="store_true", help=f"Write every record, even ones that fail the sanity checks. Normally they are left out and listed in <log>{fc2validate.QUARANTINE_SUFFIX}.")
+    parser.add_argument("-F","--follow", action="store_true", help="Keep converting a log that is still being written, like tail -f.")
+    parser.add_argument("--send", metavar="TARGET", help="With --follow, write rows to stdout (-) or a TCP connection (host:port) instead of the CSV file.")
+    parser.add_argument("--interval", type=float, help="With --follow, how often to check for new records, in seconds.", default=0.25)
+    parser.add_argument("--idle", type=float, help="With --follow, stop after this many seconds without new records. Default is to keep going until Ctrl-C.")
+    parser.add_argument("files", nargs="+", help="One or more FlightLog files to convert. Zip, tar and gzip archives are read without extracting them.")
     args = parser.parse_args()
 
     match args.log:
@@ -225,22 +533,111 @@ def main() -> None:
         case _:
             mwhLogger.setLevel(mwhlogging.DEBUG)
 
-    print(f"Atom Flight Log to Telemetry Overlay Converter.")
+    # Keep stdout clean when the CSV rows are going there.
+    print(f"Atom Flight Log to Telemetry Overlay Converter.", file=sys.stderr if args.send == "-" else sys.stdout)
+
+    formats = args.format.split(",")
+    for name in formats:
+        if name != "columns" and name not in fc2sinks.SINKS:
+            mwhLogger.error(f"Unknown output format {name}.")
+            sys.exit(-1)
+    if "columns" in formats and len(formats) > 1:
+        mwhLogger.error(f"The columns format can't be combined with other formats.")
+        sys.exit(-1)
 
-    for f in args.files:
+    if not fc2decode.HAVE_NUMPY:
+        if args.format == "columns":
+            mwhLogger.error(f"Columnar output requires NumPy.")
+            sys.exit(-1)
+        if args.rate != None or args.derived:
+            mwhLogger.error(f"Resampling and derived fields require NumPy.")
+            sys.exit(-1)
+        if args.cache != None:
+            mwhLogger.warning(f"Caching requires NumPy. Not using {args.cache}.")
+            args.cache = None
+
+    # Files that can't be converted are skipped, and make the exit status
+    # -1 once the rest are done.
+    files = []
+    failed = []
+    for f in fc2archive.expand_paths(args.files):
         baseName, extension = os.path.splitext(f)
-        if not os.path.exists(f):
+        if not fc2archive.exists(f):
             mwhLogger.error(f"{f} does not exist.")
-            sys.exit(-1)
+            failed.append(f)
         elif extension == ".fc2":
-            mwhLogger.info(f"Parsing {f} as an Atom2 log file.")
-            atom_parse(ATOM2_FORMAT, f)
+            files.append(f)
         elif extension == ".fc":
             mwhLogger.error(f"Sorry, I can't handle Atom1 log files yet. Can't parse {f}.")
-            sys.exit(-1)
+            failed.append(f)
         else:
-            mwhLogger.info(f"{f} appears to be an unsupported file type.")
+            mwhLogger.error(f"{f} appears to be an unsupported file type.")
+            failed.append(f)
+
+    if args.jobs != 1 and args.chunks != 1 and len(files) > 1:
+        mwhLogger.error(f"--jobs and --chunks can't be used together.")
+        sys.exit(-1)
+
+    window = None
+    if args.start != None or args.end != None:
+        window = (args.start, args.end)
+        if args.follow or args.incremental or args.force:
+            mwhLogger.error(f"--from and --to can't be used with --follow or --incremental.")
+            sys.exit(-1)
+
+    if args.follow:
+        if len(files) != 1:
+            mwhLogger.error(f"--follow works on exactly one log file.")
+            sys.exit(-1)
+        if fc2archive.is_member(files[0]):
+            mwhLogger.error(f"Can't follow {files[0]}, it is in an archive.")
             sys.exit(-1)
+        atom_follow(ATOM2_FORMAT, files[0], args.send, args.interval, args.idle)
+        return
+
+    manifest = None
+    if args.incremental or args.force:
+        manifest = fc2manifest.Manifest()
+        schema = fc2cache.schema_version(ATOM2_FORMAT)
+        settings = output_options(args)
+        if not args.force:
+            todo = [f for f in files if not manifest.is_current(f, schema, output_names(f, args.format, args.split), settings)]
+            mwhLogger.info(f"Skipping {len(files) - len(todo)} unchanged logs.")
+            files = todo
+
+    options = {"cacheDir": args.cache, "outputFormat": args.format, "window": window, "split": args.split, "trim": args.trim, "rate": args.rate, "derived": args.derived, "chunks": fc2parallel.job_count(args.chunks), "validate": not args.no_validate}
+    wantStats = args.stats or args.stats_json != None
+    results = []
+    try:
+        if args.jobs == 1 or len(files) <= 1:
+            for f in files:
+                fileName, rCount, eCount, error, stats = convert_file(f, mwhLogger.level, options, wantStats)
+                if error != None:
+                    mwhLogger.error(f"Unable to convert {f}: {error}")
+                    failed.append(f)
+                    continue
+                if stats != None:
+                    results.append(stats)
+                if manifest != None:
+                    manifest.record(f, schema, output_names(f, args.format, args.split), settings)
+        else:
+            errors, results = convert_parallel(files, args.jobs if args.jobs > 0 else None, options, wantStats)
+            failed += errors
+            if manifest != None:
+                for f in files:
+                    if f not in errors:
+                        manifest.record(f, schema, output_names(f, args.format, args.split), settings)
+    finally:
+        if manifest != None:
+            manifest.save()
+
+    if wantStats and len(results) > 1:
+        fc2stats.report(fc2stats.summarize(results))
+    if args.stats_json != None:
+        fc2stats.save_json(args.stats_json, results)
+
+    if len(failed) > 0:
+        sys.exit(-1)
 
 if __name__ == '__main__':
     main()
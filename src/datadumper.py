@@ -11,10 +11,18 @@ import struct
 import math
 import datetime
 import mwhlogging
+import fc2analysis
+import fc2archive
+import fc2cache
+import fc2csv
+import fc2decode
+import fc2flight
+import fc2parallel
+import fc2seek
+import fc2stats
+import fc2validate
 from mwhlogging import mwhLogger
 
-timeStamp: float
-
 class FLFD:
     def __init__(self, name, fmt_string, start_pos, length, scale=None):
         # This will be the header in the CSV. If it uses specific units, include
@@ -31,12 +39,9 @@ class FLFD:
 
     # radians to decimal degrees.
     def _r2d(data) -> float:
-        result = round((360 + data * 180/math.pi) % 360, 3)
-        if math.isnan(result):
-            # TODO: Figure out better handling of bad records.
-            mwhLogger.critical(f"Bad heading value {data} found.");
-            sys.exit(-1)
-        return result
+        # A NaN stays NaN, just as in fc2decode; fc2validate weeds out
+        # its record unless --no-validate is given.
+        return round((360 + data * 180/math.pi) % 360, 3)
 
     # Atom 2 use integers to store the decimal lat/long with 7 digits of precision.
     def _fix_lat_lon(data) -> float:
@@ -48,12 +53,12 @@ class FLFD:
     def _fix_alt(data) -> float:
         return abs(round(data,3))
 
-    # Convert the relative timestamp to an absolute timestamp.
-    def _fix_time(data) -> str:
-        global timeStamp
-        if timeStamp == None:
+    # Convert the relative timestamp to an absolute timestamp. The base time
+    # comes from the AtomContext of the file being converted.
+    def _fix_time(data, ctx) -> str:
+        if ctx == None or ctx.timeStamp == None:
             return None # error case.
-        dt = timeStamp + data/1000
+        dt = ctx.timeStamp + data/1000
         return dt
 
     def _flight_mode(data) -> str:
@@ -103,13 +108,16 @@ class FLFD:
     def _round2(data):
         return round(data*100)/100;
 
-    def getField(self,record) -> str:
-        data = struct.unpack(self.fmt_string,record[self.start_pos:self.start_pos+self.length])
+    def getField(self,record,ctx=None) -> str:
+        # unpack_from works in place on bytes or a memoryview of the record.
+        data = struct.unpack_from(self.fmt_string,record,self.start_pos)
         if data == ():
             return None
         data = data[0]
         if isinstance(self.scale,int) or isinstance(self.scale,float):
             data = data * self.scale
+        elif self.scale == FLFD._fix_time:
+            data = FLFD._fix_time(data, ctx)
         elif self.scale != None:
             data = self.scale(data)
         return data
@@ -179,71 +187,133 @@ ATOM2_FORMAT = [
 
 ATOM_RECORD_LEN = 512
 
-def atom_parse(fieldList, fileName):
-    global timeStamp
-    baseName = os.path.basename(fileName)
-    baseName, extension = os.path.splitext(baseName)
-    timeStamp = datetime.datetime.strptime(re.sub("-.*", "", baseName), "%Y%m%d%H%M%S").timestamp()*1000
-    csv_name=f"{baseName}.csv"
+# Everything that is specific to converting one file. Keeping this out of
+# module globals lets several files be converted at the same time.
+class AtomContext:
+    def __init__(self, fileName):
+        self.fileName = fileName
+        baseName = os.path.basename(fileName)
+        baseName, extension = os.path.splitext(baseName)
+        self.baseName = baseName
+        # The file name is the time the log was started.
+        self.timeStamp = datetime.datetime.strptime(re.sub("-.*", "", baseName), "%Y%m%d%H%M%S").timestamp()*1000
+        self.rCount = 0
+        self.eCount = 0
+
+# Decode fileName and write <baseName>.csv. With outputFormat "columns" the
+# decoded columns are written to a <baseName>.columns directory instead (see
+# fc2cache). If cacheDir is set, decoded columns are cached there. If stats
+# (an fc2stats.Stats) is given, it is filled in with timings. window is a
+# (start, end) pair of fc2seek.parse_time() limits; only the records between
+# them are decoded. With chunks > 1, a big log is decoded in that many
+# processes (see fc2parallel). With validate, bad records are left out and
+# listed in <baseName>.quarantine.csv (see fc2validate).
+def atom_parse(fieldList, fileName, cacheDir=None, outputFormat="csv", stats=None, window=None, chunks=1, validate=True) -> AtomContext:
+    ctx = AtomContext(fileName)
+    if window != None:
+        # The cache holds whole files.
+        cacheDir = None
+
+    # These fields require special handling.
+    dm = FLFD("Drone Mode (text)", "<B", 456, 1, FLFD._drone_mode)
+    rth = FLFD("Return to Home", "<B", 429,1) # !0 if RTH is active.
 
+    if outputFormat == "columns":
+        cols_name = f"{ctx.baseName}.columns"
+        mwhLogger.debug(f"Creating {cols_name}.")
+        with fc2stats.phase(stats, "read"):
+            flight = fc2flight.load_flight(fileName, fieldList + [dm, rth], window, cacheDir, stats, jobs=chunks)
+        with flight:
+            keep, ctx.eCount = fc2validate.check(flight, ctx.baseName, stats) if validate else (None, 0)
+            with fc2stats.phase(stats, "decode"):
+                columns = flight.columns([flfd.name for flfd in fieldList + [dm]])
+                if keep is not None:
+                    columns = fc2validate.select(columns, keep)
+            with fc2stats.phase(stats, "write"):
+                fc2cache.save_columns(cols_name, fieldList + [dm], columns)
+        ctx.rCount = len(columns[dm.name])
+        mwhLogger.info(f"{ctx.rCount} valid records in {cols_name}. {ctx.eCount} bad records in file.")
+        if stats != None:
+            stats.finish(ctx.rCount, flight.count * ATOM_RECORD_LEN)
+        return ctx
+
+    csv_name=f"{ctx.baseName}.csv"
     mwhLogger.debug(f"Creating {csv_name}.")
 
     try:
-        csv_file = open(csv_name, mode="w")
+        csv_file = fc2csv.CSVWriter(csv_name, [flfd.name for flfd in fieldList] + [dm.name], stats=stats)
     except:
         mwhLogger.critical(f"Unable to create {csv_name}. Terminating.")
         sys.exit(-1)
 
-    # These fields require special handling.
-    dm = FLFD("Drone Mode (text)", "<B", 456, 1, FLFD._drone_mode)
-    rth = FLFD("Return to Home", "<B", 429,1) # !0 if RTH is active.
+    with fc2stats.phase(stats, "read"):
+        flight = fc2flight.load_flight(fileName, fieldList + [dm, rth], window, cacheDir, stats, jobs=chunks)
 
-    header=""
-    for flfd in fieldList:
-        header+=f"{flfd.name}, "
-    header+=f"{dm.name}"
-    print(header, file=csv_file)
-
-    with open(fileName, mode="rb") as flight_file:
+    with flight, csv_file:
         rCount = 0
-        eCount = 0
-
-        while True:
-            record = flight_file.read(ATOM_RECORD_LEN)
-            if len(record) < 512:
-                break
-            rCount += 1
-
-            line=""
-            error = 0
-            for flfd in fieldList:
-                #mwhLogger.debug(f"extracting {flfd.name}")
-                data = flfd.getField(record)
-                if data == None:
-                    mwhLogger.warning(f"Illegal value for {flfd.name}. Skipping.")
-                    error = 1
-                    eCount += 1
-                    break
-                line=line+f"{data}, "
-
-            if error == 0:
-                # We combine these two fields into one.
-                dmode = dm.getField(record)
-                rthome = rth.getField(record)
-                if rthome != 0 and dmode == "Flying":
-                    dmode = "RTH"
-                line += f"{dmode}"
-
-                print(line, file=csv_file)
+        keep, eCount = fc2validate.check(flight, ctx.baseName, stats) if validate else (None, 0)
+
+        if cacheDir == None and flight.can_split():
+            # Each worker decodes and formats its own part of the log.
+            with fc2stats.phase(stats, "decode"):
+                rCount, bad = fc2parallel.write_csv(fileName, fieldList + [dm, rth], fieldList + [dm], csv_file, flight.count, chunks, keep)
+            eCount += bad
+        elif fc2decode.HAVE_NUMPY:
+            # Decode the whole file (or window) as columns and write it column by column.
+            with fc2stats.phase(stats, "decode"):
+                columns = flight.columns([flfd.name for flfd in fieldList + [dm]])
+                if keep is not None:
+                    columns = fc2validate.select(columns, keep)
+                dmodes = columns[dm.name].tolist()
+            with fc2stats.phase(stats, "format"):
+                values = [fc2decode.column_values(flfd, columns[flfd.name]) for flfd in fieldList]
+                csv_file.write_columns(values + [dmodes])
+            rCount = len(dmodes)
+        else:
+            # Decode each record with a single precompiled struct.
+            for row in flight.rows(keep):
+                error = 0
+                for flfd, data in zip(fieldList, row):
+                    if data == None:
+                        mwhLogger.warning(f"Illegal value for {flfd.name}. Skipping.")
+                        error = 1
+                        eCount += 1
+                        break
+
+                if error == 0:
+                    # We combine these two fields into one.
+                    dmode, rthome = row[-2:]
+                    if rthome != 0 and dmode == "Flying":
+                        dmode = "RTH"
+                    csv_file.write_row(row[:-2] + (dmode,))
+                    rCount += 1
 
     mwhLogger.info(f"{rCount} valid records in {csv_name}. {eCount} bad records in file.")
+    ctx.rCount = rCount
+    ctx.eCount = eCount
+    if stats != None:
+        stats.finish(rCount, flight.count * ATOM_RECORD_LEN)
+    return ctx
 
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Convert Potensic Flight Log files to Telemetry Overlay format.",
         epilog="Written by Michael Heinz, based on information provided by potdrownflightparser by koen-arts.")
     parser.add_argument("-l","--log", type=int, help="Set log level. 0=error, higher values increase logging.", default=2)
-    parser.add_argument("files", nargs="+", help="One or more FlightLog files to convert.")
+    parser.add_argument("--chunks", type=int, metavar="N", help="Decode each log in N record-aligned parts at once, in worker processes. 0=one per CPU. Helps with long logs.", default=1)
+    parser.add_argument("-c","--cache", action="store_const", const=fc2cache.CACHE_DIR, help=f"Cache decoded logs in {fc2cache.CACHE_DIR}. Requires NumPy.")
+    parser.add_argument("--cache-dir", dest="cache", help="Cache decoded logs in this directory instead. Requires NumPy.")
+    parser.add_argument("-f","--format", choices=["csv","columns"], help="Write a CSV file, or a directory of .npy columns. Columns require NumPy.", default="csv")
+    parser.add_argument("--stats", action="store_true", help="Report where the time goes, per phase and per field.")
+    parser.add_argument("--stats-json", metavar="JSON", help="Also save the --stats numbers to this JSON file.")
+    parser.add_argument("--from", dest="start", type=fc2seek.parse_time, metavar="TIME", help="Only dump the records from this time on: elapsed ms, a time of day (HH:MM:SS.s) or a date and time.")
+    parser.add_argument("--to", dest="end", type=fc2seek.parse_time, metavar="TIME", help="Only dump the records up to this time. Same formats as --from.")
+    parser.add_argument("--no-validate", action="store_true", help=f"Dump every record, even ones that fail the sanity checks. Normally they are left out and listed in <log>{fc2validate.QUARANTINE_SUFFIX}.")
+    parser.add_argument("-a","--analyze", action="store_true", help="Instead of dumping each file, compute per-offset statistics over all of them. Requires NumPy.")
+    parser.add_argument("--sample", type=int, help="With --analyze, use at most this many records from each file.", default=5000)
+    parser.add_argument("--target", action="append", help=f"With --analyze, a known field to correlate the unknown bytes against. Can be repeated. Default: {', '.join(fc2analysis.ANALYSIS_TARGETS)}.")
+    parser.add_argument("--prefix", help="With --analyze, the prefix of the output files.", default="analysis")
+    parser.add_argument("files", nargs="+", help="One or more FlightLog files to convert. Zip, tar and gzip archives are read without extracting them.")
     args = parser.parse_args()
 
     match args.log:
@@ -258,21 +328,66 @@ def main() -> None:
 
     print(f"Atom Flight Log to Telemetry Overlay Converter.")
 
-    for f in args.files:
+    if not fc2decode.HAVE_NUMPY:
+        if args.format == "columns":
+            mwhLogger.error(f"Columnar output requires NumPy.")
+            sys.exit(-1)
+        if args.cache != None:
+            mwhLogger.warning(f"Caching requires NumPy. Not using {args.cache}.")
+            args.cache = None
+
+    if args.analyze:
+        if not fc2decode.HAVE_NUMPY:
+            mwhLogger.error(f"Analysis requires NumPy.")
+            sys.exit(-1)
+        files = fc2archive.expand_paths(args.files)
+        for f in files:
+            if not fc2archive.exists(f):
+                mwhLogger.error(f"{f} does not exist.")
+                sys.exit(-1)
+        targets = args.target if args.target != None else fc2analysis.ANALYSIS_TARGETS
+        fc2analysis.analyze(files, ATOM2_FORMAT, targets, args.prefix, args.sample if args.sample > 0 else None)
+        return
+
+    window = None
+    if args.start != None or args.end != None:
+        window = (args.start, args.end)
+
+    # Files that can't be dumped are skipped, and make the exit status -1
+    # once the rest are done.
+    results = []
+    failed = []
+    for f in fc2archive.expand_paths(args.files):
         baseName, extension = os.path.splitext(f)
-        if not os.path.exists(f):
+        if not fc2archive.exists(f):
             mwhLogger.error(f"{f} does not exist.")
-            sys.exit(-1)
+            failed.append(f)
         elif extension == ".fc2":
             mwhLogger.info(f"Parsing {f} as an Atom2 log file.")
-            atom_parse(ATOM2_FORMAT, f)
+            stats = fc2stats.Stats(f) if args.stats or args.stats_json != None else None
+            try:
+                atom_parse(ATOM2_FORMAT, f, args.cache, args.format, stats, window, fc2parallel.job_count(args.chunks), not args.no_validate)
+            except Exception as e:
+                mwhLogger.error(f"Unable to dump {f}: {type(e).__name__}: {e}")
+                failed.append(f)
+                continue
+            if stats != None:
+                results.append(stats.to_dict())
+                fc2stats.report(results[-1])
         elif extension == ".fc":
             mwhLogger.error(f"Sorry, I can't handle Atom1 log files yet. Can't parse {f}.")
-            sys.exit(-1)
+            failed.append(f)
         else:
-            mwhLogger.info(f"{f} appears to be an unsupported file type.")
-            sys.exit(-1)
+            mwhLogger.error(f"{f} appears to be an unsupported file type.")
+            failed.append(f)
+
+    if len(results) > 1:
+        fc2stats.report(fc2stats.summarize(results))
+    if args.stats_json != None:
+        fc2stats.save_json(args.stats_json, results)
+
+    if len(failed) > 0:
+        sys.exit(-1)
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,297 @@
+'''
+Statistics for reverse engineering the unknown parts of the FC2 record.
+
+Logs are read a block of records at a time, each block a 2-D uint8 array
+with one row per record, and every statistic is accumulated for all 512
+byte offsets at once: whether a byte ever changes, how often it changes from
+one record to the next, its entropy and its most common values. Every offset is also read as int16, int32 and
+float32, and correlated against fields we already understand (altitude,
+speed, battery current...) to suggest what an unknown region might hold.
+Only histograms, change counts and the means and co-moments of the
+correlations are kept between blocks, so memory doesn't grow with the number
+of logs.
+
+Requires NumPy.
+'''
+
+import fc2archive
+import fc2decode
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+ATOM_RECORD_LEN = 512
+
+# Known fields that unknown offsets are correlated against by default.
+ANALYSIS_TARGETS = ["alt (m)", "Speed (m/s)", "Battery Current (ma)"]
+
+# The types every offset is tried as when looking for correlations.
+CANDIDATE_TYPES = ["<i2", "<u2", "<i4", "<f4"]
+
+# Values bigger than this are treated as garbage when correlating.
+CANDIDATE_LIMIT = 1e9
+
+# Records are analyzed this many at a time.
+BLOCK_RECORDS = 4096
+
+# The records of a log, up to maxRecords of them evenly spread through the
+# file, as N x 512 uint8 arrays of at most blockRecords records each. The log
+# is read a block at a time and each block is a copy, so that the file can be
+# unmapped and a log in an archive is never all in memory.
+def record_blocks(fileName, maxRecords=None, recordLen=ATOM_RECORD_LEN, blockRecords=BLOCK_RECORDS):
+    with fc2archive.open_log(fileName, recordLen) as reader:
+        count = reader.count
+        picks = None
+        if maxRecords != None and count > maxRecords:
+            picks = np.linspace(0, count - 1, maxRecords).astype(np.int64)
+        first = 0
+        pending = np.empty((0, recordLen), dtype=np.uint8)
+        for block in reader.blocks(blockRecords):
+            data = np.frombuffer(block, dtype=np.uint8).reshape(-1, recordLen)
+            stop = first + len(data)
+            if picks is not None:
+                data = data[picks[np.searchsorted(picks, first):np.searchsorted(picks, stop)] - first]
+            # Copies the records, whether they were picked or not.
+            pending = np.concatenate([pending, data])
+            first = stop
+            del data, block
+            while len(pending) >= blockRecords:
+                yield pending[:blockRecords]
+                pending = pending[blockRecords:]
+        if len(pending) > 0:
+            yield pending
+
+# Per offset statistics of records, added a block at a time: a 256 bin
+# histogram of every offset and how often it changes from one record to the
+# next. Changes across files aren't counted; call new_file() before the
+# first block of each one.
+class ByteStats:
+    def __init__(self, width=ATOM_RECORD_LEN):
+        self.width = width
+        self.count = 0
+        self.hist = np.zeros((width, 256), dtype=np.int64)
+        self.changes = np.zeros(width, dtype=np.int64)
+        self.pairs = 0
+        self._last = None
+
+    def new_file(self):
+        self._last = None
+
+    # Add records, an N x 512 uint8 array.
+    def add(self, records):
+        if len(records) == 0:
+            return
+        # One 256 bin histogram per offset, with a single bincount.
+        bins = records.astype(np.int64) + 256 * np.arange(self.width)
+        self.hist += np.bincount(bins.ravel(), minlength=256 * self.width).reshape(self.width, 256)
+        if self._last is not None:
+            self.changes += self._last != records[0]
+            self.pairs += 1
+        self.changes += (records[1:] != records[:-1]).sum(axis=0)
+        self.pairs += len(records) - 1
+        self.count += len(records)
+        self._last = records[-1].copy()
+
+    # The statistics, as arrays by offset.
+    def stats(self, topValues=3) -> dict:
+        hist = self.hist
+        p = hist / max(self.count, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entropy = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1)
+        seen = hist > 0
+        top = np.argsort(hist, axis=1)[:, ::-1][:, :topValues]
+        return {
+            "min": np.argmax(seen, axis=1).astype(np.uint8),
+            "max": (255 - np.argmax(seen[:, ::-1], axis=1)).astype(np.uint8),
+            "constant": seen.sum(axis=1) <= 1,
+            "change_freq": self.changes / max(self.pairs, 1),
+            "entropy": entropy,
+            "histogram": hist,
+            "top_values": top,
+            "top_counts": np.take_along_axis(hist, top, axis=1),
+        }
+
+# Read every offset of records as dtype. Returns a (N x offsets) float64
+# array and the offset of each column.
+def candidate_values(records, dtype):
+    dtype = np.dtype(dtype)
+    size = dtype.itemsize
+    width = records.shape[1]
+    columns = []
+    offsets = []
+    # Each alignment is one reinterpreting view of the whole array.
+    for start in range(size):
+        count = (width - start) // size
+        view = records[:, start:start + count * size].view(dtype)
+        with np.errstate(invalid="ignore"):
+            columns.append(view.astype(np.float64))
+        offsets.append(np.arange(start, start + count * size, size))
+    offsets = np.concatenate(offsets)
+    order = np.argsort(offsets)
+    return np.concatenate(columns, axis=1)[:, order], offsets[order]
+
+# The moments that the Pearson correlation of each column of x against y is
+# worked out from: the number of values, their means and the sums of the
+# products of their deviations from the means (the co-moment of x and y and
+# the second moments of each). NaNs, infinities and absurdly large values
+# are ignored. Unlike raw sums of x, xy and xx, these don't lose every
+# significant digit to cancellation when a column holds large values that
+# barely change. Combine the moments of several blocks with merge_moments().
+def correlation_moments(x, y):
+    valid = np.isfinite(x) & (np.abs(x) < CANDIDATE_LIMIT) & np.isfinite(y)[:, None]
+    n = valid.sum(axis=0)
+    xv = np.where(valid, x, 0.0)
+    yv = np.where(valid, np.where(np.isfinite(y), y, 0.0)[:, None], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx = np.where(n > 0, xv.sum(axis=0) / n, 0.0)
+        my = np.where(n > 0, yv.sum(axis=0) / n, 0.0)
+    dx = np.where(valid, xv - mx, 0.0)
+    dy = np.where(valid, yv - my, 0.0)
+    return np.stack([n, mx, my, (dx * dy).sum(axis=0), (dx * dx).sum(axis=0), (dy * dy).sum(axis=0)])
+
+# The correlation_moments() of two blocks of records together (Chan et al.'s
+# pairwise update).
+def merge_moments(a, b):
+    na, mxa, mya, cxya, cxxa, cyya = a
+    nb, mxb, myb, cxyb, cxxb, cyyb = b
+    n = na + nb
+    dx = mxb - mxa
+    dy = myb - mya
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wb = np.where(n > 0, nb / n, 0.0)
+    w = na * wb
+    return np.stack([n, mxa + dx * wb, mya + dy * wb,
+                     cxya + cxyb + dx * dy * w, cxxa + cxxb + dx * dx * w, cyya + cyyb + dy * dy * w])
+
+# Pearson correlation from correlation_moments().
+def pearson(moments):
+    n, mx, my, cxy, cxx, cyy = moments
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = cxy / np.sqrt(cxx * cyy)
+    return np.where(n > 2, r, np.nan)
+
+# Pearson correlation of each column of x against y.
+def correlate(x, y):
+    return pearson(correlation_moments(x, y))
+
+# Correlations of every candidate interpretation of every offset against
+# each target, added a block of records at a time. targets maps a name to
+# (start_pos, length); candidates that overlap the target's own bytes are
+# skipped.
+class Correlations:
+    def __init__(self, targets, types=CANDIDATE_TYPES):
+        self.targets = targets
+        self.types = types
+        # Running correlation_moments() by (target, type), and the offsets
+        # of each type.
+        self.moments = {}
+        self.offsets = {}
+
+    # Add records (N x 512 uint8) and the target columns decoded from them.
+    def add(self, records, columns):
+        # One type at a time, to keep the size of the candidate arrays down.
+        for dtype in self.types:
+            values, self.offsets[dtype] = candidate_values(records, dtype)
+            for name in self.targets:
+                moments = correlation_moments(values, np.asarray(columns[name], dtype=np.float64))
+                if (name, dtype) in self.moments:
+                    moments = merge_moments(self.moments[(name, dtype)], moments)
+                self.moments[(name, dtype)] = moments
+
+    # A list of (target, type, offset, r), the top strongest for each target.
+    def results(self, top=10) -> list:
+        found = {name: [] for name in self.targets}
+        for (name, dtype), moments in self.moments.items():
+            start_pos, length = self.targets[name]
+            offsets = self.offsets[dtype]
+            r = pearson(moments)
+            overlaps = (offsets < start_pos + length) & (offsets + np.dtype(dtype).itemsize > start_pos)
+            r = np.where(overlaps, np.nan, r)
+            for i in np.flatnonzero(np.isfinite(r)):
+                found[name].append((name, dtype, int(offsets[i]), float(r[i])))
+        results = []
+        for name in self.targets:
+            found[name].sort(key=lambda f: abs(f[3]), reverse=True)
+            results.extend(found[name][:top])
+        return results
+
+# Name of the FLFD covering each offset, or "" for the unknown ones.
+def known_fields(fieldList, width=ATOM_RECORD_LEN) -> list:
+    names = [""] * width
+    for flfd in fieldList:
+        for pos in range(flfd.start_pos, min(flfd.start_pos + flfd.length, width)):
+            if names[pos] == "":
+                names[pos] = flfd.name
+    return names
+
+# Contiguous runs of offsets that no FLFD covers.
+def unknown_regions(fieldList, width=ATOM_RECORD_LEN) -> list:
+    regions = []
+    start = None
+    for pos, name in enumerate(known_fields(fieldList, width) + ["end"]):
+        if name == "" and start == None:
+            start = pos
+        elif name != "" and start != None:
+            regions.append((start, pos - 1))
+            start = None
+    return regions
+
+def write_offsets(csv_name, stats, names):
+    with open(csv_name, mode="w") as csv_file:
+        print("offset, field, min, max, constant, change freq, entropy (bits), top values", file=csv_file)
+        for pos in range(len(names)):
+            top = " ".join(f"0x{v:02x}:{c}" for v, c in zip(stats["top_values"][pos], stats["top_counts"][pos]) if c > 0)
+            print(f"{pos}, {names[pos]}, {stats['min'][pos]}, {stats['max'][pos]}, "
+                  f"{'Yes' if stats['constant'][pos] else 'No'}, {stats['change_freq'][pos]:.4f}, "
+                  f"{stats['entropy'][pos]:.3f}, {top}", file=csv_file)
+
+# Every offset's histogram: how many records hold each of the 256 values.
+def write_histogram(csv_name, stats, names):
+    with open(csv_name, mode="w") as csv_file:
+        print("offset, field, " + ", ".join(f"0x{v:02x}" for v in range(256)), file=csv_file)
+        for pos in range(len(names)):
+            print(f"{pos}, {names[pos]}, " + ", ".join(map(str, stats["histogram"][pos].tolist())), file=csv_file)
+
+def write_correlations(csv_name, correlations):
+    with open(csv_name, mode="w") as csv_file:
+        print("target, type, offset, r", file=csv_file)
+        for name, dtype, offset, r in correlations:
+            print(f"{name}, {dtype}, {offset}, {r:.4f}", file=csv_file)
+
+# Analyze files: writes <prefix>_offsets.csv, <prefix>_histogram.csv and
+# <prefix>_correlations.csv.
+# fieldList is used to label known offsets and to decode the targets named
+# in targetNames. Only one block of records is in memory at a time.
+def analyze(files, fieldList, targetNames, prefix="analysis", maxRecords=None):
+    targetList = [flfd for flfd in fieldList if flfd.name in targetNames]
+    byteStats = ByteStats()
+    correlations = Correlations({flfd.name: (flfd.start_pos, flfd.length) for flfd in targetList})
+    for fileName in files:
+        byteStats.new_file()
+        count = 0
+        for records in record_blocks(fileName, maxRecords):
+            byteStats.add(records)
+            correlations.add(records, fc2decode.atom_decode(targetList, records.reshape(-1), 0.0))
+            count += len(records)
+        mwhLogger.debug(f"Read {count} records from {fileName}.")
+    mwhLogger.info(f"Analyzed {byteStats.count} records from {len(files)} files.")
+
+    stats = byteStats.stats()
+    names = known_fields(fieldList)
+    write_offsets(f"{prefix}_offsets.csv", stats, names)
+    write_histogram(f"{prefix}_histogram.csv", stats, names)
+
+    for start, end in unknown_regions(fieldList):
+        region = slice(start, end + 1)
+        constant = int(stats["constant"][region].sum())
+        busiest = start + int(np.argmax(stats["change_freq"][region]))
+        mwhLogger.info(f"Unknown bytes {start}-{end}: {constant} of {end - start + 1} constant, "
+                       f"busiest is {busiest} (changes {stats['change_freq'][busiest]:.1%} of the time).")
+
+    correlations = correlations.results()
+    write_correlations(f"{prefix}_correlations.csv", correlations)
+    for name in [flfd.name for flfd in targetList]:
+        best = [c for c in correlations if c[0] == name][:3]
+        text = ", ".join(f"{dtype}@{offset} r={r:.3f}" for _, dtype, offset, r in best)
+        mwhLogger.info(f"Best matches for {name}: {text}.")
+    mwhLogger.info(f"Wrote {prefix}_offsets.csv, {prefix}_histogram.csv and {prefix}_correlations.csv.")
@@ -0,0 +1,318 @@
+'''
+Flight logs inside zip, tar and gzip archives.
+
+A log in an archive is named by the path of the archive followed by the name
+of the member, as if the archive were a directory:
+
+    bundle.zip/logs/20250601123045.fc2
+    bundle.tar.gz/20250601123045.fc2
+    20250601123045.fc2.gz/20250601123045.fc2
+
+so the last part of the path is still the log's own name, which is the time
+it was started. expand_paths() replaces archives by the logs in them and
+open_log() opens either kind of path.
+
+Each archive is indexed once per process (see open_archive()), not once for
+every member that is looked up or read, and nothing is extracted to disk:
+a member is decompressed as it is read, a block of records at a time, so it
+is never all in memory either. The index of a tar comes from one pass over
+its headers.
+'''
+
+import os
+import gzip
+import lzma
+import tarfile
+import zipfile
+import threading
+import contextlib
+import fc2reader
+
+ATOM_RECORD_LEN = fc2reader.ATOM_RECORD_LEN
+
+LOG_EXTENSION = ".fc2"
+
+# Archive types by extension. Longest first, so .tar.gz isn't taken for .gz.
+ARCHIVE_TYPES = [
+    (".tar.gz", "tar"),
+    (".tar.bz2", "tar"),
+    (".tar.xz", "tar"),
+    (".tgz", "tar"),
+    (".tar", "tar"),
+    (".zip", "zip"),
+    (".gz", "gzip"),
+]
+
+# Records are streamed out of an archive this many at a time.
+STREAM_RECORDS = 2048
+
+# How many archives are kept indexed (and open).
+OPEN_ARCHIVES = 8
+
+# "zip", "tar" or "gzip" if path is named like an archive, otherwise None.
+def archive_type(path):
+    lower = path.lower()
+    for extension, kind in ARCHIVE_TYPES:
+        if lower.endswith(extension):
+            return kind
+    return None
+
+# Split path into the archive and the member name. For a plain file the
+# archive is None.
+def split_path(path):
+    if os.path.exists(path):
+        return None, path
+    head = path
+    while True:
+        parent, tail = os.path.split(head)
+        if parent == head or tail == "":
+            return None, path
+        head = parent
+        if archive_type(head) != None and os.path.isfile(head):
+            return head, path[len(head) + 1:].replace(os.sep, "/")
+
+# An archive, indexed once: its members and their sizes. The zip or tar file
+# the members are read from is opened when a member is first read, and opened
+# again by a forked worker, which mustn't share the parent's file position
+# but can use its index. A member of a compressed tar can only be reached by
+# decompressing everything in front of it, but no more than that.
+class Archive:
+    def __init__(self, path):
+        self.path = path
+        self.kind = archive_type(path)
+        st = os.stat(path)
+        self.stat = (st.st_size, st.st_mtime_ns)
+        # Member sizes by name, None if it can't be known without
+        # decompressing the member.
+        self.sizes = {}
+        self._file = None
+        self._pid = None
+        self._infos = {}
+        if self.kind == "zip":
+            with zipfile.ZipFile(path) as zip_file:
+                for info in zip_file.infolist():
+                    if not info.is_dir():
+                        self.sizes[info.filename] = info.file_size
+        elif self.kind == "tar":
+            # One pass over the headers, skipping over the data.
+            with tarfile.open(path, mode="r|*") as tar_file:
+                for info in tar_file:
+                    if info.isfile():
+                        self.sizes[info.name] = info.size
+                        self._infos[info.name] = info
+        else:
+            # A gzip file holds one log, named like the file without the .gz.
+            self.sizes[os.path.basename(path)[:-len(".gz")]] = None
+
+    def size(self, member):
+        if member not in self.sizes:
+            raise FileNotFoundError(f"{member} is not a file in {self.path}")
+        return self.sizes[member]
+
+    # Open a member for reading, decompressing as it goes.
+    def open(self, member):
+        self.size(member)
+        if self.kind == "gzip":
+            return gzip.open(self.path, mode="rb")
+        if self._pid != os.getpid():
+            # Not opened yet, or opened by the process this one was forked
+            # from.
+            self._file = zipfile.ZipFile(self.path) if self.kind == "zip" else tarfile.open(self.path)
+            self._pid = os.getpid()
+        if self.kind == "zip":
+            return self._file.open(member)
+        return self._file.extractfile(self._infos[member])
+
+    def close(self):
+        if self._file != None and self._pid == os.getpid():
+            self._file.close()
+        self._file = None
+        self._pid = None
+
+# The archives opened so far, by path, most recently used last.
+_archives = {}
+_archivesLock = threading.Lock()
+
+# A forked worker keeps the archives (see Archive.open()), but not the lock,
+# in case another thread was holding it.
+def _new_lock():
+    global _archivesLock
+    _archivesLock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_new_lock)
+
+# The Archive for path, opened again only if the archive has changed.
+def open_archive(path) -> Archive:
+    key = os.path.abspath(path)
+    st = os.stat(path)
+    with _archivesLock:
+        archive = _archives.pop(key, None)
+        if archive != None and archive.stat != (st.st_size, st.st_mtime_ns):
+            archive.close()
+            archive = None
+        if archive == None:
+            archive = Archive(path)
+        _archives[key] = archive
+        while len(_archives) > OPEN_ARCHIVES:
+            _archives.pop(next(iter(_archives))).close()
+    return archive
+
+# The names of the logs in an archive.
+def members(archive) -> list:
+    return [name for name in open_archive(archive).sizes if name.endswith(LOG_EXTENSION)]
+
+# The size of a member, in bytes, or None if it can't be known without
+# decompressing it.
+def member_size(archive, member):
+    return open_archive(archive).size(member)
+
+# Open a member for reading, decompressing as it goes.
+@contextlib.contextmanager
+def open_member(archive, member):
+    with open_archive(archive).open(member) as member_file:
+        yield member_file
+
+# Replace every archive in paths by the paths of the logs in it.
+def expand_paths(paths) -> list:
+    result = []
+    for path in paths:
+        if archive_type(path) != None and os.path.isfile(path):
+            result.extend(f"{path}/{member}" for member in members(path))
+        else:
+            result.append(path)
+    return result
+
+# The .fc2 logs under directory, including those in archives.
+def find_logs(directory) -> list:
+    if not os.path.isdir(directory):
+        return expand_paths([directory])
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(LOG_EXTENSION) or archive_type(name) != None:
+                paths.append(os.path.join(root, name))
+    return [p for p in expand_paths(paths) if p.endswith(LOG_EXTENSION)]
+
+# True if path is a file, or a log in an archive.
+def exists(path) -> bool:
+    archive, member = split_path(path)
+    if archive == None:
+        return os.path.exists(path)
+    try:
+        return member in members(archive)
+    except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError, lzma.LZMAError):
+        return False
+
+def is_member(path) -> bool:
+    return split_path(path)[0] != None
+
+# The size and modification time (ns) that identify the current contents of
+# path. A log in an archive has its own size and the time of the archive.
+def log_stat(path):
+    archive, member = split_path(path)
+    if archive == None:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    size = member_size(archive, member)
+    if size == None:
+        size = os.stat(archive).st_size
+    return size, os.stat(archive).st_mtime_ns
+
+# Reads a log in an archive, with the same interface as an FC2Reader except
+# that there is no buffer: blocks() and iterating stream the records out of
+# the archive a block at a time, and read() and record() decompress just as
+# far as they need to. The size of a gzip file is only known once it has been
+# decompressed, so its count costs one pass over it, the first time.
+class ArchiveReader:
+    def __init__(self, fileName, recordLen=ATOM_RECORD_LEN):
+        self.fileName = fileName
+        self.recordLen = recordLen
+        self.archive, self.member = split_path(fileName)
+        if self.archive == None:
+            raise FileNotFoundError(f"{fileName} is not in an archive")
+        self._archive = open_archive(self.archive)
+        self._size = self._archive.size(self.member)
+        # The member opened by read() and record(), which mostly go forward.
+        self._member = None
+
+    # Open the member again, in case the archive has been closed to make room
+    # for others since.
+    def _open(self):
+        self._archive = open_archive(self.archive)
+        return self._archive.open(self.member)
+
+    @property
+    def count(self):
+        if self._size == None:
+            size = 0
+            for block in self.blocks():
+                size += len(block)
+            self._size = size
+        # Any partial trailing record is ignored.
+        return self._size // self.recordLen
+
+    def __len__(self):
+        return self.count
+
+    # Iterate over all the records blockRecords (STREAM_RECORDS if None) at
+    # a time, as memoryviews of whole records. Like FC2Reader.blocks() there
+    # is always at least one block.
+    def blocks(self, blockRecords=None):
+        recordLen = self.recordLen
+        blockSize = (STREAM_RECORDS if blockRecords == None else blockRecords) * recordLen
+        empty = True
+        with self._open() as member_file:
+            pending = b""
+            while True:
+                data = member_file.read(blockSize - len(pending))
+                if not data:
+                    break
+                pending += data
+                if len(pending) == blockSize:
+                    empty = False
+                    yield memoryview(pending)
+                    pending = b""
+        if len(pending) >= recordLen or empty:
+            yield memoryview(pending)[:len(pending) // recordLen * recordLen]
+
+    def __iter__(self):
+        recordLen = self.recordLen
+        for block in self.blocks():
+            for pos in range(0, len(block), recordLen):
+                yield block[pos:pos + recordLen]
+
+    # Records first to stop (not included), as one memoryview.
+    def read(self, first, stop):
+        stop = min(stop, self.count)
+        if stop <= first:
+            return memoryview(b"")
+        if self._member == None:
+            self._member = self._open()
+        self._member.seek(first * self.recordLen)
+        return memoryview(self._member.read((stop - first) * self.recordLen))
+
+    # Return record number n (starting at zero).
+    def record(self, n):
+        if n < 0 or n >= self.count:
+            raise IndexError(f"Record {n} is not in {self.fileName}")
+        return self.read(n, n + 1)
+
+    def close(self):
+        if self._member != None:
+            self._member.close()
+        self._member = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# Open a log, either a plain file (as an FC2Reader) or one in an archive.
+def open_log(fileName, recordLen=ATOM_RECORD_LEN):
+    if is_member(fileName):
+        return ArchiveReader(fileName, recordLen)
+    return fc2reader.FC2Reader(fileName, recordLen)
@@ -0,0 +1,138 @@
+#!python3
+'''
+Benchmark the flight log converters on synthetic logs.
+
+For each log size, a synthetic log is generated with fc2synth and then
+converted by atom_parse() from csv_extractor and from datadumper. Every run
+happens in a fresh process so that the peak memory figure belongs to that
+run alone. Results are printed as a table and can be saved as JSON, so that
+runs can be compared to catch regressions.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import mwhlogging
+from mwhlogging import mwhLogger
+
+try:
+    import resource
+except ImportError:
+    resource = None # Windows.
+
+BENCH_TOOLS = ["csv_extractor", "datadumper"]
+BENCH_ENGINES = ["numpy", "python"]
+BENCH_SIZES = "1k,10k,100k,1M"
+
+# Turn "10k" or "1M" into a number of records.
+def parse_size(text) -> int:
+    scale = {"k": 1000, "m": 1000000}.get(text[-1].lower(), 1)
+    if scale != 1:
+        text = text[:-1]
+    return int(float(text) * scale)
+
+# Peak resident memory of this process, in bytes.
+def peak_memory():
+    if resource == None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# Convert one log in this process and print the measurements as JSON. This
+# is what each benchmark child process runs.
+def run_one(tool, engine, fileName, outDir):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module = __import__(tool)
+    import fc2decode
+    if engine == "python":
+        fc2decode.HAVE_NUMPY = False
+    mwhLogger.setLevel(mwhlogging.ERROR)
+    os.chdir(outDir)
+    start = time.perf_counter()
+    ctx = module.atom_parse(module.ATOM2_FORMAT, fileName)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"records": ctx.rCount, "seconds": seconds, "peak": peak_memory()}))
+
+# Run one benchmark in a child process and return its measurements.
+def measure(tool, engine, fileName, outDir) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--run", tool, engine, fileName, outDir]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{tool} failed on {fileName}: {proc.stderr.strip()}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    size = os.path.getsize(fileName)
+    result.update({"tool": tool, "engine": engine, "bytes": size,
+                   "records_per_sec": result["records"] / result["seconds"],
+                   "mb_per_sec": size / result["seconds"] / 1e6})
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Atom flight log converters on synthetic logs.")
+    parser.add_argument("-l","--log", type=int, help="Set log level. 0=error, higher values increase logging.", default=2)
+    parser.add_argument("-s","--sizes", help=f"Comma separated log sizes, in records (default {BENCH_SIZES}). Up to 10M works but needs about 8 GB of disk.", default=BENCH_SIZES)
+    parser.add_argument("-t","--tools", help="Comma separated converters to run.", default=",".join(BENCH_TOOLS))
+    parser.add_argument("-e","--engines", help="Comma separated decode engines to run: numpy, python.", default=",".join(BENCH_ENGINES))
+    parser.add_argument("-d","--dir", help="Directory for the logs and output. Defaults to a temporary directory.")
+    parser.add_argument("-j","--json", help="Also write the results to this JSON file.")
+    parser.add_argument("--run", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run != None:
+        run_one(*args.run)
+        return
+
+    match args.log:
+        case 0:
+            mwhLogger.setLevel(mwhlogging.ERROR)
+        case 1:
+            mwhLogger.setLevel(mwhlogging.WARNING)
+        case 2:
+            mwhLogger.setLevel(mwhlogging.INFO)
+        case _:
+            mwhLogger.setLevel(mwhlogging.DEBUG)
+
+    import fc2synth
+    if fc2synth.np == None:
+        mwhLogger.error(f"The benchmarks need NumPy to generate logs.")
+        sys.exit(-1)
+
+    tmp = None
+    workDir = args.dir
+    if workDir == None:
+        tmp = tempfile.TemporaryDirectory(prefix="fc2bench-")
+        workDir = tmp.name
+    os.makedirs(workDir, exist_ok=True)
+
+    results = []
+    print(f"{'tool':<14} {'engine':<7} {'records':>9} {'seconds':>9} {'records/s':>11} {'MB/s':>8} {'peak MB':>8}")
+    for size in [parse_size(s) for s in args.sizes.split(",")]:
+        logDir = os.path.join(workDir, f"{size}")
+        os.makedirs(logDir, exist_ok=True)
+        mwhLogger.debug(f"Generating a {size} record log in {logDir}.")
+        fileName = fc2synth.write_synthetic(logDir, size)
+        for tool in args.tools.split(","):
+            for engine in args.engines.split(","):
+                r = measure(tool, engine, fileName, logDir)
+                peak = "-" if r["peak"] == None else f"{r['peak'] / 1e6:.1f}"
+                print(f"{tool:<14} {engine:<7} {r['records']:>9} {r['seconds']:>9.3f} {r['records_per_sec']:>11.0f} {r['mb_per_sec']:>8.2f} {peak:>8}")
+                results.append(r)
+        # The big logs take a lot of room; don't keep them around.
+        for name in os.listdir(logDir):
+            os.remove(os.path.join(logDir, name))
+        os.rmdir(logDir)
+
+    if args.json != None:
+        with open(args.json, mode="w") as json_file:
+            json.dump({"python": sys.version.split()[0], "results": results}, json_file, indent=1)
+
+    if tmp != None:
+        tmp.cleanup()
+
+if __name__ == '__main__':
+    main()
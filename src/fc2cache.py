@@ -0,0 +1,116 @@
+'''
+Columnar storage of decoded flight logs.
+
+A decoded flight is stored as a directory holding one .npy file per column
+plus a meta.json file that maps field names to column files. Each column can
+be memory mapped on its own, so reading "alt (m)" doesn't decode (or even
+read) the rest of the record.
+
+The same layout is used for the decode cache. Cache entries are keyed on the
+source file's path, size and modification time and on the schema version of
+the field list, so editing the log or the FLFD list invalidates them.
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import fc2archive
+import fc2decode
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+# Bump this if the layout of a column directory changes.
+CACHE_FORMAT = 1
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "atomdata")
+
+# A short hash of everything that affects how a field list decodes.
+def schema_version(fieldList) -> str:
+    desc = []
+    for flfd in fieldList:
+        scale = flfd.scale
+        if scale != None and not isinstance(scale, (int, float)):
+            scale = getattr(scale, "__name__", repr(scale))
+        desc.append([flfd.name, flfd.fmt_string, flfd.start_pos, flfd.length, scale])
+    text = json.dumps([CACHE_FORMAT, desc])
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+# The cache key for fileName: path, size, mtime and schema version.
+def cache_key(fileName, fieldList) -> str:
+    size, mtime = fc2archive.log_stat(fileName)
+    text = f"{os.path.abspath(fileName)}|{size}|{mtime}|{schema_version(fieldList)}"
+    return hashlib.sha1(text.encode()).hexdigest()
+
+# Write columns (as returned by fc2decode.atom_decode) into the directory
+# path. The directory is built under a temporary name and renamed into place
+# so that readers never see half of it.
+def save_columns(path, fieldList, columns, meta=None):
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        names = {}
+        for i, flfd in enumerate(fieldList):
+            column = columns[flfd.name]
+            if column.dtype == object:
+                # Text columns are stored as fixed width strings so that
+                # they can be mapped like everything else.
+                column = np.array(column.tolist(), dtype=str)
+            colName = f"c{i:03d}.npy"
+            np.save(os.path.join(tmp, colName), column, allow_pickle=False)
+            names[flfd.name] = colName
+        info = dict(meta or {})
+        info["format"] = CACHE_FORMAT
+        info["schema"] = schema_version(fieldList)
+        info["columns"] = names
+        with open(os.path.join(tmp, "meta.json"), mode="w") as meta_file:
+            json.dump(info, meta_file, indent=1)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+# Read the meta data of a column directory, or None if there isn't one.
+def read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+# Memory map the columns stored in path. If names is given, only those
+# columns are opened. Returns None if path isn't a usable column directory.
+def open_columns(path, names=None):
+    meta = read_meta(path)
+    if meta == None or meta.get("format") != CACHE_FORMAT:
+        return None
+    if names == None:
+        names = list(meta["columns"])
+    columns = {}
+    for name in names:
+        colName = meta["columns"].get(name)
+        if colName == None:
+            return None
+        columns[name] = np.load(os.path.join(path, colName), mmap_mode="r")
+    return columns
+
+# Return the cached columns for fileName, or None on a cache miss.
+def load_cached(fileName, fieldList, cacheDir=CACHE_DIR, names=None):
+    path = os.path.join(cacheDir, cache_key(fileName, fieldList))
+    columns = open_columns(path, names)
+    if columns != None:
+        mwhLogger.debug(f"Using cached columns for {fileName} from {path}.")
+    return columns
+
+def save_cached(fileName, fieldList, columns, cacheDir=CACHE_DIR):
+    path = os.path.join(cacheDir, cache_key(fileName, fieldList))
+    try:
+        save_columns(path, fieldList, columns, {"source": os.path.abspath(fileName)})
+    except OSError as e:
+        # A cache that can't be written just isn't used.
+        mwhLogger.warning(f"Unable to cache {fileName} in {cacheDir}: {e}")
@@ -0,0 +1,385 @@
+#!python3
+'''
+A catalog of flight logs, kept in SQLite, that can be searched without
+reading the logs again.
+
+"build" scans directories (and zip, tar and gzip archives) for .fc2 logs and
+stores a summary of every log and of every flight in it (see fc2segment):
+the start time, taken from the file name just as atom_parse() does, the
+duration, the Flight Counter, the home point, the bounding box of the GPS
+positions, the highest altitude and the furthest distance from home, the
+battery level at the start and the end and the number of records. Logs that
+haven't changed since the last build are skipped, and logs that have gone
+are dropped.
+
+"query" answers questions from the catalog alone:
+
+    $ python3 fc2catalog.py build ~/FlightLogs
+    $ python3 fc2catalog.py query --near 40.131,-75.446,2 --since 2025-06-01
+    $ python3 fc2catalog.py query --min-alt 120
+    $ python3 fc2catalog.py query --sql "select counter, max_alt from flights"
+
+Building requires NumPy; querying doesn't.
+'''
+
+import os
+import sys
+import math
+import sqlite3
+import argparse
+import datetime
+import concurrent.futures
+import mwhlogging
+import fc2archive
+import fc2cache
+import fc2decode
+import fc2flight
+import fc2segment
+import fc2validate
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+CATALOG_NAME = "atom_catalog.db"
+
+# Bump this if the tables change; the catalog is then built from scratch.
+CATALOG_FORMAT = 1
+
+# The columns the summaries are made from.
+ELAPSED = "elapsed (ms)"
+COUNTER = "Flight Counter"
+LAT = "lat (deg)"
+LON = "lon (deg)"
+ALT = "alt (m)"
+DIST = "dist (m)"
+HOME_LAT = "Home Lat (deg)"
+HOME_LON = "Home Lon (deg)"
+BATTERY = "Battery Level (%)"
+SUMMARY_FIELDS = [ELAPSED, COUNTER, LAT, LON, ALT, DIST, HOME_LAT, HOME_LON, BATTERY]
+
+# Kilometers per degree of latitude.
+KM_PER_DEGREE = 111.32
+
+# The summary columns that logs and flights share.
+SUMMARY_COLUMNS = """
+    start REAL,
+    duration REAL,
+    counter INTEGER,
+    home_lat REAL,
+    home_lon REAL,
+    min_lat REAL,
+    max_lat REAL,
+    min_lon REAL,
+    max_lon REAL,
+    max_alt REAL,
+    max_dist REAL,
+    battery_start INTEGER,
+    battery_end INTEGER,
+    records INTEGER
+"""
+
+CATALOG_TABLES = f"""
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    size INTEGER,
+    mtime INTEGER,
+    schema TEXT,
+    flights INTEGER,
+    bad_records INTEGER,
+    {SUMMARY_COLUMNS}
+);
+CREATE TABLE IF NOT EXISTS flights (
+    log_id INTEGER REFERENCES logs(id) ON DELETE CASCADE,
+    flight INTEGER,
+    first INTEGER,
+    last INTEGER,
+    {SUMMARY_COLUMNS},
+    PRIMARY KEY (log_id, flight)
+);
+CREATE INDEX IF NOT EXISTS flights_start ON flights(start);
+"""
+
+SUMMARY_NAMES = ["start", "duration", "counter", "home_lat", "home_lon", "min_lat", "max_lat",
+                 "min_lon", "max_lon", "max_alt", "max_dist", "battery_start", "battery_end", "records"]
+
+# A plain number for SQLite, or None for NaN and missing values.
+def _value(v):
+    if v == None:
+        return None
+    v = v.item() if hasattr(v, "item") else v
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+# The summary of the records (a NumPy index array) of columns. timeStamp is
+# the start of the log, in ms.
+def summarize(columns, records, timeStamp) -> dict:
+    if len(records) == 0:
+        return {name: None for name in SUMMARY_NAMES} | {"records": 0}
+    part = {name: columns[name][records] for name in SUMMARY_FIELDS}
+    elapsed = part[ELAPSED]
+    known = ~(np.isnan(part[LAT]) | np.isnan(part[LON]))
+    home = ~(np.isnan(part[HOME_LAT]) | np.isnan(part[HOME_LON]))
+    with np.errstate(invalid="ignore"):
+        return {
+            "start": timeStamp + float(elapsed[0]),
+            "duration": float(elapsed[-1]) - float(elapsed[0]),
+            "counter": int(part[COUNTER].max()),
+            # The home point is set at take-off, so the last one is the one used.
+            "home_lat": part[HOME_LAT][home][-1] if home.any() else None,
+            "home_lon": part[HOME_LON][home][-1] if home.any() else None,
+            "min_lat": part[LAT][known].min() if known.any() else None,
+            "max_lat": part[LAT][known].max() if known.any() else None,
+            "min_lon": part[LON][known].min() if known.any() else None,
+            "max_lon": part[LON][known].max() if known.any() else None,
+            "max_alt": np.nanmax(part[ALT]),
+            "max_dist": np.nanmax(part[DIST]),
+            "battery_start": part[BATTERY][0],
+            "battery_end": part[BATTERY][-1],
+            "records": len(records),
+        }
+
+# Summarize one log and the flights in it. Records with bad values in the
+# SUMMARY_FIELDS (see fc2validate) are left out; the other fields aren't
+# checked, since the catalog doesn't store them. Runs in a worker process when building with several jobs.
+def summarize_log(fileName) -> dict:
+    with fc2flight.load_flight(fileName) as flight:
+        schema = fc2cache.schema_version(flight.schema)
+        problems = flight.problems(SUMMARY_FIELDS)
+        keep = problems.good()
+        columns = flight.columns(SUMMARY_FIELDS)
+        flights, active = fc2segment.find_flights(flight.source)
+        size, mtime = fc2archive.log_stat(fileName)
+        result = {
+            "path": os.path.abspath(fileName),
+            "size": size,
+            "mtime": mtime,
+            "schema": schema,
+            "flights": [],
+            "bad_records": problems.dropped(),
+            "summary": summarize(columns, np.flatnonzero(keep), flight.timeStamp),
+        }
+        for f in flights:
+            records = fc2validate.keep_records(range(f["first"], f["last"] + 1), keep)
+            summary = summarize(columns, records, flight.timeStamp)
+            # The counter the flight was found by, even if its records were bad.
+            summary["counter"] = f["counter"]
+            result["flights"].append({"flight": f["flight"], "first": f["first"], "last": f["last"],
+                                      "summary": summary})
+    return result
+
+class Catalog:
+    def __init__(self, path=CATALOG_NAME):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(CATALOG_TABLES)
+        row = self.db.execute("SELECT value FROM info WHERE key = 'format'").fetchone()
+        if row != None and int(row[0]) != CATALOG_FORMAT:
+            mwhLogger.warning(f"{path} was written by a different version, rebuilding it.")
+            self.db.executescript("DROP TABLE flights; DROP TABLE logs;")
+            self.db.executescript(CATALOG_TABLES)
+        self.db.execute("INSERT OR REPLACE INTO info VALUES ('format', ?)", (str(CATALOG_FORMAT),))
+        self.db.commit()
+
+    # True if fileName is in the catalog and hasn't changed since.
+    def is_current(self, fileName, schema) -> bool:
+        row = self.db.execute("SELECT size, mtime, schema FROM logs WHERE path = ?",
+                              (os.path.abspath(fileName),)).fetchone()
+        size, mtime = fc2archive.log_stat(fileName)
+        return row != None and tuple(row) == (size, mtime, schema)
+
+    # Store what summarize_log() returned, replacing any older entry.
+    def store(self, entry):
+        self.db.execute("DELETE FROM logs WHERE path = ?", (entry["path"],))
+        summary = [_value(entry["summary"][name]) for name in SUMMARY_NAMES]
+        cursor = self.db.execute(
+            f"INSERT INTO logs (path, size, mtime, schema, flights, bad_records, {', '.join(SUMMARY_NAMES)}) "
+            f"VALUES ({', '.join(['?'] * (6 + len(SUMMARY_NAMES)))})",
+            [entry["path"], entry["size"], entry["mtime"], entry["schema"], len(entry["flights"]), entry["bad_records"]] + summary)
+        logId = cursor.lastrowid
+        for f in entry["flights"]:
+            summary = [_value(f["summary"][name]) for name in SUMMARY_NAMES]
+            self.db.execute(
+                f"INSERT INTO flights (log_id, flight, first, last, {', '.join(SUMMARY_NAMES)}) "
+                f"VALUES ({', '.join(['?'] * (4 + len(SUMMARY_NAMES)))})",
+                [logId, f["flight"], f["first"], f["last"]] + summary)
+
+    # Drop the logs under directory that aren't in paths any more.
+    def prune(self, directory, paths) -> int:
+        prefix = os.path.join(os.path.abspath(directory), "")
+        keep = set(os.path.abspath(p) for p in paths)
+        gone = [row[0] for row in self.db.execute("SELECT path FROM logs WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+                if row[0] not in keep]
+        for path in gone:
+            self.db.execute("DELETE FROM logs WHERE path = ?", (path,))
+        return len(gone)
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# Add the logs under directories to the catalog, summarizing jobs at a time.
+# Returns the number of logs added (or updated) and the number that failed.
+def build(catalog, directories, jobs=1):
+    schema = fc2cache.schema_version(fc2flight.default_schema())
+    todo = []
+    for directory in directories:
+        paths = fc2archive.find_logs(directory)
+        if os.path.isdir(directory):
+            pruned = catalog.prune(directory, paths)
+            if pruned > 0:
+                mwhLogger.info(f"Dropped {pruned} logs that are no longer in {directory}.")
+        todo += [p for p in paths if not catalog.is_current(p, schema)]
+    mwhLogger.info(f"Summarizing {len(todo)} new or changed logs.")
+
+    failed = 0
+    if jobs == 1 or len(todo) <= 1:
+        results = map(_try_summarize, todo)
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=jobs if jobs > 0 else None)
+        results = pool.map(_try_summarize, todo)
+    for fileName, entry in zip(todo, results):
+        if isinstance(entry, str):
+            mwhLogger.error(f"Unable to summarize {fileName}: {entry}")
+            failed += 1
+        else:
+            catalog.store(entry)
+            catalog.commit()
+            mwhLogger.debug(f"Added {fileName}: {len(entry['flights'])} flights.")
+    if jobs != 1 and len(todo) > 1:
+        pool.shutdown()
+    return len(todo) - failed, failed
+
+# summarize_log(), or the error as a string, so that one bad log doesn't stop
+# the rest.
+def _try_summarize(fileName):
+    try:
+        return summarize_log(fileName)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+# Parse "lat,lon" or "lat,lon,km" for --near.
+def parse_near(text):
+    parts = [float(p) for p in text.split(",")]
+    if len(parts) == 2:
+        parts.append(1.0)
+    if len(parts) != 3:
+        raise ValueError(f"Bad location {text}")
+    return tuple(parts)
+
+# A date and time, or just a date, for --since and --until. As ms, like the
+# start times in the catalog.
+def parse_date(text) -> float:
+    return datetime.datetime.fromisoformat(text).timestamp() * 1000
+
+# The SQL for the flights matching the query options, and its parameters.
+def flight_query(near=None, since=None, until=None, minAlt=None, minDist=None, counter=None):
+    where = []
+    params = []
+    if near != None:
+        lat, lon, km = near
+        dLat = km / KM_PER_DEGREE
+        dLon = km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        # Flights whose bounding box comes within km of the point.
+        where.append("f.min_lat <= ? AND f.max_lat >= ? AND f.min_lon <= ? AND f.max_lon >= ?")
+        params += [lat + dLat, lat - dLat, lon + dLon, lon - dLon]
+    if since != None:
+        where.append("f.start >= ?")
+        params.append(since)
+    if until != None:
+        where.append("f.start < ?")
+        params.append(until)
+    if minAlt != None:
+        where.append("f.max_alt >= ?")
+        params.append(minAlt)
+    if minDist != None:
+        where.append("f.max_dist >= ?")
+        params.append(minDist)
+    if counter != None:
+        where.append("f.counter = ?")
+        params.append(counter)
+    sql = ("SELECT l.path, f.flight, f.counter, f.start, f.duration, f.max_alt, f.max_dist, "
+           "f.battery_start, f.battery_end, f.records FROM flights f JOIN logs l ON l.id = f.log_id")
+    if len(where) > 0:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + " ORDER BY f.start", params
+
+def _print_flights(rows):
+    print(f"{'start':<19} {'min:s':>7} {'counter':>7} {'max alt':>8} {'max dist':>8} {'battery':>9} {'records':>8}  log")
+    for path, flight, counter, start, duration, maxAlt, maxDist, batteryStart, batteryEnd, records in rows:
+        when = datetime.datetime.fromtimestamp(start / 1000).strftime("%Y-%m-%d %H:%M:%S") if start != None else "?"
+        length = f"{int(duration // 60000)}:{int(duration % 60000 // 1000):02d}" if duration != None else "?"
+        alt = f"{maxAlt:.1f}" if maxAlt != None else "?"
+        dist = f"{maxDist:.1f}" if maxDist != None else "?"
+        print(f"{when:<19} {length:>7} {counter:>7} {alt:>8} {dist:>8} {f'{batteryStart}-{batteryEnd}%':>9} {records:>8}  {os.path.basename(path)}#{flight}")
+    print(f"{len(rows)} flights.")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Catalog Atom flight logs in SQLite and search them without reading the logs.")
+    parser.add_argument("-l","--log", type=int, help="Set log level. 0=error, higher values increase logging.", default=2)
+    parser.add_argument("--db", help=f"The catalog file. Default {CATALOG_NAME}.", default=CATALOG_NAME)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Add new and changed logs to the catalog. Requires NumPy.")
+    build_parser.add_argument("-j","--jobs", type=int, help="Summarize this many logs at once. 0=one per CPU.", default=1)
+    build_parser.add_argument("dirs", nargs="+", help="Directories, archives or logs to catalog.")
+    query_parser = commands.add_parser("query", help="List the flights that match all of the options.")
+    query_parser.add_argument("--near", type=parse_near, metavar="LAT,LON[,KM]", help="Flights that came within KM (default 1) of this point.")
+    query_parser.add_argument("--since", type=parse_date, metavar="DATE", help="Flights that started on or after this date (and time), e.g. 2025-06-01.")
+    query_parser.add_argument("--until", type=parse_date, metavar="DATE", help="Flights that started before this date (and time).")
+    query_parser.add_argument("--min-alt", type=float, metavar="M", help="Flights that reached at least this altitude.")
+    query_parser.add_argument("--min-dist", type=float, metavar="M", help="Flights that got at least this far from home.")
+    query_parser.add_argument("--counter", type=int, help="The flight with this Flight Counter.")
+    query_parser.add_argument("--sql", help="Run this SQL on the catalog instead (tables logs and flights) and print the rows.")
+    args = parser.parse_args()
+
+    match args.log:
+        case 0:
+            mwhLogger.setLevel(mwhlogging.ERROR)
+        case 1:
+            mwhLogger.setLevel(mwhlogging.WARNING)
+        case 2:
+            mwhLogger.setLevel(mwhlogging.INFO)
+        case _:
+            mwhLogger.setLevel(mwhlogging.DEBUG)
+
+    if args.command == "build":
+        if not fc2decode.HAVE_NUMPY:
+            mwhLogger.error(f"Building the catalog requires NumPy.")
+            sys.exit(-1)
+        with Catalog(args.db) as catalog:
+            added, failed = build(catalog, args.dirs, args.jobs)
+            total = catalog.db.execute("SELECT count(*), sum(flights) FROM logs").fetchone()
+        mwhLogger.info(f"Added {added} logs. {args.db} has {total[0]} logs and {total[1] or 0} flights.")
+        if failed > 0:
+            sys.exit(-1)
+        return
+
+    if not os.path.exists(args.db):
+        mwhLogger.error(f"{args.db} does not exist. Build it first.")
+        sys.exit(-1)
+    with Catalog(args.db) as catalog:
+        if args.sql != None:
+            cursor = catalog.db.execute(args.sql)
+            print(", ".join(d[0] for d in cursor.description or []))
+            for row in cursor:
+                print(", ".join(map(str, row)))
+            return
+        sql, params = flight_query(args.near, args.since, args.until, args.min_alt, args.min_dist, args.counter)
+        _print_flights(catalog.db.execute(sql, params).fetchall())
+
+if __name__ == '__main__':
+    main()
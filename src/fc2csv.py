@@ -0,0 +1,85 @@
+'''
+Buffered writer for Telemetry Overlay CSV files.
+
+Rows are formatted in batches and written as large blocks instead of one
+print() per record. The output is byte for byte what atom_parse() has always
+produced: values formatted with str() and separated by ", ".
+'''
+
+import fc2stats
+
+# Rows are formatted and written this many at a time.
+CSV_BATCH_ROWS = 8192
+
+# Size of the file buffer, in bytes.
+CSV_BUFFER_SIZE = 1 << 20
+
+class CSVWriter:
+    # csv_file can be an already open text file (e.g. sys.stdout) to write
+    # to instead of creating csv_name. It is flushed but not closed. With
+    # headings None, no header line is written.
+    def __init__(self, csv_name, headings, batchRows=CSV_BATCH_ROWS, bufferSize=CSV_BUFFER_SIZE, stats=None, csv_file=None):
+        self.csv_name = csv_name
+        self.stats = stats
+        self.batchRows = batchRows
+        self.rows = []
+        self.owned = csv_file == None
+        if csv_file == None:
+            csv_file = open(csv_name, mode="w", buffering=bufferSize)
+        self.csv_file = csv_file
+        if headings != None:
+            self.csv_file.write(", ".join(headings) + "\n")
+
+    # Queue one row. Rows are written once a full batch has built up.
+    def write_row(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batchRows:
+            self._write_pending()
+
+    # Write whole columns at once. Each column is a list of values; every
+    # column is converted to strings in one go and then stitched into lines.
+    def write_columns(self, columns):
+        self._write_pending()
+        count = len(columns[0]) if len(columns) > 0 else 0
+        for start in range(0, count, self.batchRows):
+            end = start + self.batchRows
+            with fc2stats.phase(self.stats, "format"):
+                text = [list(map(str, column[start:end])) for column in columns]
+            self._write_lines(zip(*text))
+
+    # Write lines that are already formatted, e.g. by another CSVWriter.
+    def write_text(self, text):
+        self._write_pending()
+        with fc2stats.phase(self.stats, "write"):
+            self.csv_file.write(text)
+
+    def _write_lines(self, rows):
+        with fc2stats.phase(self.stats, "format"):
+            lines = list(map(", ".join, rows))
+        if len(lines) > 0:
+            with fc2stats.phase(self.stats, "write"):
+                self.csv_file.write("\n".join(lines) + "\n")
+
+    def _write_pending(self):
+        if len(self.rows) > 0:
+            self._write_lines([map(str, row) for row in self.rows])
+            self.rows = []
+
+    # Write any queued rows and push them out to the file.
+    def flush(self):
+        self._write_pending()
+        with fc2stats.phase(self.stats, "write"):
+            self.csv_file.flush()
+
+    def close(self):
+        if not self.csv_file.closed:
+            self.flush()
+            if self.owned:
+                self.csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,223 @@
+'''
+Decode engines for Atom flight logs.
+
+The converters describe a record as a list of FLFD entries. Rather than
+unpacking each record one field at a time, the functions here turn that list
+into a NumPy structured dtype, map the whole file with a single frombuffer()
+call and then apply the FLFD scale functions to entire columns at once.
+
+When NumPy isn't available, compile_schema() builds a pure Python decoder
+that unpacks a whole record with one precompiled struct.Struct.
+'''
+
+import time
+import struct
+
+# NumPy is optional. Callers should check HAVE_NUMPY and fall back to the
+# per-record FLFD.getField() path when it is missing.
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:
+    np = None
+    HAVE_NUMPY = False
+
+ATOM_RECORD_LEN = 512
+
+# struct format characters and the matching NumPy scalar types.
+_STRUCT_TO_NUMPY = {
+    "b": "i1", "B": "u1",
+    "h": "i2", "H": "u2",
+    "i": "i4", "I": "u4",
+    "l": "i4", "L": "u4",
+    "q": "i8", "Q": "u8",
+    "f": "f4", "d": "f8",
+}
+
+# Convert a struct format like "<H" into a NumPy type string like "<u2".
+def _numpy_format(fmt_string) -> str:
+    order = "<"
+    code = fmt_string
+    if code[0] in "<>!=@":
+        order = ">" if code[0] in ">!" else "<"
+        code = code[1:]
+    if code not in _STRUCT_TO_NUMPY:
+        raise ValueError(f"Unsupported field format {fmt_string}")
+    return order + _STRUCT_TO_NUMPY[code]
+
+# Build a structured dtype with one named field per FLFD, at its byte offset.
+# Fields may overlap (e.g. "utc (ms)" and "elapsed (ms)" share bytes 5-12).
+def atom_dtype(fieldList, recordLen=ATOM_RECORD_LEN):
+    names = []
+    formats = []
+    offsets = []
+    for flfd in fieldList:
+        if flfd.name in names:
+            continue
+        names.append(flfd.name)
+        formats.append(_numpy_format(flfd.fmt_string))
+        offsets.append(flfd.start_pos)
+    return np.dtype({"names": names, "formats": formats,
+                     "offsets": offsets, "itemsize": recordLen})
+
+# Map a buffer holding whole records. Any partial trailing record is ignored,
+# just like the short read that ends atom_parse().
+def atom_records(fieldList, buffer, recordLen=ATOM_RECORD_LEN):
+    count = len(buffer) // recordLen
+    return np.frombuffer(buffer, dtype=atom_dtype(fieldList, recordLen), count=count)
+
+# Apply an FLFD scale to an entire column. The scale functions are matched by
+# name so that the FLFD classes in both csv_extractor and datadumper work.
+def _scale_column(flfd, column, baseTime):
+    scale = flfd.scale
+    if scale is None:
+        return column
+    if isinstance(scale, int) or isinstance(scale, float):
+        return column * scale
+
+    name = getattr(scale, "__name__", "")
+    if name == "_fix_lat_lon":
+        # Zero means "unknown"; the CSV shows those as empty cells.
+        result = column / 1e7
+        result[column == 0] = np.nan
+        return result
+    if name == "_r2d":
+        # NaN headings stay NaN; fc2validate weeds out their records.
+        return np.round((360 + column.astype(np.float64) * 180 / np.pi) % 360, 3)
+    if name == "_fix_alt":
+        return np.abs(np.round(column.astype(np.float64), 3))
+    if name == "_round2":
+        # round() returns an int, so there is never a negative zero.
+        return np.rint(column.astype(np.float64) * 100) / 100 + 0.0
+    if name == "_fix_time":
+        return baseTime + column / 1000
+    if scale is abs:
+        # Widen first so that abs(-32768) doesn't wrap around.
+        return np.abs(column.astype(np.int64))
+    if column.dtype.itemsize == 1 and column.dtype.kind in "iu":
+        # Enums and other byte decoders become a lookup table.
+        low = -128 if column.dtype.kind == "i" else 0
+        table = np.array([scale(v) for v in range(low, low + 256)], dtype=object)
+        return table[column.astype(np.int64) - low]
+    # Anything else is called once per value.
+    return np.array([scale(v) for v in column.tolist()], dtype=object)
+
+# Decode every complete record in buffer. Returns a dict mapping each field
+# name to a NumPy column with the FLFD scale already applied. If stats (an
+# fc2stats.Stats) is given, the time spent scaling each field is recorded.
+def atom_decode(fieldList, buffer, baseTime, recordLen=ATOM_RECORD_LEN, stats=None) -> dict:
+    records = atom_records(fieldList, buffer, recordLen)
+    columns = {}
+    # Unknown regions are full of NaNs and infinities; don't warn about them.
+    with np.errstate(invalid="ignore", over="ignore"):
+        for flfd in fieldList:
+            column = records[flfd.name]
+            if column.dtype.kind == "f":
+                column = column.astype(np.float64)
+            if stats == None:
+                columns[flfd.name] = _scale_column(flfd, column, baseTime)
+            else:
+                start = time.perf_counter()
+                columns[flfd.name] = _scale_column(flfd, column, baseTime)
+                stats.add_field(flfd, time.perf_counter() - start)
+    return columns
+
+# Join dicts of NumPy columns from consecutive blocks of records into one.
+# A single block is returned as it is, without copying.
+def join_columns(parts) -> dict:
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+# atom_decode() every record of source (an FC2Reader, fc2seek.RecordWindow or
+# fc2archive.ArchiveReader) a block at a time: a mapped log in one go, a log
+# in an archive as it is decompressed.
+def decode_source(fieldList, source, baseTime, stats=None) -> dict:
+    return join_columns([atom_decode(fieldList, block, baseTime, source.recordLen, stats) for block in source.blocks()])
+
+# Merge "Drone Mode" and "Return to Home" the same way atom_parse() does.
+def drone_mode(dmode, rthome):
+    return np.where((rthome != 0) & (dmode == "Flying"), "RTH", dmode).astype(object)
+
+# Convert a column to plain Python values for printing. Missing lat/lon values
+# are blank cells rather than "nan".
+def column_values(flfd, column) -> list:
+    values = column.tolist()
+    if getattr(flfd.scale, "__name__", "") == "_fix_lat_lon":
+        values = ["" if v != v else v for v in values]
+    return values
+
+# Split a struct format like "<H" into its byte order and type code.
+def _split_format(fmt_string):
+    if fmt_string[0] in "<>!=@":
+        return fmt_string[0], fmt_string[1:]
+    return "@", fmt_string
+
+# Work out how to turn the raw value of one field into its output value.
+# Returns None when the raw value is used as is.
+def _field_converter(flfd, ctx):
+    scale = flfd.scale
+    if scale is None:
+        return None
+    if isinstance(scale, int) or isinstance(scale, float):
+        return lambda data: data * scale
+    if getattr(scale, "__name__", "") == "_fix_time":
+        return lambda data: scale(data, ctx)
+    if struct.calcsize(flfd.fmt_string) == 1:
+        # Enums and other byte decoders become a 256 entry lookup table.
+        # Signed bytes index from the end of the table, so -1 is entry 255.
+        if flfd.fmt_string[-1] == "b":
+            table = [scale(v if v < 128 else v - 256) for v in range(256)]
+        else:
+            table = [scale(v) for v in range(256)]
+        return table.__getitem__
+    return scale
+
+# Compile an FLFD list into a function that decodes a whole record with one
+# struct.Struct and returns a tuple of values in fieldList order. ctx supplies
+# the base time for FLFD._fix_time. If stats (an fc2stats.Stats) is given,
+# every scale function call is timed.
+def compile_schema(fieldList, ctx=None, stats=None):
+    # Fields that share the same bytes (e.g. "utc (ms)" and "elapsed (ms)")
+    # are only unpacked once.
+    slots = sorted({(flfd.start_pos, flfd.fmt_string) for flfd in fieldList})
+    packed = []
+    extra = []
+    order = None
+    end = 0
+    for start_pos, fmt_string in slots:
+        byteOrder, code = _split_format(fmt_string)
+        if order == None:
+            order = byteOrder
+        if start_pos < end or byteOrder != order:
+            # Overlaps a different field; this one gets its own unpack.
+            extra.append((start_pos, fmt_string))
+            continue
+        packed.append((start_pos, fmt_string, "x" * (start_pos - end) + code))
+        end = start_pos + struct.calcsize(fmt_string)
+
+    record_struct = struct.Struct((order or "<") + "".join(p[2] for p in packed))
+    extra = [(start_pos, struct.Struct(fmt_string)) for start_pos, fmt_string in extra]
+    index = {}
+    for i, (start_pos, fmt_string, code) in enumerate(packed):
+        index[(start_pos, fmt_string)] = i
+    for i, (start_pos, extra_struct) in enumerate(extra):
+        index[(start_pos, extra_struct.format)] = len(packed) + i
+
+    plan = [(index[(flfd.start_pos, flfd.fmt_string)], _field_converter(flfd, ctx)) for flfd in fieldList]
+    if stats != None:
+        plan = [(i, convert if convert is None else stats.timed_field(flfd, convert))
+                for (i, convert), flfd in zip(plan, fieldList)]
+    unpack_from = record_struct.unpack_from
+
+    if len(extra) == 0:
+        def decode(record) -> tuple:
+            raw = unpack_from(record)
+            return tuple([raw[i] if convert is None else convert(raw[i]) for i, convert in plan])
+    else:
+        def decode(record) -> tuple:
+            raw = unpack_from(record)
+            for start_pos, extra_struct in extra:
+                raw += extra_struct.unpack_from(record, start_pos)
+            return tuple([raw[i] if convert is None else convert(raw[i]) for i, convert in plan])
+    return decode
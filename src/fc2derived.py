@@ -0,0 +1,153 @@
+'''
+Derived telemetry: values computed from the decoded columns rather than read
+from the log.
+
+Each Derived field names the columns it is computed from and a function that
+computes it over whole columns at once:
+
+    Power (w)             battery voltage times current
+    Used (mah)            charge drawn from the battery so far
+    Used (wh)             energy drawn from the battery so far
+    Travelled (m)         distance flown so far, from the GPS positions
+    Vertical Speed (m/s)  rate of climb, from the altitude
+    Ground Speed (m/s)    speed over the ground, from the GPS positions and
+                          smoothed over SMOOTH_SECONDS
+
+A Derived field can be used in place of an FLFD where only the columns
+matter: in fc2decode.column_values(), fc2resample.resample() and
+fc2cache.save_columns().
+
+Requires NumPy.
+'''
+
+import fc2decode
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+ELAPSED = "elapsed (ms)"
+VOLTAGE = "Battery V1 (mv)"
+CURRENT = "Battery Current (ma)"
+LAT = "lat (deg)"
+LON = "lon (deg)"
+ALT = "alt (m)"
+
+# Mean radius of the earth, in meters.
+EARTH_RADIUS = 6371008.8
+
+# Ground speed is averaged over this many seconds.
+SMOOTH_SECONDS = 1.0
+
+class Derived:
+    def __init__(self, name, inputs, compute, decimals):
+        # The heading in the output.
+        self.name = name
+        # The columns it is computed from.
+        self.inputs = inputs
+        # compute(columns, seconds) returns the new column, given the input
+        # columns and the time of each record in seconds.
+        self.compute = compute
+        # How many decimal places to round to.
+        self.decimals = decimals
+        # What an FLFD would have. There is nothing to read from the record.
+        self.fmt_string = None
+        self.start_pos = None
+        self.length = 0
+        self.scale = None
+
+# Time between each record and the one before it, in seconds. The first
+# record and any that go back in time get zero.
+def time_steps(seconds):
+    steps = np.zeros(len(seconds))
+    steps[1:] = np.maximum(np.diff(seconds), 0.0)
+    return steps
+
+# Integrate values over time with the trapezoidal rule, as a running total.
+def running_total(values, seconds):
+    area = np.zeros(len(values))
+    area[1:] = (values[1:] + values[:-1]) / 2 * time_steps(seconds)[1:]
+    return np.cumsum(area)
+
+# Great circle distance from the previous record to each record, in meters.
+# Records without a position, and the first one with, move zero.
+def step_distance(lat, lon):
+    lat = np.radians(lat.astype(np.float64))
+    lon = np.radians(lon.astype(np.float64))
+    steps = np.zeros(len(lat))
+    if len(lat) < 2:
+        return steps
+    # Measure from the last known position, so that gaps in the GPS data
+    # don't lose distance.
+    known = ~(np.isnan(lat) | np.isnan(lon))
+    index = np.maximum.accumulate(np.where(known, np.arange(len(lat)), 0))
+    prevLat = lat[index][:-1]
+    prevLon = lon[index][:-1]
+    a = (np.sin((lat[1:] - prevLat) / 2) ** 2 +
+         np.cos(prevLat) * np.cos(lat[1:]) * np.sin((lon[1:] - prevLon) / 2) ** 2)
+    with np.errstate(invalid="ignore"):
+        steps[1:] = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    steps[1:][~(known[1:] & known[index[:-1]])] = 0.0
+    return steps
+
+def _power(columns, seconds):
+    return columns[VOLTAGE] / 1000.0 * np.abs(columns[CURRENT]) / 1000.0
+
+def _used_mah(columns, seconds):
+    return running_total(np.abs(columns[CURRENT]).astype(np.float64), seconds) / 3600
+
+def _used_wh(columns, seconds):
+    return running_total(_power(columns, seconds), seconds) / 3600
+
+def _travelled(columns, seconds):
+    return np.cumsum(step_distance(columns[LAT], columns[LON]))
+
+def _vertical_speed(columns, seconds):
+    alt = columns[ALT].astype(np.float64)
+    if len(alt) < 2:
+        return np.zeros(len(alt))
+    # Records with the same time would divide by zero; nudge them apart.
+    t = seconds + np.arange(len(seconds)) * 1e-9
+    return np.gradient(alt, t)
+
+def _ground_speed(columns, seconds):
+    distance = np.cumsum(step_distance(columns[LAT], columns[LON]))
+    # Distance covered in the SMOOTH_SECONDS around each record.
+    half = SMOOTH_SECONDS / 2
+    first = np.searchsorted(seconds, seconds - half, side="left")
+    last = np.minimum(np.searchsorted(seconds, seconds + half, side="right"), len(seconds)) - 1
+    span = seconds[last] - seconds[first]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = (distance[last] - distance[first]) / span
+    return np.where(span > 0, speed, 0.0)
+
+DERIVED_FIELDS = [
+    Derived("Power (w)", [VOLTAGE, CURRENT], _power, 2),
+    Derived("Used (mah)", [CURRENT], _used_mah, 1),
+    Derived("Used (wh)", [VOLTAGE, CURRENT], _used_wh, 3),
+    Derived("Travelled (m)", [LAT, LON], _travelled, 1),
+    Derived("Vertical Speed (m/s)", [ALT], _vertical_speed, 2),
+    Derived("Ground Speed (m/s)", [LAT, LON], _ground_speed, 2),
+]
+
+# The derived fields that can be computed from the fields in fieldList.
+def available(fieldList, fields=DERIVED_FIELDS) -> list:
+    names = set(flfd.name for flfd in fieldList)
+    result = []
+    for field in fields:
+        missing = [name for name in field.inputs + [ELAPSED] if name not in names]
+        if len(missing) > 0:
+            mwhLogger.warning(f"Can't compute {field.name} without {', '.join(missing)}.")
+        else:
+            result.append(field)
+    return result
+
+# Compute fields from columns (as returned by fc2decode.atom_decode()).
+# Returns a dict with the new columns.
+def derive(columns, fields=DERIVED_FIELDS) -> dict:
+    seconds = columns[ELAPSED].astype(np.float64) / 1000
+    result = {}
+    for field in fields:
+        values = field.compute(columns, seconds)
+        # + 0.0 keeps negative zeros out of the CSV.
+        result[field.name] = np.round(values, field.decimals) + 0.0
+    return result
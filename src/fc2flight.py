@@ -0,0 +1,240 @@
+'''
+Library interface to Atom flight logs.
+
+load_flight() opens a log and returns a Flight, which only decodes a column
+when it is asked for: flight["alt (m)"] reads just the four bytes of each
+record that hold the altitude. Nothing is written to disk.
+
+    with fc2flight.load_flight("20250601123045.fc2") as flight:
+        alt = flight["alt (m)"]
+        frame = flight.to_dataframe(["utc (ms)", "alt (m)"])
+
+iter_records() streams the records one at a time, as dicts, instead. It
+doesn't need NumPy. Without NumPy the columns of a Flight are lists.
+
+The schema is a list of FLFDs and defaults to csv_extractor.ATOM2_FORMAT
+plus the drone mode and return to home fields. Whenever a schema has both
+"Drone Mode (text)" and "Return to Home", the drone mode reads "RTH" while
+returning home, just like the CSV.
+'''
+
+import os
+import re
+import datetime
+import fc2archive
+import fc2cache
+import fc2decode
+import fc2parallel
+import fc2seek
+import fc2validate
+
+ATOM_RECORD_LEN = 512
+
+# Records decoded at a time by Flight.chunks().
+CHUNK_RECORDS = 16384
+
+DRONE_MODE = "Drone Mode (text)"
+RETURN_HOME = "Return to Home"
+
+# csv_extractor imports this module, so its schema is only looked up when a
+# caller doesn't pass one.
+def default_schema() -> list:
+    import csv_extractor
+    return csv_extractor.ATOM2_FORMAT + csv_extractor.atom_extra_fields()
+
+# The time a log was started, in ms, from its file name.
+def log_start(fileName) -> float:
+    baseName, extension = os.path.splitext(os.path.basename(fileName))
+    return datetime.datetime.strptime(re.sub("-.*", "", baseName), "%Y%m%d%H%M%S").timestamp()*1000
+
+class Flight:
+    # window, cacheDir and stats are as for csv_extractor.atom_parse(). With
+    # a cacheDir, the first column asked for decodes (or loads) all of them.
+    # records is a range of record numbers to use instead of a window. With
+    # jobs > 1, NumPy columns of big logs are decoded in that many processes
+    # (see fc2parallel).
+    def __init__(self, fileName, schema=None, window=None, cacheDir=None, stats=None, records=None, jobs=1):
+        if schema == None:
+            schema = default_schema()
+        self.fileName = fileName
+        self.baseName, extension = os.path.splitext(os.path.basename(fileName))
+        # Used by the _fix_time scale, just like an AtomContext.
+        self.timeStamp = log_start(fileName)
+        self.schema = schema
+        self.fields = {flfd.name: flfd for flfd in schema}
+        self.names = list(self.fields)
+        # The cache holds whole files.
+        self.cacheDir = cacheDir if window == None and records == None else None
+        self.stats = stats
+        self.jobs = jobs
+        self.reader = fc2archive.open_log(fileName, ATOM_RECORD_LEN)
+        if records != None:
+            self.source = fc2seek.RecordWindow(self.reader, records)
+        else:
+            self.source = fc2seek.select(self.reader, window, self.timeStamp)
+        self.count = self.source.count
+        self._columns = {}
+        self._decode = None
+        self._problems = {}
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def __getitem__(self, name):
+        return self.columns([name])[name]
+
+    def keys(self) -> list:
+        return list(self.names)
+
+    # Decoded columns by name, all of them if names is None. Columns are
+    # decoded the first time they are asked for and kept.
+    def columns(self, names=None) -> dict:
+        if names == None:
+            names = self.names
+        for name in names:
+            if name not in self.fields:
+                raise KeyError(f"{name} is not in the schema of {self.fileName}")
+        missing = [name for name in names if name not in self._columns]
+        if len(missing) > 0:
+            self._decode_columns(missing)
+        return {name: self._columns[name] for name in names}
+
+    def _decode_columns(self, names):
+        merge = DRONE_MODE in names and RETURN_HOME in self.fields
+        if merge and RETURN_HOME not in names:
+            names = names + [RETURN_HOME]
+        if not fc2decode.HAVE_NUMPY:
+            columns = self._decode_lists(names)
+        elif self.cacheDir != None:
+            columns = fc2cache.load_cached(self.fileName, self.schema, self.cacheDir)
+            if columns == None:
+                columns = self._decode_arrays(self.schema)
+                fc2cache.save_cached(self.fileName, self.schema, columns, self.cacheDir)
+        else:
+            columns = self._decode_arrays([self.fields[name] for name in names])
+        if merge:
+            dmode = self._columns.get(DRONE_MODE, columns.get(DRONE_MODE))
+            columns[DRONE_MODE] = self._merge_drone_mode(dmode, columns[RETURN_HOME])
+        for name, column in columns.items():
+            self._columns.setdefault(name, column)
+
+    # True if the whole log is used and it is big enough to be decoded in
+    # jobs processes.
+    def can_split(self) -> bool:
+        return self.source is self.reader and fc2parallel.can_split(self.fileName, self.count, self.jobs)
+
+    def _decode_arrays(self, fields) -> dict:
+        if self.can_split():
+            return fc2parallel.decode_columns(self.fileName, fields, self.count, self.jobs, self.stats)
+        return fc2decode.decode_source(fields, self.source, self.timeStamp, self.stats)
+
+    # Decode names (all of them if None) a chunk of records at a time, for a
+    # caller that wants to show a log before all of it is decoded. Yields
+    # the range of record numbers in each chunk and its columns. Nothing is
+    # kept.
+    def chunks(self, names=None, chunkRecords=CHUNK_RECORDS):
+        if names == None:
+            names = self.names
+        merge = DRONE_MODE in names and RETURN_HOME in self.fields
+        fields = [self.fields[name] for name in names]
+        if merge and RETURN_HOME not in names:
+            fields.append(self.fields[RETURN_HOME])
+        recordLen = self.source.recordLen
+        decode = None if fc2decode.HAVE_NUMPY else fc2decode.compile_schema(fields, self, self.stats)
+        first = 0
+        for block in self.source.blocks(chunkRecords):
+            records = range(first, first + len(block) // recordLen)
+            first = records.stop
+            if len(records) == 0:
+                continue
+            if decode == None:
+                columns = fc2decode.atom_decode(fields, block, self.timeStamp, recordLen, self.stats)
+            else:
+                values = [decode(block[pos:pos + recordLen]) for pos in range(0, len(block), recordLen)]
+                columns = {flfd.name: [row[i] for row in values] for i, flfd in enumerate(fields)}
+            if merge:
+                columns[DRONE_MODE] = self._merge_drone_mode(columns[DRONE_MODE], columns[RETURN_HOME])
+            yield records, {name: columns[name] for name in names}
+
+    # The pure Python decode: one pass over the records for all the names.
+    def _decode_lists(self, names) -> dict:
+        decode = fc2decode.compile_schema([self.fields[name] for name in names], self, self.stats)
+        values = [decode(record) for record in self.source]
+        return {name: [row[i] for row in values] for i, name in enumerate(names)}
+
+    def _merge_drone_mode(self, dmode, rthome):
+        if fc2decode.HAVE_NUMPY:
+            return fc2decode.drone_mode(dmode, rthome)
+        return ["RTH" if r != 0 and d == "Flying" else d for d, r in zip(dmode, rthome)]
+
+    # The compiled decoder for the whole schema, made on first use.
+    def _decoder(self):
+        if self._decode == None:
+            self._decode = fc2decode.compile_schema(self.schema, self, self.stats)
+            if self.stats != None:
+                self._decode = self.stats.timed("decode", self._decode)
+        return self._decode
+
+    # Record n as a tuple, one value per schema field. Bad values are None.
+    # The drone mode isn't merged.
+    def row(self, n) -> tuple:
+        return self._decoder()(self.source.record(n))
+
+    # Iterate over the records as tuples, like row(). If keep (a mask) is
+    # given, only the records in it are decoded.
+    def rows(self, keep=None):
+        decode = self._decoder()
+        if keep is None:
+            for record in self.source:
+                yield decode(record)
+        else:
+            for record, flag in zip(self.source, keep):
+                if flag:
+                    yield decode(record)
+
+    # The fc2validate.Problems of the records, checked on first use. Only the
+    # fields in names are checked, or all of them if names is None.
+    def problems(self, names=None):
+        key = None if names == None else tuple(names)
+        if key not in self._problems:
+            fields = self.schema if names == None else [self.fields[name] for name in names]
+            self._problems[key] = fc2validate.validate(fields, self.source, self.stats)
+        return self._problems[key]
+
+    # Iterate over the records as dicts of field name to value. keep is as
+    # for rows().
+    def records(self, keep=None):
+        merge = DRONE_MODE in self.fields and RETURN_HOME in self.fields
+        for row in self.rows(keep):
+            record = dict(zip(self.names, row))
+            if merge and record[RETURN_HOME] != 0 and record[DRONE_MODE] == "Flying":
+                record[DRONE_MODE] = "RTH"
+            yield record
+
+    # The columns as a pandas DataFrame. Requires pandas.
+    def to_dataframe(self, names=None):
+        import pandas
+        return pandas.DataFrame(self.columns(names))
+
+    def close(self):
+        self.source.close()
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# Open fileName as a Flight. See Flight for the arguments.
+def load_flight(fileName, schema=None, window=None, cacheDir=None, stats=None, records=None, jobs=1) -> Flight:
+    return Flight(fileName, schema, window, cacheDir, stats, records, jobs)
+
+# Stream the records of fileName as dicts of field name to value.
+def iter_records(fileName, schema=None, window=None):
+    with load_flight(fileName, schema, window) as flight:
+        yield from flight.records()
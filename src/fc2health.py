@@ -0,0 +1,263 @@
+#!python3
+'''
+Battery and motor health across a fleet of drones, from all of their logs.
+
+Each log is read and checked (see fc2validate) for just the columns in
+HEALTH_FIELDS, split into flights (see fc2segment) and every flight is
+reduced to a row of numbers, worked out over the records where the motors
+are running:
+
+    minutes             time with the motors running
+    discharge (%/min)   battery level used per minute
+    used (mah)          charge drawn, and per minute
+    resistance (mohm)   the slope of Battery V1 against Battery Current, a
+                        least squares fit; it grows as a battery ages
+    sag (mv)            how far the voltage drops at 95th percentile current
+    V1-V2 max (mv)      the largest difference between the two voltages
+    temp max (c)        the hottest the battery got, and how fast it warmed
+    Off (s) ... High (s)
+                        time per motor in each motor state (offsets 297, 299,
+                        301 and 303), averaged over the four motors, over the
+                        whole flight rather than just while they are running
+
+Logs are read jobs at a time, in worker processes. Each argument on the
+command line is the logs (a directory, archive or log) of one airframe,
+named after it. The output is one CSV with every flight, fleet_health.csv,
+and a trend table per airframe, <airframe>.trend.csv, in Flight Counter
+order:
+
+    $ python3 fc2health.py -j 0 -o reports ~/Logs/atom-a ~/Logs/atom-b.zip
+
+Requires NumPy.
+'''
+
+import os
+import sys
+import math
+import argparse
+import datetime
+import concurrent.futures
+import mwhlogging
+import fc2archive
+import fc2csv
+import fc2decode
+import fc2derived
+import fc2flight
+import fc2parallel
+import fc2segment
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+ELAPSED = "elapsed (ms)"
+COUNTER = "Flight Counter"
+VOLTAGE = "Battery V1 (mv)"
+VOLTAGE2 = "Battery V2 2 (mv)"
+CURRENT = "Battery Current (ma)"
+TEMPERATURE = "Battery Temp (c)"
+LEVEL = "Battery Level (%)"
+MOTORS = ["Motor 1", "Motor 2", "Motor 3", "Motor 4"]
+HEALTH_FIELDS = [ELAPSED, COUNTER, VOLTAGE, VOLTAGE2, CURRENT, TEMPERATURE, LEVEL] + MOTORS
+
+# The motor states, as the Motor fields name them.
+MOTOR_STATES = ["Off", "Idle", "Low", "Medium", "High"]
+
+# The current has to vary by at least this much (ma) during a flight to fit
+# the resistance to it.
+MIN_CURRENT_SPREAD = 500
+
+# The current (as a percentile of the flight) that sag is measured at.
+SAG_PERCENTILE = 95
+
+FLEET_NAME = "fleet_health.csv"
+TREND_SUFFIX = ".trend.csv"
+
+# The columns of a flight summary, in output order.
+SUMMARY_COLUMNS = ["minutes", "battery start (%)", "battery end (%)", "discharge (%/min)",
+                   "used (mah)", "used (mah/min)", "V1 min (mv)", "V1-V2 max (mv)",
+                   "resistance (mohm)", "sag (mv)", "temp start (c)", "temp max (c)", "temp rise (c/min)"] + \
+                  [f"{state} (s)" for state in MOTOR_STATES]
+FLIGHT_COLUMNS = ["airframe", "log", "flight", COUNTER, "start"] + SUMMARY_COLUMNS
+
+# The summary columns whose trend over the Flight Counter is logged.
+TREND_COLUMNS = ["resistance (mohm)", "sag (mv)", "temp max (c)", "discharge (%/min)"]
+
+# Reduce the records of one flight (a dict of columns, already cut down to
+# the records with the motors running) to the SUMMARY_COLUMNS, up to the
+# motor states. Values that can't be worked out are None.
+def summarize(columns) -> dict:
+    seconds = columns[ELAPSED].astype(np.float64) / 1000
+    steps = fc2derived.time_steps(seconds)
+    minutes = steps.sum() / 60
+    voltage = columns[VOLTAGE].astype(np.float64)
+    current = np.abs(columns[CURRENT]).astype(np.float64)
+    temperature = columns[TEMPERATURE].astype(np.float64)
+    level = columns[LEVEL].astype(np.float64)
+    used = fc2derived.running_total(current, seconds)[-1] / 3600
+
+    resistance = None
+    sag = None
+    if np.ptp(current) >= MIN_CURRENT_SPREAD:
+        # V = V0 - R * I, so the slope is -R, in mv/ma (ohms).
+        slope = np.polyfit(current, voltage, 1)[0]
+        resistance = -slope * 1000
+        sag = -slope * np.percentile(current, SAG_PERCENTILE)
+
+    summary = {
+        "minutes": minutes,
+        "battery start (%)": level[0],
+        "battery end (%)": level[-1],
+        "discharge (%/min)": (level[0] - level[-1]) / minutes if minutes > 0 else None,
+        "used (mah)": used,
+        "used (mah/min)": used / minutes if minutes > 0 else None,
+        "V1 min (mv)": voltage.min(),
+        "V1-V2 max (mv)": np.abs(voltage - columns[VOLTAGE2]).max(),
+        "resistance (mohm)": resistance,
+        "sag (mv)": sag,
+        "temp start (c)": temperature[0],
+        "temp max (c)": temperature.max(),
+        "temp rise (c/min)": (temperature.max() - temperature[0]) / minutes if minutes > 0 else None,
+    }
+    return summary
+
+# The seconds each motor spent in each motor state (the last of the
+# SUMMARY_COLUMNS) over a whole flight, averaged over the motors. columns are
+# cut down to the records of the flight, motors running or not.
+def motor_times(columns) -> dict:
+    steps = fc2derived.time_steps(columns[ELAPSED].astype(np.float64) / 1000)
+    states = np.stack([columns[motor] for motor in MOTORS])
+    return {f"{state} (s)": (steps * (states == state)).sum() / len(MOTORS) for state in MOTOR_STATES}
+
+# Summarize every flight in one log, leaving out bad records (see
+# fc2validate). Runs in a worker process. Returns a list of dicts with the
+# FLIGHT_COLUMNS, except the airframe.
+def summarize_log(fileName) -> list:
+    result = []
+    with fc2flight.load_flight(fileName) as flight:
+        keep = flight.problems(HEALTH_FIELDS).good()
+        columns = flight.columns(HEALTH_FIELDS)
+        flights, active = fc2segment.find_flights(flight.source)
+        for f in flights:
+            first = f["first"]
+            stop = f["last"] + 1
+            records = np.flatnonzero(active[first:stop] & keep[first:stop]) + first
+            if len(records) < 2:
+                continue
+            part = {name: column[records] for name, column in columns.items()}
+            span = np.flatnonzero(keep[first:stop]) + first
+            whole = {name: columns[name][span] for name in [ELAPSED] + MOTORS}
+            start = flight.timeStamp + float(part[ELAPSED][0])
+            result.append({
+                "log": flight.baseName,
+                "flight": f["flight"],
+                COUNTER: f["counter"],
+                "start": datetime.datetime.fromtimestamp(start / 1000).strftime("%Y-%m-%d %H:%M:%S"),
+            } | summarize(part) | motor_times(whole))
+    return result
+
+# summarize_log(), or the error as a string, so that one bad log doesn't stop
+# the rest.
+def _try_summarize(fileName):
+    try:
+        return summarize_log(fileName)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+# The name of the airframe whose logs are at path.
+def airframe_name(path) -> str:
+    name = os.path.basename(os.path.normpath(path))
+    for extension, kind in fc2archive.ARCHIVE_TYPES:
+        if name.lower().endswith(extension):
+            name = name[:-len(extension)]
+            break
+    if name.lower().endswith(fc2archive.LOG_EXTENSION):
+        name = name[:-len(fc2archive.LOG_EXTENSION)]
+    return name
+
+# Summarize the flights of every airframe, jobs logs at a time. airframes
+# maps each airframe name to its log paths. Returns the flight rows and the
+# number of logs that couldn't be read.
+def fleet_flights(airframes, jobs=1):
+    paths = [(name, path) for name, logs in airframes.items() for path in logs]
+    jobs = fc2parallel.job_count(jobs)
+    if jobs == 1 or len(paths) <= 1:
+        results = list(map(_try_summarize, [path for name, path in paths]))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_try_summarize, [path for name, path in paths]))
+    rows = []
+    failed = 0
+    for (name, path), result in zip(paths, results):
+        if isinstance(result, str):
+            mwhLogger.error(f"Unable to read {path}: {result}")
+            failed += 1
+            continue
+        rows += [{"airframe": name} | row for row in result]
+    return rows, failed
+
+# The least squares slope of column against the Flight Counter, per 100
+# flights, or None with too few flights.
+def trend(rows, column):
+    points = [(row[COUNTER], row[column]) for row in rows if row[column] != None]
+    if len(points) < 3 or len(set(p[0] for p in points)) < 2:
+        return None
+    counter, value = np.array(points, dtype=np.float64).T
+    return np.polyfit(counter, value, 1)[0] * 100
+
+def _format(value) -> str:
+    if value == None:
+        return ""
+    if isinstance(value, (float, np.floating)):
+        return "" if math.isnan(value) else str(round(float(value), 2))
+    return str(value)
+
+def write_table(fileName, columns, rows):
+    with fc2csv.CSVWriter(fileName, columns) as csv_file:
+        for row in rows:
+            csv_file.write_row([_format(row[column]) for column in columns])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Summarize the battery and motor health of every flight of each airframe, with trends over the Flight Counter.")
+    parser.add_argument("-l","--log", type=int, help="Set log level. 0=error, higher values increase logging.", default=2)
+    parser.add_argument("-j","--jobs", type=int, help="Read this many logs at once. 0=one per CPU.", default=1)
+    parser.add_argument("-o","--output", help="Directory for the tables. Default is the current directory.", default=".")
+    parser.add_argument("airframes", nargs="+", help="The logs of each airframe: a directory, archive or log per airframe.")
+    args = parser.parse_args()
+
+    match args.log:
+        case 0:
+            mwhLogger.setLevel(mwhlogging.ERROR)
+        case 1:
+            mwhLogger.setLevel(mwhlogging.WARNING)
+        case 2:
+            mwhLogger.setLevel(mwhlogging.INFO)
+        case _:
+            mwhLogger.setLevel(mwhlogging.DEBUG)
+
+    if not fc2decode.HAVE_NUMPY:
+        mwhLogger.error(f"The health report requires NumPy.")
+        sys.exit(-1)
+
+    airframes = {}
+    for path in args.airframes:
+        if not fc2archive.exists(path):
+            mwhLogger.error(f"{path} does not exist.")
+            sys.exit(-1)
+        airframes.setdefault(airframe_name(path), []).extend(fc2archive.find_logs(path))
+    mwhLogger.info(f"Reading {sum(len(logs) for logs in airframes.values())} logs of {len(airframes)} airframes.")
+
+    rows, failed = fleet_flights(airframes, args.jobs)
+    os.makedirs(args.output, exist_ok=True)
+    rows.sort(key=lambda row: (row["airframe"], row[COUNTER], row["start"]))
+    write_table(os.path.join(args.output, FLEET_NAME), FLIGHT_COLUMNS, rows)
+    for name in airframes:
+        flights = [row for row in rows if row["airframe"] == name]
+        write_table(os.path.join(args.output, f"{name}{TREND_SUFFIX}"), FLIGHT_COLUMNS[1:], flights)
+        trends = [f"{column} {value:+.2f}" for column in TREND_COLUMNS if (value := trend(flights, column)) != None]
+        mwhLogger.info(f"{name}: {len(flights)} flights." + (f" Per 100 flights: {', '.join(trends)}." if len(trends) > 0 else ""))
+    if failed > 0:
+        sys.exit(-1)
+
+if __name__ == '__main__':
+    main()
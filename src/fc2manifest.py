@@ -0,0 +1,59 @@
+'''
+Manifest of converted flight logs, for incremental batch conversions.
+
+For each log the manifest records its size and modification time, the
+schema version of the field list it was decoded with, the options that
+change what is written and every output that was produced. A log only needs
+converting again if one of those has changed or an output has gone
+missing.
+'''
+
+import os
+import json
+import fc2archive
+from mwhlogging import mwhLogger
+
+MANIFEST_NAME = ".atom_manifest.json"
+
+# Bump this if the layout of the manifest changes.
+MANIFEST_FORMAT = 2
+
+class Manifest:
+    def __init__(self, path=MANIFEST_NAME):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path) as manifest_file:
+                data = json.load(manifest_file)
+            if data.get("format") == MANIFEST_FORMAT:
+                self.entries = data["files"]
+            else:
+                mwhLogger.warning(f"Ignoring {path}, it was written by a different version.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            mwhLogger.warning(f"Ignoring unreadable manifest {path}: {e}")
+
+    # options is a dict of the settings that change the output; it has to
+    # survive a round trip through JSON.
+    def _entry(self, fileName, schema, outputs, options) -> dict:
+        size, mtime = fc2archive.log_stat(fileName)
+        return {"size": size, "mtime": mtime, "schema": schema, "outputs": list(outputs), "options": dict(options or {})}
+
+    # True if fileName was converted to outputs (a list of paths) with this
+    # schema and options and neither the log nor any output has changed
+    # since.
+    def is_current(self, fileName, schema, outputs, options=None) -> bool:
+        entry = self.entries.get(os.path.abspath(fileName))
+        if entry == None or not all(os.path.exists(output) for output in outputs):
+            return False
+        return entry == self._entry(fileName, schema, outputs, options)
+
+    def record(self, fileName, schema, outputs, options=None):
+        self.entries[os.path.abspath(fileName)] = self._entry(fileName, schema, outputs, options)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, mode="w") as manifest_file:
+            json.dump({"format": MANIFEST_FORMAT, "files": self.entries}, manifest_file, indent=1)
+        os.replace(tmp, self.path)
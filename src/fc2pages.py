@@ -0,0 +1,100 @@
+'''
+Random access to the rows of a flight log, for showing it in a table.
+
+A table only ever shows a screenful of rows, so PagedRecords decodes the
+log a page of records at a time, straight out of the memory mapped file,
+when a row on that page is first asked for. The rows are formatted just like
+the cells of the CSV and the most recently used pages are kept, so
+scrolling back and forth doesn't decode them again. A long flight costs
+little more than a short one until it is scrolled through.
+
+    with fc2pages.PagedRecords("20250601123045.fc2") as records:
+        print(records.headings)
+        print(records.row(1000))
+
+Works without NumPy too, a record at a time.
+'''
+
+import collections
+import fc2decode
+import fc2flight
+
+np = fc2decode.np
+
+# Records decoded at once; a few screens full.
+PAGE_RECORDS = 256
+
+# Pages kept after they are decoded.
+CACHE_PAGES = 16
+
+class PagedRecords:
+    # schema is as for fc2flight.Flight. The "Return to Home" field is folded
+    # into the drone mode, just like the CSV, so it isn't a column.
+    def __init__(self, fileName, schema=None, pageSize=PAGE_RECORDS, cachePages=CACHE_PAGES):
+        self.flight = fc2flight.load_flight(fileName, schema)
+        self.fileName = fileName
+        self.count = self.flight.count
+        self.pageSize = pageSize
+        self.cachePages = cachePages
+        self.merge = fc2flight.DRONE_MODE in self.flight.fields and fc2flight.RETURN_HOME in self.flight.fields
+        self.headings = [name for name in self.flight.names if not (self.merge and name == fc2flight.RETURN_HOME)]
+        self._fields = [self.flight.fields[name] for name in self.headings]
+        if self.merge:
+            self._fields.append(self.flight.fields[fc2flight.RETURN_HOME])
+        self._index = [self.flight.names.index(name) for name in self.headings]
+        self._pages = collections.OrderedDict()
+
+    def __len__(self):
+        return self.count
+
+    # Row n as a list of strings, one per heading.
+    def row(self, n) -> list:
+        if n < 0:
+            n += self.count
+        if n < 0 or n >= self.count:
+            raise IndexError(f"Record {n} is not in {self.fileName}")
+        return self.page(n // self.pageSize)[n % self.pageSize]
+
+    # The rows of page number p, decoding it if it isn't cached.
+    def page(self, p) -> list:
+        rows = self._pages.get(p)
+        if rows != None:
+            self._pages.move_to_end(p)
+            return rows
+        rows = self._decode_page(p)
+        self._pages[p] = rows
+        if len(self._pages) > self.cachePages:
+            self._pages.popitem(last=False)
+        return rows
+
+    def _decode_page(self, p) -> list:
+        first = p * self.pageSize
+        stop = min(first + self.pageSize, self.count)
+        if not fc2decode.HAVE_NUMPY:
+            return [self._format_row(self.flight.row(n)) for n in range(first, stop)]
+        source = self.flight.source
+        columns = fc2decode.atom_decode(self._fields, source.read(first, stop), self.flight.timeStamp, source.recordLen)
+        if self.merge:
+            columns[fc2flight.DRONE_MODE] = fc2decode.drone_mode(columns[fc2flight.DRONE_MODE], columns[fc2flight.RETURN_HOME])
+        text = [list(map(str, fc2decode.column_values(flfd, columns[flfd.name]))) for flfd in self._fields[:len(self.headings)]]
+        return [list(row) for row in zip(*text)]
+
+    # Format a row from fc2flight.Flight.row() like a CSV line.
+    def _format_row(self, row) -> list:
+        values = [row[i] for i in self._index]
+        if self.merge and row[self.flight.names.index(fc2flight.RETURN_HOME)] != 0:
+            mode = self.headings.index(fc2flight.DRONE_MODE)
+            if values[mode] == "Flying":
+                values[mode] = "RTH"
+        return ["" if v == None else str(v) for v in values]
+
+    def close(self):
+        self._pages.clear()
+        self.flight.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
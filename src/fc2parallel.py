@@ -0,0 +1,123 @@
+'''
+Decode one large flight log in several worker processes at once.
+
+Records are a fixed size, so a log splits cleanly into record aligned
+ranges. Only the file name, the schema and a range of record numbers go to
+each worker; the worker maps the file itself (see fc2flight) and decodes
+just its own range, so no record bytes are pickled. What comes back is
+merged in file order:
+
+- decode_columns() returns the decoded columns, for the columnar output,
+  the sinks, resampling and so on,
+- write_csv() has the workers format their ranges as CSV text as well,
+  which is where most of the time goes, and writes the text in order.
+
+Logs inside archives can't be mapped and aren't split; see can_split().
+'''
+
+import io
+import os
+import itertools
+import concurrent.futures
+import fc2archive
+import fc2csv
+import fc2decode
+import fc2flight
+import fc2stats
+import fc2validate
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+# Ranges smaller than this aren't worth a process.
+CHUNK_MIN_RECORDS = 16384
+
+# Each worker gets this many ranges, so that the ranges finish at different
+# times and the output can be written while the rest are still decoding.
+CHUNKS_PER_JOB = 4
+
+# The number of worker processes for jobs, where 0 means one per CPU.
+def job_count(jobs) -> int:
+    if jobs == 0:
+        return os.cpu_count() or 1
+    return jobs
+
+# Split count records into at most chunks ranges of about the same size.
+def chunk_ranges(count, chunks, minRecords=CHUNK_MIN_RECORDS) -> list:
+    chunks = max(1, min(chunks, count // minRecords))
+    bounds = [count * i // chunks for i in range(chunks + 1)]
+    return [range(bounds[i], bounds[i + 1]) for i in range(chunks)]
+
+# True if fileName is worth decoding with jobs processes.
+def can_split(fileName, count, jobs) -> bool:
+    return jobs > 1 and count >= 2 * CHUNK_MIN_RECORDS and not fc2archive.is_member(fileName)
+
+# Worker: decode the fields in one range of records, as they are in the log.
+def _decode_range(fileName, fields, records):
+    with fc2flight.load_flight(fileName, fields, records=records) as flight:
+        source = flight.source
+        return fc2decode.atom_decode(fields, source.buffer, flight.timeStamp, source.recordLen)
+
+# Worker: decode one range of records and format it as CSV lines, without
+# the header. fields are the output columns; schema also has the fields
+# they are made from. keep, if given, is the mask of the records in the
+# range to write. Returns the text, the number of records and the number of
+# bad records.
+def _format_range(fileName, schema, fields, records, keep=None):
+    text = io.StringIO()
+    rCount = 0
+    eCount = 0
+    with fc2flight.load_flight(fileName, schema, records=records) as flight, \
+         fc2csv.CSVWriter(None, None, csv_file=text) as csv_file:
+        if fc2decode.HAVE_NUMPY:
+            columns = flight.columns([flfd.name for flfd in fields])
+            if keep is not None:
+                columns = fc2validate.select(columns, keep)
+            csv_file.write_columns([fc2decode.column_values(flfd, columns[flfd.name]) for flfd in fields])
+            rCount = len(columns[fields[0].name])
+        else:
+            for record in flight.records(keep):
+                rCount += 1
+                row = [record[flfd.name] for flfd in fields]
+                bad = [flfd.name for flfd, data in zip(fields, row) if data == None]
+                if len(bad) > 0:
+                    mwhLogger.warning(f"Illegal value for {bad[0]}. Skipping.")
+                    eCount += 1
+                else:
+                    csv_file.write_row(row)
+    return text.getvalue(), rCount, eCount
+
+def _pool(jobs, ranges):
+    return concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(ranges)))
+
+# Decode the fields of fileName (count records long) in jobs processes.
+# Returns the columns, like fc2decode.atom_decode().
+def decode_columns(fileName, fields, count, jobs, stats=None) -> dict:
+    names = [flfd.name for flfd in fields]
+    ranges = chunk_ranges(count, jobs)
+    mwhLogger.debug(f"Decoding {fileName} in {len(ranges)} ranges.")
+    with _pool(jobs, ranges) as pool:
+        parts = list(pool.map(_decode_range, itertools.repeat(fileName), itertools.repeat(fields), ranges))
+    with fc2stats.phase(stats, "merge"):
+        return {name: np.concatenate([part[name] for part in parts]) for name in names}
+
+# Decode and format fileName (count records long) in jobs processes and
+# write the rows in order to csv_file, an fc2csv.CSVWriter (or anything else
+# with a write_text()). schema, fields and keep (here for the whole log) are
+# as for _format_range(). Returns the number of records and the number of
+# bad records.
+def write_csv(fileName, schema, fields, csv_file, count, jobs, keep=None):
+    ranges = chunk_ranges(count, jobs * CHUNKS_PER_JOB)
+    mwhLogger.debug(f"Converting {fileName} in {len(ranges)} ranges.")
+    rCount = 0
+    eCount = 0
+    with _pool(jobs, ranges) as pool:
+        futures = [pool.submit(_format_range, fileName, schema, fields, records,
+                               None if keep is None else keep[records.start:records.stop])
+                   for records in ranges]
+        for future in futures:
+            text, rPart, ePart = future.result()
+            csv_file.write_text(text)
+            rCount += rPart
+            eCount += ePart
+    return rCount, eCount
@@ -0,0 +1,120 @@
+'''
+Zero-copy access to the records of an Atom flight log.
+
+FC2Reader memory maps a log file and hands out memoryview slices of the
+mapping, one per 512 byte record, so that nothing is copied until a field is
+actually unpacked (use struct.unpack_from() on the record). blocks() hands
+out many records at a time, for decoding a column at a time; a log in an
+archive (fc2archive.ArchiveReader) can only be streamed that way.
+
+follow_records() reads a log that is still being written instead.
+'''
+
+import os
+import mmap
+import time
+from mwhlogging import mwhLogger
+
+ATOM_RECORD_LEN = 512
+
+class FC2Reader:
+    def __init__(self, fileName, recordLen=ATOM_RECORD_LEN):
+        self.fileName = fileName
+        self.recordLen = recordLen
+        self._file = open(fileName, mode="rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # Any partial trailing record is ignored.
+        self.count = size // recordLen
+        if self.count == 0:
+            # mmap can't map an empty file.
+            self._map = None
+            self.buffer = memoryview(b"")
+        else:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buffer = memoryview(self._map)[:self.count * recordLen]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        buffer = self.buffer
+        recordLen = self.recordLen
+        for pos in range(0, self.count * recordLen, recordLen):
+            yield buffer[pos:pos + recordLen]
+
+    # Return record number n (starting at zero) without copying it.
+    def record(self, n):
+        if n < 0 or n >= self.count:
+            raise IndexError(f"Record {n} is not in {self.fileName}")
+        pos = n * self.recordLen
+        return self.buffer[pos:pos + self.recordLen]
+
+    # Records first to stop (not included), without copying them.
+    def read(self, first, stop):
+        return self.buffer[first * self.recordLen:stop * self.recordLen]
+
+    # Iterate over all the records blockRecords at a time (all at once if
+    # None). See buffer_blocks().
+    def blocks(self, blockRecords=None):
+        return buffer_blocks(self.buffer, self.recordLen, blockRecords)
+
+    def close(self):
+        try:
+            self.buffer.release()
+            if self._map != None:
+                self._map.close()
+        except BufferError:
+            # Somebody still holds a record (or a NumPy column) from this
+            # file. The mapping goes away when the last of them does.
+            mwhLogger.debug(f"{self.fileName} is still in use, leaving it mapped.")
+        self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# Iterate over the whole records in buffer, blockRecords at a time or all at
+# once if blockRecords is None, as memoryviews. There is always at least one
+# block, even if it is empty, so that decoding the blocks and joining the
+# results gives empty columns for an empty log.
+def buffer_blocks(buffer, recordLen, blockRecords=None):
+    size = len(buffer) // recordLen * recordLen
+    step = size if blockRecords == None else blockRecords * recordLen
+    yield buffer[:step]
+    for pos in range(step, size, max(step, 1)):
+        yield buffer[pos:pos + step]
+
+# Follow a log that is still being written, like "tail -f". Yields a list of
+# the complete records (as bytes) that have been appended since the last
+# poll, starting with the ones already in the file. A partially written
+# record is held back until the rest of it arrives. The file is polled every
+# interval seconds; following stops after idleTimeout seconds without new
+# data, or never if idleTimeout is None.
+def follow_records(fileName, recordLen=ATOM_RECORD_LEN, interval=0.25, idleTimeout=None):
+    pending = b""
+    idle = 0.0
+    with open(fileName, mode="rb", buffering=0) as flight_file:
+        while True:
+            data = flight_file.read()
+            if data:
+                idle = 0.0
+                pending += data
+                count = len(pending) // recordLen
+                if count > 0:
+                    yield [pending[pos:pos + recordLen] for pos in range(0, count * recordLen, recordLen)]
+                    pending = pending[count * recordLen:]
+                continue
+
+            if os.stat(fileName).st_size < flight_file.tell():
+                mwhLogger.warning(f"{fileName} was truncated, no longer following it.")
+                return
+            if idleTimeout != None and idle >= idleTimeout:
+                if len(pending) > 0:
+                    mwhLogger.warning(f"Ignoring {len(pending)} bytes of an incomplete record at the end of {fileName}.")
+                return
+            time.sleep(interval)
+            idle += interval
@@ -0,0 +1,114 @@
+'''
+Resample decoded flight log columns to a fixed rate.
+
+The FC2 logs hold far more records than Telemetry Overlay needs. resample()
+picks evenly spaced times (5, 10 or 30 Hz, or a video frame rate such as
+29.97) from the elapsed time of the records and computes every column at
+those times, a whole column at a time:
+
+- numbers are interpolated linearly and rounded like their scale function
+  rounds them,
+- angles (the _r2d fields, such as heading and wind direction) are
+  interpolated the short way around the circle,
+- text, enums and counters are carried forward from the last record at or
+  before each time.
+
+The clock of some logs starts again part way through, when a second flight
+is logged in the same file. Each run of records whose time goes forward is
+resampled on its own, so the output starts again with it.
+
+Requires NumPy.
+'''
+
+import fractions
+import fc2decode
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+# The column that holds the time of each record, in ms.
+ELAPSED = "elapsed (ms)"
+
+# Numeric fields that are identifiers rather than measurements.
+CARRY_FIELDS = ["rid", "Flight Counter"]
+
+# Decimal places each scale function rounds to.
+SCALE_DECIMALS = {"_fix_lat_lon": 7, "_fix_alt": 3, "_round2": 2, "_r2d": 3}
+
+# Parse a rate in Hz: "10", "29.97" or a frame rate like "30000/1001".
+def parse_rate(text) -> float:
+    rate = float(fractions.Fraction(text))
+    if rate <= 0:
+        raise ValueError(f"Bad rate {text}")
+    return rate
+
+# The elapsed times (ms) to resample the records at, from times.
+def sample_times(times, rate):
+    if len(times) == 0:
+        return np.zeros(0)
+    step = 1000.0 / rate
+    count = int(np.floor((float(times[-1]) - float(times[0])) / step)) + 1
+    return float(times[0]) + step * np.arange(count)
+
+# Interpolate angles in degrees the short way around the circle. A NaN angle
+# (only kept with --no-validate) is left out of the unwrapping, so that it
+# spoils the samples next to it, as it would in any other column, and not
+# every angle after it.
+def interpolate_angle(t, times, column):
+    column = column.astype(np.float64)
+    finite = np.isfinite(column)
+    unwrapped = np.full(len(column), np.nan)
+    unwrapped[finite] = np.degrees(np.unwrap(np.radians(column[finite])))
+    return np.interp(t, times, unwrapped) % 360
+
+# Resample columns (as returned by fc2decode.atom_decode(), for the fields
+# in fieldList) to rate Hz. Returns a new dict of columns.
+def resample(fieldList, columns, rate, timeName=ELAPSED) -> dict:
+    times = columns[timeName].astype(np.float64)
+    restarts = (np.flatnonzero(times[1:] < times[:-1]) + 1).tolist()
+    if len(restarts) > 0:
+        mwhLogger.info(f"{timeName} starts again {len(restarts)} times; resampling each run of records on its own.")
+    bounds = [0] + restarts + [len(times)]
+    parts = []
+    for first, stop in zip(bounds, bounds[1:]):
+        run = {flfd.name: columns[flfd.name][first:stop] for flfd in fieldList}
+        parts.append(_resample_run(fieldList, run, times[first:stop], rate, timeName))
+    return fc2decode.join_columns(parts)
+
+# Resample one run of records, whose times never go backwards.
+def _resample_run(fieldList, columns, times, rate, timeName) -> dict:
+    # Only records that move time forward can be interpolated between.
+    keep = np.ones(len(times), dtype=bool)
+    keep[1:] = times[1:] > times[:-1]
+    if not keep.all():
+        mwhLogger.warning(f"Ignoring {int((~keep).sum())} records with the same {timeName} as the one before.")
+        times = times[keep]
+
+    t = sample_times(times, rate)
+    # The last record at or before each sample time.
+    before = np.maximum(np.searchsorted(times, t, side="right") - 1, 0)
+
+    result = {}
+    with np.errstate(invalid="ignore"):
+        for flfd in fieldList:
+            column = columns[flfd.name][keep]
+            scale = getattr(flfd.scale, "__name__", "")
+            # fc2derived fields say how they are rounded.
+            decimals = getattr(flfd, "decimals", SCALE_DECIMALS.get(scale))
+            if flfd.name == timeName:
+                result[flfd.name] = np.rint(t).astype(column.dtype)
+            elif column.dtype == object or column.dtype.kind in "USb" or flfd.name in CARRY_FIELDS:
+                result[flfd.name] = column[before]
+            elif scale == "_r2d":
+                result[flfd.name] = np.round(interpolate_angle(t, times, column), decimals)
+            else:
+                values = np.interp(t, times, column.astype(np.float64))
+                if column.dtype.kind in "iu":
+                    result[flfd.name] = np.rint(values).astype(column.dtype)
+                elif decimals != None:
+                    # + 0.0 keeps negative zeros out of the CSV.
+                    result[flfd.name] = np.round(values, decimals) + 0.0
+                else:
+                    result[flfd.name] = values
+    mwhLogger.debug(f"Resampled {len(times)} records to {len(t)} at {rate:g} Hz.")
+    return result
@@ -0,0 +1,163 @@
+'''
+Extract a time window from an Atom flight log without decoding all of it.
+
+The elapsed time at byte offset 5 of every record normally goes up from one
+record to the next, so the records that fall inside a window can be found
+with a binary search. Only the elapsed times are read, not the rest of the
+records, and all of them are checked to be in order first: the clock of
+some logs restarts part way through, and a binary search would then only
+find one of the runs of records inside the window. If they aren't in order,
+every record in the window is found with a linear scan instead.
+
+Window limits are given as elapsed milliseconds ("65000"), a time of day
+("12:31:05.5", on the day the log was started) or a full date and time
+("2025-06-01 12:31:05" or "20250601123105").
+'''
+
+import re
+import bisect
+import struct
+import datetime
+import fc2decode
+import fc2reader
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+# Where the elapsed time (in ms) is kept in every record.
+ELAPSED_OFFSET = 5
+ELAPSED_FORMAT = "<Q"
+
+# Parse a window limit. Returns elapsed ms as an int, a datetime.time or a
+# datetime.datetime. Raises ValueError if text is none of them.
+def parse_time(text):
+    text = text.strip()
+    if re.fullmatch(r"\d{1,13}", text):
+        return int(text)
+    if re.fullmatch(r"\d{14}", text):
+        return datetime.datetime.strptime(text, "%Y%m%d%H%M%S")
+    if re.fullmatch(r"\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?", text):
+        if text[1] == ":":
+            text = "0" + text
+        return datetime.time.fromisoformat(text)
+    return datetime.datetime.fromisoformat(text)
+
+# Turn a limit from parse_time() into elapsed ms for a log that was started
+# at timeStamp (ms since the epoch). None stays None.
+def elapsed_ms(value, timeStamp):
+    if value == None or isinstance(value, int):
+        return value
+    start = datetime.datetime.fromtimestamp(timeStamp / 1000)
+    if isinstance(value, datetime.time):
+        when = datetime.datetime.combine(start.date(), value)
+        # A log that was started before midnight.
+        if when < start - datetime.timedelta(hours=12):
+            when += datetime.timedelta(days=1)
+        value = when
+    return round(value.timestamp() * 1000 - timeStamp)
+
+# A subset of the records of an FC2Reader (or an fc2archive.ArchiveReader)
+# that can be used in its place: it has the same fileName, recordLen and
+# count attributes, read(), blocks() and record(), can be iterated over and
+# is closed before the reader. records is a range or a list of record
+# numbers.
+class RecordWindow:
+    def __init__(self, reader, records):
+        self.fileName = reader.fileName
+        self.recordLen = reader.recordLen
+        self.records = records
+        self.count = len(records)
+        if isinstance(records, range) and records.step == 1:
+            self.buffer = reader.read(records.start, records.stop)
+        else:
+            self.buffer = memoryview(b"".join(reader.record(n) for n in records))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        buffer = self.buffer
+        recordLen = self.recordLen
+        for pos in range(0, self.count * recordLen, recordLen):
+            yield buffer[pos:pos + recordLen]
+
+    # Return record number n of the window.
+    def record(self, n):
+        if n < 0 or n >= self.count:
+            raise IndexError(f"Record {n} is not in this window of {self.fileName}")
+        pos = n * self.recordLen
+        return self.buffer[pos:pos + self.recordLen]
+
+    # Records first to stop (not included) of the window.
+    def read(self, first, stop):
+        return self.buffer[first * self.recordLen:stop * self.recordLen]
+
+    def blocks(self, blockRecords=None):
+        return fc2reader.buffer_blocks(self.buffer, self.recordLen, blockRecords)
+
+    # Let go of the records, so that the reader can be closed.
+    def close(self):
+        self.buffer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# The elapsed times of every record of reader: with NumPy a strided view of
+# each block of records (nothing is copied from a mapped log), otherwise a
+# list.
+def elapsed_column(reader, offset=ELAPSED_OFFSET, fmt=ELAPSED_FORMAT):
+    recordLen = reader.recordLen
+    if fc2decode.HAVE_NUMPY and reader.count > 0:
+        dtype = np.dtype(fmt)
+        parts = [np.ndarray((len(block) // recordLen,), dtype=dtype, buffer=block, offset=offset, strides=(recordLen,))
+                 for block in reader.blocks()]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+    unpack_from = struct.Struct(fmt).unpack_from
+    return [unpack_from(record, offset)[0] for record in reader]
+
+# True if times never go backwards.
+def in_order(times) -> bool:
+    if fc2decode.HAVE_NUMPY and not isinstance(times, list):
+        return bool(np.all(times[1:] >= times[:-1]))
+    return all(a <= b for a, b in zip(times, times[1:]))
+
+# Find the records of reader whose elapsed time is between start and end ms
+# (inclusive, None means no limit) and return them as a RecordWindow.
+def seek_window(reader, start=None, end=None, offset=ELAPSED_OFFSET, fmt=ELAPSED_FORMAT) -> RecordWindow:
+    times = elapsed_column(reader, offset, fmt)
+    count = len(times)
+    if in_order(times):
+        first = 0 if start == None else bisect.bisect_left(times, start)
+        stop = count if end == None else bisect.bisect_right(times, end)
+        stop = max(first, stop)
+        del times
+        mwhLogger.debug(f"Found records {first} to {stop - 1} of {reader.fileName}.")
+        return RecordWindow(reader, range(first, stop))
+
+    # The clock went backwards: check every record.
+    mwhLogger.warning(f"Timestamps in {reader.fileName} are out of order. Checking every record.")
+    if fc2decode.HAVE_NUMPY and not isinstance(times, list):
+        inside = np.ones(count, dtype=bool)
+        if start != None:
+            inside &= times >= start
+        if end != None:
+            inside &= times <= end
+        records = np.flatnonzero(inside).tolist()
+    else:
+        records = [n for n in range(count)
+                   if (start == None or times[n] >= start) and (end == None or times[n] <= end)]
+    del times
+    return RecordWindow(reader, records)
+
+# The records of reader that fall inside window, a (start, end) pair of
+# limits from parse_time() for a log started at timeStamp. With no window
+# the reader itself is returned.
+def select(reader, window, timeStamp):
+    if window == None:
+        return reader
+    start, end = window
+    return seek_window(reader, elapsed_ms(start, timeStamp), elapsed_ms(end, timeStamp))
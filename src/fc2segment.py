@@ -0,0 +1,156 @@
+'''
+Split an Atom flight log into flights.
+
+One log can hold idle time and several take-offs and landings. A take-off
+shows up as a change of the Flight Counter (offset 17) or as the drone mode
+(offset 456) switching to Launching. Each flight starts where the motors were
+started for that take-off: the beginning of the run of "active" records it
+is in, active meaning that at least one motor (offsets 297, 299, 301 and 303)
+is running or that the drone mode isn't Idle/Off. Idle records before the
+first flight belong to it, and idle records after a landing belong to the
+flight that landed.
+
+Only the few bytes needed are read from each record, so finding the flights
+costs far less than decoding the log. The result is a list of flights (one
+dict each) that can be saved as a JSON index next to the per-flight output.
+'''
+
+import json
+import struct
+import fc2decode
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+# (name, format, offset) of every byte the segmentation looks at.
+SEGMENT_LAYOUT = [
+    ("elapsed", "<Q", 5),
+    ("counter", "<H", 17),
+    ("motor1", "<B", 297),
+    ("motor2", "<B", 299),
+    ("motor3", "<B", 301),
+    ("motor4", "<B", 303),
+    ("mode", "<B", 456),
+]
+
+# Motor states that mean the motor is turning: idle, low, medium, high.
+MOTORS_ON = (4, 7)
+
+# Drone modes.
+MODE_IDLE = 0
+MODE_LAUNCHING = 1
+
+# Read the SEGMENT_LAYOUT fields of every record of reader (an FC2Reader,
+# fc2seek.RecordWindow or fc2archive.ArchiveReader). Returns a dict of NumPy
+# arrays, or of lists if NumPy isn't available.
+def segment_fields(reader) -> dict:
+    if fc2decode.HAVE_NUMPY:
+        dtype = np.dtype({"names": [f[0] for f in SEGMENT_LAYOUT],
+                          "formats": [fc2decode._numpy_format(f[1]) for f in SEGMENT_LAYOUT],
+                          "offsets": [f[2] for f in SEGMENT_LAYOUT],
+                          "itemsize": reader.recordLen})
+        parts = []
+        for block in reader.blocks():
+            records = np.frombuffer(block, dtype=dtype, count=len(block) // reader.recordLen)
+            # Copy, so that nothing holds on to the reader's records.
+            parts.append({f[0]: np.array(records[f[0]]) for f in SEGMENT_LAYOUT})
+        return fc2decode.join_columns(parts)
+
+    fields = {f[0]: [] for f in SEGMENT_LAYOUT}
+    unpackers = [(fields[name], struct.Struct(fmt).unpack_from, offset) for name, fmt, offset in SEGMENT_LAYOUT]
+    for record in reader:
+        for values, unpack_from, offset in unpackers:
+            values.append(unpack_from(record, offset)[0])
+    return fields
+
+# True for every record where a motor is running or the drone isn't idle.
+def active_records(fields):
+    low, high = MOTORS_ON
+    if fc2decode.HAVE_NUMPY:
+        motors = np.stack([fields[f"motor{m}"] for m in range(1, 5)])
+        return (fields["mode"] != MODE_IDLE) | ((motors >= low) & (motors <= high)).any(axis=0)
+    motors = list(zip(*[fields[f"motor{m}"] for m in range(1, 5)]))
+    return [mode != MODE_IDLE or any(low <= m <= high for m in states)
+            for mode, states in zip(fields["mode"], motors)]
+
+# The record number where each flight starts, from the fields returned by
+# segment_fields() and the active flags of active_records().
+def flight_starts(fields, active) -> list:
+    counter = fields["counter"]
+    mode = fields["mode"]
+    count = len(counter)
+    if fc2decode.HAVE_NUMPY:
+        takeoffs = np.flatnonzero((counter[1:] != counter[:-1]) |
+                                  ((mode[1:] == MODE_LAUNCHING) & (mode[:-1] != MODE_LAUNCHING))) + 1
+        # Where the run of active records that each record is in started.
+        index = np.arange(count)
+        runStart = np.maximum.accumulate(np.where(active, -1, index)) + 1
+        starts = np.where(active[takeoffs], runStart[takeoffs], takeoffs)
+        starts = np.unique(starts).tolist()
+        hasActive = bool(active.any())
+    else:
+        starts = []
+        runStart = 0
+        for n in range(count):
+            if not active[n]:
+                runStart = n + 1
+            if n > 0 and (counter[n] != counter[n - 1] or
+                          (mode[n] == MODE_LAUNCHING and mode[n - 1] != MODE_LAUNCHING)):
+                start = runStart if active[n] else n
+                if len(starts) == 0 or starts[-1] != start:
+                    starts.append(start)
+        hasActive = any(active)
+
+    if not hasActive:
+        return []
+    # Idle records before the first take-off belong to the first flight. A
+    # log that starts in the air has a flight before its first take-off.
+    if len(starts) > 0 and not any(active[:starts[0]]):
+        starts = starts[1:]
+    return [0] + starts
+
+# Find the flights in reader. Returns a list with one dict per flight and the
+# active flags of every record (see active_records()).
+def find_flights(reader):
+    fields = segment_fields(reader)
+    active = active_records(fields)
+    starts = flight_starts(fields, active)
+    flights = []
+    for n, first in enumerate(starts):
+        stop = starts[n + 1] if n + 1 < len(starts) else reader.count
+        if fc2decode.HAVE_NUMPY:
+            on = np.flatnonzero(active[first:stop]) + first
+            counter = int(fields["counter"][first:stop].max())
+        else:
+            on = [i for i in range(first, stop) if active[i]]
+            counter = max(fields["counter"][first:stop])
+        elapsed = fields["elapsed"]
+        flights.append({
+            "flight": n + 1,
+            "counter": counter,
+            "first": first,
+            "last": stop - 1,
+            "records": stop - first,
+            "active": len(on),
+            "start (ms)": int(elapsed[first]),
+            "end (ms)": int(elapsed[stop - 1]),
+            "motors on (ms)": int(elapsed[on[0]]) if len(on) > 0 else None,
+            "motors off (ms)": int(elapsed[on[-1]]) if len(on) > 0 else None,
+        })
+    mwhLogger.debug(f"Found {len(flights)} flights in {reader.fileName}.")
+    return flights, active
+
+# The record numbers of flight to write out. With trim, only the active ones.
+def flight_records(flight, active, trim=False):
+    first = flight["first"]
+    stop = flight["last"] + 1
+    if not trim:
+        return range(first, stop)
+    if fc2decode.HAVE_NUMPY:
+        return np.flatnonzero(active[first:stop]) + first
+    return [n for n in range(first, stop) if active[n]]
+
+# Save the flight index of one log.
+def save_index(fileName, logName, flights):
+    with open(fileName, mode="w") as index_file:
+        json.dump({"log": logName, "flights": flights}, index_file, indent=1)
@@ -0,0 +1,252 @@
+'''
+Output sinks: the file formats a decoded flight log can be written as.
+
+Every sink picks the columns it needs (fields, None meaning all of them) and
+is handed batches of decoded values, one list per column, as produced by
+fc2decode.column_values() or by the compiled decoder. A FanOut feeds one
+decode to any number of sinks, so writing a CSV, a GPX track and a GeoJSON
+file costs a single decode of the log.
+
+    csv      Telemetry Overlay CSV, every column.
+    gpx      GPX 1.1 track with elevation and time.
+    kml      KML LineString, for Google Earth.
+    geojson  GeoJSON LineString feature with per-point times.
+'''
+
+import json
+import math
+import shutil
+import datetime
+import tempfile
+import fc2csv
+import fc2stats
+from xml.sax.saxutils import escape
+
+# Column names the track sinks use.
+LAT = "lat (deg)"
+LON = "lon (deg)"
+ALT = "alt (m)"
+ELAPSED = "elapsed (ms)"
+
+# Rows are handed to the sinks this many at a time by FanOut.write_row().
+SINK_BATCH_ROWS = fc2csv.CSV_BATCH_ROWS
+
+# The GeoJSON times are kept in memory up to this many bytes, and spooled to a
+# temporary file after that.
+TIMES_SPOOL_BYTES = 1024 * 1024
+
+class Sink:
+    # The columns this sink wants, or None for all of them.
+    fields = None
+    extension = None
+
+    # baseName is the output file name without its extension, headings are
+    # all of the columns that are available and timeStamp is the time the
+    # log was started, in ms.
+    def __init__(self, baseName, headings, timeStamp, stats=None):
+        self.fileName = f"{baseName}.{self.extension}"
+        self.headings = headings
+        self.timeStamp = timeStamp
+        self.stats = stats
+
+    # Write a batch. columns maps each name in fields to a list of values.
+    def write(self, columns):
+        pass
+
+    def close(self):
+        pass
+
+class CSVSink(Sink):
+    extension = "csv"
+
+    def __init__(self, baseName, headings, timeStamp, stats=None):
+        super().__init__(baseName, headings, timeStamp, stats)
+        self.writer = fc2csv.CSVWriter(self.fileName, headings, stats=stats)
+
+    def write(self, columns):
+        self.writer.write_columns([columns[name] for name in self.headings])
+
+    # Write rows that are already formatted as CSV lines.
+    def write_text(self, text):
+        self.writer.write_text(text)
+
+    def close(self):
+        self.writer.close()
+
+# Base for the sinks that write a track of positions. Points without a GPS
+# position are left out, and so is an altitude that isn't a number (NaN,
+# only kept with --no-validate), since none of the formats allow one.
+class TrackSink(Sink):
+    fields = [LAT, LON, ALT, ELAPSED]
+
+    def __init__(self, baseName, headings, timeStamp, stats=None):
+        super().__init__(baseName, headings, timeStamp, stats)
+        self.track_file = open(self.fileName, mode="w", buffering=fc2csv.CSV_BUFFER_SIZE)
+        self.points = 0
+        with fc2stats.phase(self.stats, "write"):
+            self.track_file.write(self.header())
+
+    # ISO 8601 UTC time of a record.
+    def iso_time(self, elapsed) -> str:
+        when = datetime.datetime.fromtimestamp((self.timeStamp + elapsed) / 1000, tz=datetime.timezone.utc)
+        return when.strftime("%Y-%m-%dT%H:%M:%S.") + f"{when.microsecond // 1000:03d}Z"
+
+    def write(self, columns):
+        with fc2stats.phase(self.stats, "format"):
+            text = [self.point(lat, lon, alt, elapsed)
+                    for lat, lon, alt, elapsed in zip(columns[LAT], columns[LON], columns[ALT], columns[ELAPSED])
+                    if lat != "" and lon != ""]
+        with fc2stats.phase(self.stats, "write"):
+            self.track_file.write("".join(text))
+        self.points += len(text)
+
+    def close(self):
+        if not self.track_file.closed:
+            with fc2stats.phase(self.stats, "write"):
+                self.track_file.write(self.footer())
+                self.track_file.close()
+
+    # True if alt can be written.
+    def has_alt(self, alt) -> bool:
+        return not (isinstance(alt, float) and not math.isfinite(alt))
+
+    def header(self) -> str:
+        return ""
+
+    def point(self, lat, lon, alt, elapsed) -> str:
+        return ""
+
+    def footer(self) -> str:
+        return ""
+
+class GPXSink(TrackSink):
+    extension = "gpx"
+
+    def header(self) -> str:
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="AtomDataExtractor" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                f'<trk><name>{escape(self.fileName)}</name><trkseg>\n')
+
+    def point(self, lat, lon, alt, elapsed) -> str:
+        ele = f"<ele>{alt}</ele>" if self.has_alt(alt) else ""
+        return f'<trkpt lat="{lat}" lon="{lon}">{ele}<time>{self.iso_time(elapsed)}</time></trkpt>\n'
+
+    def footer(self) -> str:
+        return "</trkseg></trk>\n</gpx>\n"
+
+class KMLSink(TrackSink):
+    extension = "kml"
+
+    def header(self) -> str:
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+                f'<Placemark><name>{escape(self.fileName)}</name><LineString>\n'
+                '<altitudeMode>relativeToGround</altitudeMode><coordinates>\n')
+
+    def point(self, lat, lon, alt, elapsed) -> str:
+        if not self.has_alt(alt):
+            return f"{lon},{lat}\n"
+        return f"{lon},{lat},{alt}\n"
+
+    def footer(self) -> str:
+        return "</coordinates></LineString></Placemark>\n</Document></kml>\n"
+
+# The coordinates are written as they arrive. Their times follow them in the
+# file, so they are spooled (see TIMES_SPOOL_BYTES) and copied in at the end.
+class GeoJSONSink(TrackSink):
+    extension = "geojson"
+
+    def __init__(self, baseName, headings, timeStamp, stats=None):
+        super().__init__(baseName, headings, timeStamp, stats)
+        self.times = tempfile.SpooledTemporaryFile(max_size=TIMES_SPOOL_BYTES, mode="w+")
+        self.timeCount = 0
+
+    def header(self) -> str:
+        return '{"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": {"type": "LineString", "coordinates": [\n'
+
+    def point(self, lat, lon, alt, elapsed) -> str:
+        separator = "" if self.timeCount == 0 else ","
+        self.times.write(f'{", " if self.timeCount > 0 else ""}"{self.iso_time(elapsed)}"')
+        self.timeCount += 1
+        if not self.has_alt(alt):
+            return f"{separator}[{lon}, {lat}]\n"
+        return f"{separator}[{lon}, {lat}, {alt}]\n"
+
+    def close(self):
+        if not self.track_file.closed:
+            with fc2stats.phase(self.stats, "write"):
+                self.track_file.write(f']}}, "properties": {{"name": {json.dumps(self.fileName)}, "coordTimes": [')
+                self.times.seek(0)
+                shutil.copyfileobj(self.times, self.track_file)
+                self.track_file.write("]}}]}\n")
+                self.track_file.close()
+        self.times.close()
+
+SINKS = {
+    "csv": CSVSink,
+    "gpx": GPXSink,
+    "kml": KMLSink,
+    "geojson": GeoJSONSink,
+}
+
+# Feeds one decode to several sinks. Only the columns that some sink wants
+# need to be formatted; see fields.
+class FanOut:
+    # formats is a list of names from SINKS.
+    def __init__(self, formats, baseName, headings, timeStamp, stats=None):
+        self.headings = headings
+        self.sinks = []
+        self.rows = []
+        try:
+            for name in formats:
+                self.sinks.append(SINKS[name](baseName, headings, timeStamp, stats))
+        except:
+            self.close()
+            raise
+        wanted = set()
+        for sink in self.sinks:
+            wanted.update(headings if sink.fields == None else sink.fields)
+        # In the order of headings.
+        self.fields = [name for name in headings if name in wanted]
+
+    def file_names(self) -> list:
+        return [sink.fileName for sink in self.sinks]
+
+    # Write a batch of columns, a dict with (at least) a list for every name
+    # in fields.
+    def write(self, columns):
+        for sink in self.sinks:
+            if sink.fields == None:
+                sink.write(columns)
+            else:
+                sink.write({name: columns[name] for name in sink.fields})
+
+    # Write rows that are already formatted as CSV lines. Only works when
+    # every sink is a CSVSink.
+    def write_text(self, text):
+        self._write_pending()
+        for sink in self.sinks:
+            sink.write_text(text)
+
+    # Queue one row, with a value for every heading.
+    def write_row(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= SINK_BATCH_ROWS:
+            self._write_pending()
+
+    def _write_pending(self):
+        if len(self.rows) > 0:
+            self.write(dict(zip(self.headings, map(list, zip(*self.rows)))))
+            self.rows = []
+
+    def close(self):
+        self._write_pending()
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,125 @@
+'''
+Timing statistics for the converters' --stats mode.
+
+A Stats object collects the time spent in each phase of a conversion (read,
+decode, format, write) and in the scale function of each FLFD. Phases can
+nest; a phase only counts the time that isn't spent in the phases inside it.
+
+Everything here is only called when --stats is given. With stats set to
+None the converters use phase(), which hands back a shared do-nothing
+context, and skip the per-field and per-record timers entirely.
+'''
+
+import json
+import time
+import contextlib
+from mwhlogging import mwhLogger
+
+PHASES = ["read", "decode", "format", "write"]
+
+_NO_PHASE = contextlib.nullcontext()
+
+# Time a phase if stats is a Stats object, otherwise do nothing.
+def phase(stats, name):
+    if stats == None:
+        return _NO_PHASE
+    return stats.phase(name)
+
+class Stats:
+    def __init__(self, fileName=None):
+        self.fileName = fileName
+        self.phases = {}
+        # field name -> [scale function name, seconds]
+        self.fields = {}
+        self.records = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self._start = time.perf_counter()
+        # Time spent in nested phases, one entry per open phase.
+        self._nested = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - self._nested.pop()
+            if len(self._nested) > 0:
+                self._nested[-1] += elapsed
+
+    # Wrap func so that every call is counted as phase name.
+    def timed(self, name, func):
+        def timed_func(*args):
+            with self.phase(name):
+                return func(*args)
+        return timed_func
+
+    # Add seconds spent applying the scale of one FLFD.
+    def add_field(self, flfd, seconds):
+        if flfd.name not in self.fields:
+            self.fields[flfd.name] = [getattr(flfd.scale, "__name__", str(flfd.scale)), 0.0]
+        self.fields[flfd.name][1] += seconds
+
+    # Wrap the converter for flfd so that each call is added to its time.
+    def timed_field(self, flfd, convert):
+        perf_counter = time.perf_counter
+        def timed_convert(data):
+            start = perf_counter()
+            result = convert(data)
+            self.add_field(flfd, perf_counter() - start)
+            return result
+        return timed_convert
+
+    # Call when the conversion is over.
+    def finish(self, records, bytes):
+        self.records = records
+        self.bytes = bytes
+        self.seconds = time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        return {
+            "file": self.fileName,
+            "records": self.records,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "records_per_sec": self.records / self.seconds if self.seconds > 0 else 0.0,
+            "bytes_per_sec": self.bytes / self.seconds if self.seconds > 0 else 0.0,
+            "phases": dict(self.phases),
+            "fields": {name: {"scale": scale, "seconds": seconds} for name, (scale, seconds) in self.fields.items()},
+        }
+
+# Add up the stats of several files. Rates are based on the summed times,
+# i.e. what one core managed.
+def summarize(results) -> dict:
+    total = {"file": f"{len(results)} files", "records": 0, "bytes": 0, "seconds": 0.0, "phases": {}, "fields": {}}
+    for result in results:
+        for key in ["records", "bytes", "seconds"]:
+            total[key] += result[key]
+        for name, seconds in result["phases"].items():
+            total["phases"][name] = total["phases"].get(name, 0.0) + seconds
+        for name, field in result["fields"].items():
+            entry = total["fields"].setdefault(name, {"scale": field["scale"], "seconds": 0.0})
+            entry["seconds"] += field["seconds"]
+    seconds = total["seconds"]
+    total["records_per_sec"] = total["records"] / seconds if seconds > 0 else 0.0
+    total["bytes_per_sec"] = total["bytes"] / seconds if seconds > 0 else 0.0
+    return total
+
+# Log a stats dict in human readable form.
+def report(result, topFields=8):
+    mwhLogger.info(f"Stats for {result['file']}: {result['records']} records, {result['bytes'] / 1e6:.1f} MB in {result['seconds']:.3f}s. "
+                   f"{result['records_per_sec']:.0f} records/s, {result['bytes_per_sec'] / 1e6:.1f} MB/s.")
+    names = PHASES + [name for name in result["phases"] if name not in PHASES]
+    phases = [f"{name} {result['phases'][name]:.3f}s" for name in names if name in result["phases"]]
+    mwhLogger.info(f"  Phases: {', '.join(phases)}.")
+    fields = sorted(result["fields"].items(), key=lambda f: f[1]["seconds"], reverse=True)[:topFields]
+    if len(fields) > 0:
+        text = [f"{name} ({field['scale']}) {field['seconds']:.3f}s" for name, field in fields]
+        mwhLogger.info(f"  Slowest scale functions: {', '.join(text)}.")
+
+def save_json(fileName, results):
+    with open(fileName, mode="w") as json_file:
+        json.dump({"files": results, "total": summarize(results)}, json_file, indent=1)
@@ -0,0 +1,224 @@
+#!python3
+'''
+Generate synthetic Atom 2 flight logs.
+
+The records follow the layout documented in README.md: a take off, a loop
+around the home point, a return to home and a landing, with motor states, a
+draining battery and GPS data that change the way they do in a real log.
+Unknown regions are left as zeros. Files are named after their start time,
+just like the ones written by the PTD-1, so the converters accept them.
+'''
+
+import os
+import sys
+import argparse
+import datetime
+import mwhlogging
+from mwhlogging import mwhLogger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ATOM_RECORD_LEN = 512
+
+# Milliseconds between records.
+SYNTH_INTERVAL = 100
+
+# Records are built and written this many at a time.
+SYNTH_CHUNK = 65536
+
+# Where the synthetic flights take off.
+SYNTH_HOME = (40.1310941, -75.4461272)
+
+# The record layout from README.md, as (name, type, offset).
+SYNTH_LAYOUT = [
+    ("rid", "<i4", 0),
+    ("elapsed", "<u8", 5),
+    ("u13", "<u2", 13),
+    ("u15", "<u2", 15),
+    ("counter", "<u2", 17),
+    ("gps_lock", "u1", 45),
+    ("satellites", "u1", 46),
+    ("lat", "<i4", 47),
+    ("lon", "<i4", 51),
+    ("gps_quality", "<i4", 55),
+    ("confidence1", "<f4", 59),
+    ("confidence2", "<f4", 63),
+    ("confidence3", "<f4", 67),
+    ("motor1_data", "u1", 296),
+    ("motor1", "u1", 297),
+    ("motor2_data", "u1", 298),
+    ("motor2", "u1", 299),
+    ("motor3_data", "u1", 300),
+    ("motor3", "u1", 301),
+    ("motor4_data", "u1", 302),
+    ("motor4", "u1", 303),
+    ("pos_x", "<f4", 304),
+    ("pos_y", "<f4", 308),
+    ("pitch", "<f4", 312),
+    ("roll", "<f4", 316),
+    ("alt", "<f4", 328),
+    ("heading", "<f4", 376),
+    ("vel_x", "<f4", 380),
+    ("vel_y", "<f4", 384),
+    ("vel_z", "<f4", 388),
+    ("speed", "<f4", 392),
+    ("c5050", "<f4", 400),
+    ("wind", "<f4", 408),
+    ("thrust", "<f4", 412),
+    ("dist", "<f4", 416),
+    ("home_lat", "<i4", 420),
+    ("home_lon", "<i4", 424),
+    ("rth", "u1", 429),
+    ("flight_mode", "u1", 433),
+    ("battery_v1", "<i2", 440),
+    ("battery_v2", "<i2", 442),
+    ("battery_current", "<i2", 444),
+    ("battery_temp", "u1", 446),
+    ("battery_level", "u1", 451),
+    ("drone_mode", "u1", 456),
+    ("positioning", "u1", 457),
+]
+
+def synth_dtype():
+    return np.dtype({"names": [f[0] for f in SYNTH_LAYOUT],
+                     "formats": [f[1] for f in SYNTH_LAYOUT],
+                     "offsets": [f[2] for f in SYNTH_LAYOUT],
+                     "itemsize": ATOM_RECORD_LEN})
+
+# Build records first..first+n-1 of a log that is total records long.
+def synth_records(first, n, total, counter=42, seed=0):
+    rng = np.random.default_rng(seed + first)
+    rec = np.zeros(n, dtype=synth_dtype())
+    i = np.arange(first, first + n)
+    # Fraction of the way through the log, 0 to 1.
+    t = i / max(total - 1, 1)
+
+    # Phases: idle, launching, flying (with RTH at the end), landing, idle.
+    launch, fly, rth, land, done = 0.05, 0.08, 0.80, 0.92, 0.96
+    flying = (t >= fly) & (t < land)
+    airborne = (t >= launch) & (t < done)
+    drone_mode = np.select([t < launch, t < fly, t < land, t < done], [0, 1, 2, 3], 0)
+
+    rec["rid"] = i
+    rec["elapsed"] = 5000 + i * SYNTH_INTERVAL
+    rec["u13"] = np.where(t < 0.01, 0, 30)
+    rec["u15"] = rec["u13"]
+    rec["counter"] = counter + (t >= launch)
+    rec["drone_mode"] = drone_mode
+    rec["rth"] = (t >= rth) & (t < land)
+    rec["flight_mode"] = 8
+    rec["positioning"] = 3
+
+    # GPS locks on shortly after the log starts.
+    locked = t >= 0.01
+    rec["gps_lock"] = np.where(locked, 3, 0)
+    rec["satellites"] = np.where(locked, 14 + rng.integers(0, 4, n), 0)
+    rec["gps_quality"] = np.where(locked, 900 + rng.integers(0, 100, n), 0)
+    rec["confidence1"] = np.where(locked, 0.0, 1.0)
+    rec["confidence2"] = np.where(locked, 0.8, 5.0)
+    rec["confidence3"] = np.where(locked, 1.5, 10.0)
+
+    # Climb to 60 m, fly three quarters of a loop that starts at home, then
+    # return to home in a straight line.
+    climb = np.clip((t - launch) / (fly - launch), 0, 1)
+    descend = np.clip((done - t) / (done - land), 0, 1)
+    alt = np.where(airborne, 60.0 * np.minimum(climb, descend), 0.0)
+    radius = 150.0
+    loop = 1.5 * np.pi * np.clip((t - fly) / (rth - fly), 0, 1)
+    back = np.where(t < rth, 1.0, np.clip((land - t) / (land - rth), 0, 1))
+    east = (radius - radius * np.cos(loop)) * back
+    north = radius * np.sin(loop) * back
+    home_lat, home_lon = SYNTH_HOME
+    lat = home_lat + north / 111320.0
+    lon = home_lon + east / (111320.0 * np.cos(np.radians(home_lat)))
+    rec["lat"] = np.where(locked, np.round(lat * 1e7), 0)
+    rec["lon"] = np.where(locked, np.round(lon * 1e7), 0)
+    rec["home_lat"] = np.where(locked, round(home_lat * 1e7), 0)
+    rec["home_lon"] = np.where(locked, round(home_lon * 1e7), 0)
+    rec["pos_x"] = east
+    rec["pos_y"] = north
+    rec["dist"] = np.hypot(east, north)
+    rec["alt"] = -alt # The log stores altitude as a negative number.
+
+    # Heading follows the direction of travel, in radians.
+    seconds = total * SYNTH_INTERVAL / 1000
+    heading = np.where(t < rth, loop, np.arctan2(-1.0, 1.0))
+    speed = np.where(t < rth, 1.5 * np.pi * radius / ((rth - fly) * seconds),
+                     np.sqrt(2) * radius / ((land - rth) * seconds))
+    speed = np.where(flying, speed, 0.0)
+    rec["heading"] = np.arctan2(np.sin(heading), np.cos(heading))
+    rec["speed"] = speed
+    rec["vel_x"] = speed * np.sin(heading)
+    rec["vel_y"] = speed * np.cos(heading)
+    rec["vel_z"] = np.gradient(alt) * 1000 / SYNTH_INTERVAL if n > 1 else 0.0
+    rec["pitch"] = np.where(flying, 0.05, 0.0) + rng.normal(0, 0.01, n)
+    rec["roll"] = np.where(flying, 0.02, 0.0) + rng.normal(0, 0.01, n)
+    rec["c5050"] = 50.5
+    rec["wind"] = 1.2 + rng.normal(0, 0.05, n)
+    rec["thrust"] = np.where(airborne, 0.55 + rng.normal(0, 0.03, n), 0.0)
+
+    # Motors are off, idle while launching and working hard while flying.
+    for m in range(1, 5):
+        state = np.select([t < launch, t < fly, flying, t < done], [3, 4, 5 + rng.integers(0, 3, n), 5], 3)
+        rec[f"motor{m}"] = state
+        rec[f"motor{m}_data"] = np.where(state == 3, 182, 120 + rng.integers(0, 60, n))
+
+    # The battery drains while the motors run.
+    used = np.clip((t - launch) / (done - launch), 0, 1)
+    rec["battery_level"] = np.round(98 - 75 * used)
+    rec["battery_v1"] = np.round(8350 - 1200 * used + rng.normal(0, 5, n))
+    rec["battery_v2"] = rec["battery_v1"] + 10
+    current = np.where(flying, 9000, np.where(airborne, 6000, 300)) + rng.integers(-200, 200, n)
+    rec["battery_current"] = -current # Stored as a negative drain.
+    rec["battery_temp"] = np.round(24 + 20 * used)
+    return rec
+
+# Write a synthetic log of count records into directory. Returns its path.
+def write_synthetic(directory, count, start=None, counter=42, seed=0) -> str:
+    if start == None:
+        start = datetime.datetime(2025, 6, 1, 12, 30, 45)
+    path = os.path.join(directory, f"{start:%Y%m%d%H%M%S}.fc2")
+    with open(path, mode="wb") as flight_file:
+        for first in range(0, count, SYNTH_CHUNK):
+            n = min(SYNTH_CHUNK, count - first)
+            flight_file.write(synth_records(first, n, count, counter, seed).tobytes())
+    return path
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic Atom 2 flight logs for testing and benchmarking.")
+    parser.add_argument("-l","--log", type=int, help="Set log level. 0=error, higher values increase logging.", default=2)
+    parser.add_argument("-n","--records", type=int, help="Number of records in each log.", default=18000)
+    parser.add_argument("-c","--count", type=int, help="Number of logs to generate.", default=1)
+    parser.add_argument("-o","--output", help="Directory to write the logs into.", default=".")
+    parser.add_argument("-s","--seed", type=int, help="Random seed.", default=0)
+    parser.add_argument("--start", help="Start time of the first log, as YYYYmmddHHMMSS.", default="20250601123045")
+    args = parser.parse_args()
+
+    match args.log:
+        case 0:
+            mwhLogger.setLevel(mwhlogging.ERROR)
+        case 1:
+            mwhLogger.setLevel(mwhlogging.WARNING)
+        case 2:
+            mwhLogger.setLevel(mwhlogging.INFO)
+        case _:
+            mwhLogger.setLevel(mwhlogging.DEBUG)
+
+    if np == None:
+        mwhLogger.error(f"The log generator requires NumPy.")
+        sys.exit(-1)
+
+    start = datetime.datetime.strptime(args.start, "%Y%m%d%H%M%S")
+    os.makedirs(args.output, exist_ok=True)
+    for n in range(args.count):
+        # Each log starts after the previous one would have finished.
+        begin = start + datetime.timedelta(milliseconds=n * (args.records * SYNTH_INTERVAL + 600000))
+        path = write_synthetic(args.output, args.records, begin, 42 + n, args.seed + n)
+        mwhLogger.info(f"Wrote {args.records} records to {path}.")
+
+if __name__ == '__main__':
+    main()
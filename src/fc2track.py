@@ -0,0 +1,234 @@
+'''
+The flight path, simplified for drawing on a map.
+
+A log has a position for every record, far more than a map can show as
+pins. Track ranks every point by how much it matters to the shape of the
+path, using Douglas-Peucker: a point's rank is the largest tolerance (in
+meters) at which Douglas-Peucker would still keep it. So one pass over the
+positions gives every level of detail at once, and level(tolerance) is just
+the points ranked above it. The levels in LEVEL_TOLERANCES are worked out
+up front; for_zoom() picks the one that suits a map zoom level, where
+dropping a point moves the line by less than a pixel or so.
+
+events() finds the take-offs, the starts of return to home and the
+landings, so that they can be marked on the map.
+
+Works without NumPy too, on lists, for the packaged viewer.
+'''
+
+import math
+import bisect
+import fc2decode
+import fc2derived
+import fc2flight
+import fc2segment
+
+np = fc2decode.np
+
+LAT = "lat (deg)"
+LON = "lon (deg)"
+
+# Tolerances, in meters, of the levels of detail worked out in advance.
+LEVEL_TOLERANCES = [2.0 ** k for k in range(-1, 13)]
+
+# Points that would move the path by less than this are never kept, except
+# the ends. Hovering makes long runs of points that only differ by GPS noise.
+MIN_TOLERANCE = LEVEL_TOLERANCES[0]
+
+# The path may be off by this many pixels on the map.
+PIXEL_TOLERANCE = 2
+
+# Meters per pixel at the equator at zoom level 0, for web map tiles.
+EQUATOR_METERS_PER_PIXEL = 156543.03392
+
+# Positions as meters east and north of (lat0, lon0). Close enough over the
+# few kilometers of a flight.
+def to_meters(lat, lon, lat0, lon0):
+    y = (lat - lat0) * math.pi / 180 * fc2derived.EARTH_RADIUS
+    x = (lon - lon0) * math.pi / 180 * fc2derived.EARTH_RADIUS * math.cos(math.radians(lat0))
+    return x, y
+
+# The point strictly between first and last that is furthest from the line
+# through them (or from first, if last is in the same place), and how far.
+def farthest(x, y, first, last):
+    dx = x[last] - x[first]
+    dy = y[last] - y[first]
+    length = math.hypot(dx, dy)
+    if fc2decode.HAVE_NUMPY:
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        if length == 0:
+            distance = np.hypot(px, py)
+        else:
+            distance = np.abs(px * dy - py * dx) / length
+        i = int(np.argmax(distance))
+        return first + 1 + i, float(distance[i])
+    best = first + 1
+    bestDistance = -1.0
+    for n in range(first + 1, last):
+        px = x[n] - x[first]
+        py = y[n] - y[first]
+        distance = math.hypot(px, py) if length == 0 else abs(px * dy - py * dx) / length
+        if distance > bestDistance:
+            best = n
+            bestDistance = distance
+    return best, bestDistance
+
+# The Douglas-Peucker rank of every point of the path (x, y): the largest
+# tolerance at which it is kept. The ends are always kept.
+def ranks(x, y, minTolerance=MIN_TOLERANCE):
+    count = len(x)
+    rank = np.zeros(count) if fc2decode.HAVE_NUMPY else [0.0] * count
+    if count == 0:
+        return rank
+    rank[0] = rank[-1] = math.inf
+    pending = [(0, count - 1, math.inf)]
+    while len(pending) > 0:
+        first, last, limit = pending.pop()
+        if last - first < 2:
+            continue
+        n, distance = farthest(x, y, first, last)
+        if distance < minTolerance:
+            # Nothing in between is worth keeping at any level.
+            continue
+        # A point is only kept if the one that split the path around it is.
+        rank[n] = min(distance, limit)
+        pending.append((first, n, rank[n]))
+        pending.append((n, last, rank[n]))
+    return rank
+
+# Meters per pixel of a map at zoom level zoom, at latitude lat.
+def meters_per_pixel(zoom, lat) -> float:
+    return EQUATOR_METERS_PER_PIXEL * math.cos(math.radians(lat)) / 2 ** zoom
+
+# True if v is a decoded latitude or longitude, rather than a missing one
+# (NaN in an array, "" in a list).
+def has_position(v) -> bool:
+    return isinstance(v, (int, float)) and not math.isnan(v)
+
+# Join the columns of several chunks of records, from Flight.chunks().
+def concatenate(parts):
+    if fc2decode.HAVE_NUMPY:
+        return np.concatenate(parts) if len(parts) > 0 else np.zeros(0)
+    return [v for part in parts for v in part]
+
+class Track:
+    # lat and lon are the decoded columns, with no value where there is no
+    # position.
+    def __init__(self, lat, lon):
+        if fc2decode.HAVE_NUMPY:
+            lat = np.asarray(lat, dtype=np.float64)
+            lon = np.asarray(lon, dtype=np.float64)
+            # Record numbers of the records that have a position.
+            self.records = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+            self.lat = lat[self.records]
+            self.lon = lon[self.records]
+        else:
+            self.records = [n for n in range(len(lat)) if has_position(lat[n]) and has_position(lon[n])]
+            self.lat = [float(lat[n]) for n in self.records]
+            self.lon = [float(lon[n]) for n in self.records]
+        if len(self.records) == 0:
+            x, y = self.lat, self.lon
+        elif fc2decode.HAVE_NUMPY:
+            x, y = to_meters(self.lat, self.lon, self.lat[0], self.lon[0])
+        else:
+            points = [to_meters(lat, lon, self.lat[0], self.lon[0]) for lat, lon in zip(self.lat, self.lon)]
+            x = [p[0] for p in points]
+            y = [p[1] for p in points]
+        self.rank = ranks(x, y)
+        self.levels = {tolerance: self._ranked(tolerance) for tolerance in LEVEL_TOLERANCES}
+
+    def __len__(self):
+        return len(self.records)
+
+    def _ranked(self, tolerance):
+        if fc2decode.HAVE_NUMPY:
+            return np.flatnonzero(self.rank >= tolerance)
+        return [i for i, rank in enumerate(self.rank) if rank >= tolerance]
+
+    # The points kept at tolerance meters, as indexes into lat and lon.
+    def level(self, tolerance):
+        index = self.levels.get(tolerance)
+        if index is None:
+            index = self._ranked(tolerance)
+        return index
+
+    # The coarsest level that is still good to PIXEL_TOLERANCE pixels at
+    # zoom, with at most maxPoints points. Returns the tolerance and the
+    # points, as for level().
+    def for_zoom(self, zoom, maxPoints=None):
+        lat = self.lat[0] if len(self.lat) > 0 else 0.0
+        wanted = meters_per_pixel(zoom, lat) * PIXEL_TOLERANCE
+        tolerances = [t for t in LEVEL_TOLERANCES if t <= wanted] or LEVEL_TOLERANCES[:1]
+        tolerance = tolerances[-1]
+        for t in LEVEL_TOLERANCES[len(tolerances) - 1:]:
+            tolerance = t
+            if maxPoints == None or len(self.levels[t]) <= maxPoints:
+                break
+        return tolerance, self.levels[tolerance]
+
+    # The (lat, lon) of the points in index, from level().
+    def points(self, index) -> list:
+        if fc2decode.HAVE_NUMPY:
+            return list(zip(self.lat[index].tolist(), self.lon[index].tolist()))
+        return [(self.lat[i], self.lon[i]) for i in index]
+
+    # The record numbers of the points in index, from level().
+    def record_numbers(self, index) -> list:
+        if fc2decode.HAVE_NUMPY:
+            return self.records[index].tolist()
+        return [self.records[i] for i in index]
+
+    # The position at record n, or the nearest one to it if it has none.
+    def position(self, n):
+        if len(self.records) == 0:
+            return None
+        i = bisect.bisect_left(self.records, n)
+        if i == len(self.records) or (i > 0 and self.records[i] - n > n - self.records[i - 1]):
+            i -= 1
+        return float(self.lat[i]), float(self.lon[i])
+
+# The records of flight (a dict from fc2segment.find_flights()) where a
+# return to home starts, from the decoded drone mode.
+def rth_starts(flight, mode) -> list:
+    first = flight["first"]
+    stop = flight["last"] + 1
+    if fc2decode.HAVE_NUMPY:
+        rth = mode[first:stop] == "RTH"
+        starts = (np.flatnonzero(rth[1:] & ~rth[:-1]) + first + 1).tolist()
+    else:
+        rth = [value == "RTH" for value in mode[first:stop]]
+        starts = [first + i for i in range(1, len(rth)) if rth[i] and not rth[i - 1]]
+    if len(rth) > 0 and rth[0]:
+        starts = [first] + starts
+    return starts
+
+# The take-offs, returns to home and landings in flight (an fc2flight.Flight),
+# in order, as (name, record number). With more than one flight in the log
+# the names are numbered.
+def events(flight) -> list:
+    flights, active = fc2segment.find_flights(flight.source)
+    mode = flight[fc2flight.DRONE_MODE] if fc2flight.DRONE_MODE in flight else None
+    result = []
+    for f in flights:
+        suffix = f" {f['flight']}" if len(flights) > 1 else ""
+        on = fc2segment.flight_records(f, active, trim=True)
+        if len(on) == 0:
+            continue
+        result.append((f"take-off{suffix}", int(on[0])))
+        if mode is not None:
+            result += [(f"return to home{suffix}", n) for n in rth_starts(f, mode)]
+        result.append((f"landing{suffix}", int(on[-1])))
+    return sorted(result, key=lambda event: event[1])
+
+# The events() of flight with their positions on track, as
+# (name, record number, (lat, lon)).
+def event_marks(track, flight) -> list:
+    marks = [(name, n, track.position(n)) for name, n in events(flight)]
+    return [mark for mark in marks if mark[2] != None]
+
+# The Track of flight and its event_marks().
+def load_track(flight):
+    columns = flight.columns([LAT, LON])
+    track = Track(columns[LAT], columns[LON])
+    return track, event_marks(track, flight)
@@ -0,0 +1,221 @@
+'''
+Sanity checks for flight logs, a whole column at a time.
+
+validate() reads the raw values of the fields of every record and applies
+these rules to them, each one giving a mask of the records it fails:
+
+    not a number   a float field with a scale function is NaN or infinite
+    out of range   a latitude beyond 90 degrees or a longitude beyond 180
+    out of order   an elapsed time that doesn't fit between its neighbours
+    unknown        an enum value the scale function has no name for
+
+Records that fail any of the first three are bad: the converters leave them
+out of the output and carry on. Unknown enum values are only reported,
+since several of the enums are still being worked out and the rest of the
+record is fine. Both kinds are listed, with their reasons and the raw
+record, in <baseName>.quarantine.csv (see write_quarantine()).
+
+Works without NumPy too; the masks are then lists.
+'''
+
+import math
+import fc2decode
+import fc2stats
+from mwhlogging import mwhLogger
+
+np = fc2decode.np
+
+ELAPSED = "elapsed (ms)"
+
+QUARANTINE_SUFFIX = ".quarantine.csv"
+
+# What the enum scale functions call a value they don't know.
+UNKNOWN = " Unknown"
+
+# The largest latitude or longitude, by field name.
+def lat_lon_limit(name) -> int:
+    return 90 if "lat" in name.lower() else 180
+
+# Reads the raw value of a field, without its scale.
+class RawField:
+    def __init__(self, flfd):
+        self.name = flfd.name
+        self.fmt_string = flfd.fmt_string
+        self.start_pos = flfd.start_pos
+        self.length = flfd.length
+        self.scale = None
+
+# The rules that fail in a log: for each reason, the mask of the records it
+# applies to and whether those records are dropped.
+class Problems:
+    def __init__(self, count):
+        self.count = count
+        self.reasons = []
+
+    def add(self, reason, mask, drop=True):
+        if any(mask) if not fc2decode.HAVE_NUMPY else mask.any():
+            self.reasons.append((reason, mask, drop))
+
+    # Mask of the records to leave out.
+    def bad(self):
+        masks = [mask for reason, mask, drop in self.reasons if drop]
+        if not fc2decode.HAVE_NUMPY:
+            return [any(flags) for flags in zip(*masks)] if len(masks) > 0 else [False] * self.count
+        if len(masks) == 0:
+            return np.zeros(self.count, dtype=bool)
+        return np.logical_or.reduce(masks)
+
+    # Mask of the records to keep.
+    def good(self):
+        if not fc2decode.HAVE_NUMPY:
+            return [not flag for flag in self.bad()]
+        return ~self.bad()
+
+    def dropped(self) -> int:
+        return sum(self.bad()) if not fc2decode.HAVE_NUMPY else int(self.bad().sum())
+
+    # The numbers of the records with any problem, and their reasons.
+    def records(self) -> dict:
+        result = {}
+        for reason, mask, drop in self.reasons:
+            index = [n for n, flag in enumerate(mask) if flag] if not fc2decode.HAVE_NUMPY else np.flatnonzero(mask).tolist()
+            for n in index:
+                result.setdefault(n, []).append(reason)
+        return dict(sorted(result.items()))
+
+    # Number of records per reason, and whether they are dropped.
+    def summary(self) -> dict:
+        return {reason: (sum(mask) if not fc2decode.HAVE_NUMPY else int(mask.sum()), drop) for reason, mask, drop in self.reasons}
+
+# Only the values of columns (a dict of columns) for the records in keep,
+# a mask.
+def select(columns, keep) -> dict:
+    if not fc2decode.HAVE_NUMPY:
+        return {name: [v for v, flag in zip(column, keep) if flag] for name, column in columns.items()}
+    return {name: column[keep] for name, column in columns.items()}
+
+# Only the record numbers in records that are in keep, a mask.
+def keep_records(records, keep):
+    if not fc2decode.HAVE_NUMPY:
+        return [n for n in records if keep[n]]
+    records = np.asarray(records, dtype=np.int64)
+    return records[keep[records]]
+
+def _raw_columns(fields, source) -> dict:
+    fields = [RawField(flfd) for flfd in fields]
+    if fc2decode.HAVE_NUMPY:
+        parts = []
+        for block in source.blocks():
+            records = fc2decode.atom_records(fields, block, source.recordLen)
+            parts.append({flfd.name: records[flfd.name] for flfd in fields})
+        return fc2decode.join_columns(parts)
+    decode = fc2decode.compile_schema(fields)
+    rows = [decode(record) for record in source]
+    return {flfd.name: [row[i] for row in rows] for i, flfd in enumerate(fields)}
+
+def _not_finite(column):
+    if not fc2decode.HAVE_NUMPY:
+        return [not math.isfinite(v) for v in column]
+    return ~np.isfinite(column)
+
+def _beyond(column, limit):
+    if not fc2decode.HAVE_NUMPY:
+        return [abs(v) > limit for v in column]
+    return np.abs(column.astype(np.int64)) > limit
+
+def _is_in(column, values):
+    if not fc2decode.HAVE_NUMPY:
+        values = set(values)
+        return [v in values for v in column]
+    return np.isin(column, list(values))
+
+# Records whose time isn't between the records either side of them, when
+# those two are in order. A clock that starts again (a new flight) is fine.
+def _out_of_order(column):
+    if not fc2decode.HAVE_NUMPY:
+        mask = [False] * len(column)
+        for n in range(1, len(column) - 1):
+            before, t, after = column[n - 1], column[n], column[n + 1]
+            mask[n] = before <= after and not (before <= t <= after)
+        return mask
+    t = column.astype(np.int64)
+    mask = np.zeros(len(t), dtype=bool)
+    if len(t) > 2:
+        before, now, after = t[:-2], t[1:-1], t[2:]
+        mask[1:-1] = (before <= after) & ((now < before) | (now > after))
+    return mask
+
+# The enum values scale has no name for.
+def _unknown_values(flfd) -> list:
+    low = -128 if flfd.fmt_string[-1] == "b" else 0
+    return [v for v in range(low, low + 256) if str(flfd.scale(v)).endswith(UNKNOWN)]
+
+# Check the records of source (an FC2Reader or anything like it) against
+# the rules, for the fields in fieldList. Returns the Problems found.
+def validate(fieldList, source, stats=None) -> Problems:
+    with fc2stats.phase(stats, "validate"):
+        checks = []
+        for flfd in fieldList:
+            scale = getattr(flfd.scale, "__name__", "")
+            if flfd.fmt_string == None:
+                continue
+            if flfd.fmt_string[-1] in "fd" and flfd.scale != None:
+                checks.append((flfd, "not a number"))
+            elif scale == "_fix_lat_lon":
+                checks.append((flfd, "out of range"))
+            elif flfd.name == ELAPSED:
+                checks.append((flfd, "out of order"))
+            elif flfd.length == 1 and callable(flfd.scale) and len(_unknown_values(flfd)) > 0:
+                checks.append((flfd, "unknown"))
+
+        problems = Problems(source.count)
+        columns = _raw_columns([flfd for flfd, rule in checks], source)
+        for flfd, rule in checks:
+            column = columns[flfd.name]
+            if rule == "not a number":
+                problems.add(f"{flfd.name} is not a number", _not_finite(column))
+            elif rule == "out of range":
+                problems.add(f"{flfd.name} is out of range", _beyond(column, lat_lon_limit(flfd.name) * 10**7))
+            elif rule == "out of order":
+                problems.add(f"{flfd.name} is out of order", _out_of_order(column))
+            else:
+                problems.add(f"unknown {flfd.name}", _is_in(column, _unknown_values(flfd)), drop=False)
+    return problems
+
+# Validate a fc2flight.Flight and report what was found, see report().
+# Returns the mask of the records to keep, or None if they are all good, and
+# the number of records left out.
+def check(flight, baseName, stats=None):
+    problems = flight.problems()
+    dropped = report(problems, flight.source, baseName, stats)
+    return (problems.good() if dropped > 0 else None), dropped
+
+# Write the records with problems to fileName: the record number, its byte
+# offset, whether it was dropped, the reasons and the raw record in hex.
+def write_quarantine(fileName, problems, source):
+    bad = problems.bad()
+    with open(fileName, mode="w") as quarantine_file:
+        quarantine_file.write("record, offset, action, reasons, data\n")
+        for n, reasons in problems.records().items():
+            action = "dropped" if bad[n] else "kept"
+            quarantine_file.write(f"{n}, {n * source.recordLen}, {action}, {'; '.join(reasons)}, {bytes(source.record(n)).hex()}\n")
+
+# Log what validate() found and write the quarantine file for baseName.
+# Returns the number of records dropped.
+def report(problems, source, baseName, stats=None) -> int:
+    if len(problems.reasons) == 0:
+        return 0
+    quarantine_name = f"{baseName}{QUARANTINE_SUFFIX}"
+    with fc2stats.phase(stats, "write"):
+        write_quarantine(quarantine_name, problems, source)
+    dropped = problems.dropped()
+    for reason, (count, drop) in problems.summary().items():
+        if drop:
+            mwhLogger.warning(f"{count} records of {source.fileName}: {reason}.")
+        else:
+            mwhLogger.info(f"{count} records of {source.fileName}: {reason}.")
+    if dropped > 0:
+        mwhLogger.warning(f"Left out {dropped} bad records of {source.fileName}; see {quarantine_name}.")
+    else:
+        mwhLogger.info(f"Listed the records with unknown values in {quarantine_name}.")
+    return dropped
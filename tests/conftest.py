@@ -0,0 +1,67 @@
+'''
+Shared fixtures for the tests of the command line tools and the fc2 modules
+in src.
+
+data/20250601123045.fc2 is 100 records of a log with random bytes in the
+unknown regions and enum values nobody has named yet, followed by 100
+records of a clean flight. data/*.csv are what the baseline csv_extractor.py
+and datadumper.py wrote for it, before any of the decoders were rewritten;
+the output must stay byte for byte the same.
+
+The tools are run in a subprocess, with and without NumPy, and always in
+UTC since the utc column depends on the local time zone.
+'''
+
+import os
+import sys
+import shutil
+import subprocess
+import pytest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(TESTS), "src")
+DATA = os.path.join(TESTS, "data")
+
+LOG_NAME = "20250601123045.fc2"
+LOG_RECORDS = 200
+
+sys.path.insert(0, SRC)
+
+try:
+    import numpy
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+needs_numpy = pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")
+
+# Run src/<tool> with args in cwd. Without NumPy, numpy can't be imported in
+# the subprocess, so the tool takes its pure Python path.
+def run_tool(tool, args, cwd, numpy=True):
+    env = dict(os.environ, TZ="UTC")
+    if numpy:
+        command = [sys.executable, os.path.join(SRC, tool)] + list(args)
+    else:
+        command = [sys.executable, "-c",
+                   "import sys, runpy; sys.modules['numpy'] = None; "
+                   f"sys.path.insert(0, {SRC!r}); sys.argv = sys.argv[1:]; "
+                   "runpy.run_path(sys.argv[0], run_name='__main__')",
+                   os.path.join(SRC, tool)] + list(args)
+    return subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+
+# The golden output of tool for the test log.
+def expected(tool) -> bytes:
+    with open(os.path.join(DATA, f"20250601123045.{os.path.splitext(tool)[0]}.csv"), mode="rb") as csv_file:
+        return csv_file.read()
+
+def read_bytes(path) -> bytes:
+    with open(path, mode="rb") as data_file:
+        return data_file.read()
+
+# A copy of the test log in a fresh directory, which is also where the
+# tools write their output.
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / LOG_NAME
+    shutil.copy(os.path.join(DATA, LOG_NAME), path)
+    return path
@@ -0,0 +1,82 @@
+'''
+The CSV written by both converters, on both decode paths, must be byte for
+byte what the baseline converters wrote.
+'''
+
+import os
+import math
+import struct
+import tarfile
+import zipfile
+import pytest
+from conftest import HAVE_NUMPY, needs_numpy, LOG_NAME, LOG_RECORDS, expected, read_bytes, run_tool
+
+TOOLS = ["csv_extractor.py", "datadumper.py"]
+
+ENGINES = [pytest.param(True, id="numpy", marks=pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")),
+           pytest.param(False, id="python")]
+
+@pytest.mark.parametrize("numpy", ENGINES)
+@pytest.mark.parametrize("tool", TOOLS)
+@pytest.mark.parametrize("args", [[], ["--no-validate"]], ids=["default", "no-validate"])
+def test_matches_baseline(tool, numpy, args, log_file):
+    result = run_tool(tool, args + [log_file.name], log_file.parent, numpy)
+    assert result.returncode == 0, result.stderr
+    assert read_bytes(log_file.with_suffix(".csv")) == expected(tool)
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")
+@pytest.mark.parametrize("tool", TOOLS)
+def test_cached_matches_baseline(tool, log_file):
+    # The second run reads the columns back from the cache.
+    for n in range(2):
+        result = run_tool(tool, ["--cache-dir", "cache", log_file.name], log_file.parent)
+        assert result.returncode == 0, result.stderr
+        assert read_bytes(log_file.with_suffix(".csv")) == expected(tool)
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")
+def test_parallel_files_match_baseline(log_file):
+    other = log_file.parent / "20250601123046.fc2"
+    other.write_bytes(log_file.read_bytes())
+    result = run_tool("csv_extractor.py", ["-j", "2", log_file.name, other.name], log_file.parent)
+    assert result.returncode == 0, result.stderr
+    assert read_bytes(log_file.with_suffix(".csv")) == expected("csv_extractor.py")
+    # Only the utc column depends on the file name.
+    assert len(read_bytes(other.with_suffix(".csv"))) == len(expected("csv_extractor.py"))
+
+@pytest.mark.parametrize("numpy", ENGINES)
+@pytest.mark.parametrize("tool", TOOLS)
+@pytest.mark.parametrize("archive", ["logs.zip", "logs.tar.gz"])
+def test_archived_matches_baseline(tool, numpy, archive, log_file):
+    path = log_file.parent / archive
+    if archive.endswith(".zip"):
+        with zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.write(log_file, arcname=LOG_NAME)
+    else:
+        with tarfile.open(path, mode="w:gz") as tar_file:
+            tar_file.add(log_file, arcname=LOG_NAME)
+    os.remove(log_file)
+    result = run_tool(tool, [archive], log_file.parent, numpy)
+    assert result.returncode == 0, result.stderr
+    assert read_bytes(log_file.with_suffix(".csv")) == expected(tool)
+
+# Offsets of the angles in the record: heading and wind direction.
+ANGLES = [376, 408]
+
+@needs_numpy
+@pytest.mark.parametrize("tool", TOOLS)
+@pytest.mark.parametrize("offset", ANGLES, ids=["heading", "wind"])
+def test_nan_angle_same_on_both_engines(tool, offset, log_file):
+    data = bytearray(log_file.read_bytes())
+    pos = 150 * 512 + offset
+    data[pos:pos + 4] = struct.pack("<f", math.nan)
+    log_file.write_bytes(bytes(data))
+    outputs = []
+    for numpy in [True, False]:
+        result = run_tool(tool, ["--no-validate", log_file.name], log_file.parent, numpy)
+        assert result.returncode == 0, result.stderr
+        assert f"{LOG_RECORDS} valid records" in result.stdout + result.stderr
+        outputs.append(read_bytes(log_file.with_suffix(".csv")))
+    assert outputs[0] == outputs[1]
+    lines = outputs[0].decode().splitlines()
+    assert len(lines) == 1 + LOG_RECORDS
+    assert "nan" in lines[1 + 150].split(", ")
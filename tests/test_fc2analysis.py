@@ -0,0 +1,76 @@
+'''
+fc2analysis accumulates its statistics a block of records at a time; the
+result mustn't depend on how the records are split into blocks.
+'''
+
+import functools
+import pytest
+import fc2analysis
+import fc2decode
+import fc2flight
+from conftest import LOG_RECORDS, needs_numpy
+
+pytestmark = needs_numpy
+
+np = fc2decode.np
+
+def analyze(fileNames, blockRecords):
+    schema = fc2flight.default_schema()
+    targetList = [flfd for flfd in schema if flfd.name in fc2analysis.ANALYSIS_TARGETS]
+    byteStats = fc2analysis.ByteStats()
+    correlations = fc2analysis.Correlations({flfd.name: (flfd.start_pos, flfd.length) for flfd in targetList})
+    for fileName in fileNames:
+        byteStats.new_file()
+        for records in fc2analysis.record_blocks(fileName, blockRecords=blockRecords):
+            byteStats.add(records)
+            correlations.add(records, fc2decode.atom_decode(targetList, records.reshape(-1), 0.0))
+    return byteStats.stats(), correlations.results()
+
+def test_blocks_dont_change_results(log_file):
+    other = log_file.parent / "20250601123046.fc2"
+    other.write_bytes(log_file.read_bytes()[::-1])
+    files = [str(log_file), str(other)]
+    whole = analyze(files, 1000)
+    split = analyze(files, 7)
+    for name in ["min", "max", "constant", "change_freq", "histogram"]:
+        assert np.array_equal(whole[0][name], split[0][name])
+    assert [c[:3] for c in whole[1]] == [c[:3] for c in split[1]]
+    assert np.allclose([c[3] for c in whole[1]], [c[3] for c in split[1]])
+
+def test_changes_not_counted_across_files(log_file):
+    records = np.frombuffer(log_file.read_bytes(), dtype=np.uint8).reshape(-1, 512)
+    stats = fc2analysis.ByteStats()
+    stats.new_file()
+    stats.add(records[:50])
+    stats.new_file()
+    stats.add(records[50:])
+    assert stats.pairs == len(records) - 2
+    changes = (records[1:] != records[:-1]).sum(axis=0) - (records[50] != records[49])
+    assert np.array_equal(stats.changes, changes)
+
+def test_sampled(log_file):
+    blocks = list(fc2analysis.record_blocks(str(log_file), maxRecords=30, blockRecords=8))
+    assert [len(block) for block in blocks] == [8, 8, 8, 6]
+
+# Big values that barely change, like a counter or a timestamp read as int32,
+# used to lose every significant digit of the correlation.
+def test_correlation_of_large_values():
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=3000)
+    x = np.stack([1e8 + y + rng.normal(scale=0.1, size=3000), -5e8 + y * 1e-3], axis=1)
+    x[::7, 1] = np.nan
+    valid = np.isfinite(x[:, 1])
+    expected = [np.corrcoef(x[:, 0], y)[0, 1], np.corrcoef(x[valid, 1], y[valid])[0, 1]]
+    blocks = [fc2analysis.correlation_moments(x[n:n + 700], y[n:n + 700]) for n in range(0, 3000, 700)]
+    merged = functools.reduce(fc2analysis.merge_moments, blocks)
+    assert fc2analysis.pearson(merged) == pytest.approx(expected, abs=1e-6)
+    assert fc2analysis.correlate(x, y) == pytest.approx(expected, abs=1e-6)
+
+def test_histogram_written(log_file, tmp_path):
+    prefix = str(tmp_path / "analysis")
+    fc2analysis.analyze([str(log_file)], fc2flight.default_schema(), fc2analysis.ANALYSIS_TARGETS, prefix)
+    with open(f"{prefix}_histogram.csv") as csv_file:
+        lines = csv_file.read().splitlines()
+    assert len(lines) == 1 + 512
+    counts = [[int(cell) for cell in line.split(", ")[2:]] for line in lines[1:]]
+    assert all(len(row) == 256 and sum(row) == LOG_RECORDS for row in counts)
@@ -0,0 +1,169 @@
+'''
+Logs in zip, tar and gzip archives read exactly like the plain log, a block
+of records at a time, and each archive is only indexed once, however many of
+its members are looked up or read.
+'''
+
+import os
+import gzip
+import tarfile
+import zipfile
+import pytest
+import fc2archive
+from conftest import HAVE_NUMPY, LOG_NAME, LOG_RECORDS, expected, read_bytes, run_tool
+
+RECORD_LEN = 512
+
+# The other logs in the test archives, so there is more than one member to
+# look up.
+OTHER_LOGS = ["20250601130000.fc2", "20250601140000.fc2"]
+
+def make_archive(kind, directory, log):
+    data = log.read_bytes()
+    if kind == "zip":
+        path = directory / "bundle.zip"
+        with zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            for name in [LOG_NAME] + OTHER_LOGS:
+                zip_file.writestr(f"logs/{name}", data)
+        return path, f"logs/{LOG_NAME}"
+    if kind == "gzip":
+        path = directory / f"{LOG_NAME}.gz"
+        with gzip.open(path, mode="wb") as gzip_file:
+            gzip_file.write(data)
+        return path, LOG_NAME
+    extension = {"tar": "", "gz": ".gz", "bz2": ".bz2", "xz": ".xz"}[kind]
+    path = directory / f"bundle.tar{extension}"
+    with tarfile.open(path, mode=f"w:{kind if extension else ''}") as tar_file:
+        for name in OTHER_LOGS[:1] + [LOG_NAME] + OTHER_LOGS[1:]:
+            tar_file.add(log, arcname=name)
+    return path, LOG_NAME
+
+KINDS = ["zip", "gzip", "tar", "gz", "bz2", "xz"]
+
+# An archive of the test log (and a couple of others) next to it, and the
+# path of the test log in it.
+@pytest.fixture(params=KINDS)
+def archived_log(request, log_file, monkeypatch):
+    monkeypatch.setattr(fc2archive, "_archives", {})
+    path, member = make_archive(request.param, log_file.parent, log_file)
+    return f"{path}/{member}"
+
+ENGINES = [pytest.param(True, id="numpy", marks=pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")),
+           pytest.param(False, id="python")]
+
+@pytest.mark.parametrize("numpy", ENGINES)
+def test_converts_like_plain_log(archived_log, log_file, numpy):
+    archive, member = fc2archive.split_path(archived_log)
+    os.remove(log_file)
+    result = run_tool("csv_extractor.py", [os.path.basename(archive)], log_file.parent, numpy)
+    assert result.returncode == 0, result.stderr
+    assert read_bytes(log_file.with_suffix(".csv")) == expected("csv_extractor.py")
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")
+def test_converts_in_parallel(archived_log, log_file):
+    # The workers must not share the parent's open archive.
+    archive, member = fc2archive.split_path(archived_log)
+    os.remove(log_file)
+    result = run_tool("csv_extractor.py", ["-j", "2", os.path.basename(archive)], log_file.parent)
+    assert result.returncode == 0, result.stderr
+    assert read_bytes(log_file.with_suffix(".csv")) == expected("csv_extractor.py")
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_keeps_index(archived_log, log_file, monkeypatch):
+    indexed = []
+    class CountingArchive(fc2archive.Archive):
+        def __init__(self, path):
+            indexed.append(path)
+            super().__init__(path)
+    monkeypatch.setattr(fc2archive, "Archive", CountingArchive)
+    data = log_file.read_bytes()
+    with fc2archive.open_log(archived_log) as reader:
+        reader.read(0, 1)
+        pid = os.fork()
+        if pid == 0:
+            # The worker reads its member through files of its own, without
+            # indexing the archive again.
+            with fc2archive.open_log(archived_log) as child:
+                same = b"".join(bytes(record) for record in child) == data and len(indexed) == 1
+            os._exit(0 if same else 1)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert bytes(reader.read(1, 2)) == data[RECORD_LEN:2 * RECORD_LEN]
+
+def test_reader_matches_plain_log(archived_log, log_file):
+    data = log_file.read_bytes()
+    with fc2archive.open_log(archived_log) as reader:
+        assert len(reader) == LOG_RECORDS
+        assert b"".join(bytes(record) for record in reader) == data
+        assert bytes(reader.record(LOG_RECORDS - 1)) == data[-RECORD_LEN:]
+        assert bytes(reader.record(10)) == data[10 * RECORD_LEN:11 * RECORD_LEN]
+        assert bytes(reader.read(150, 250)) == data[150 * RECORD_LEN:]
+        assert b"".join(reader.blocks()) == data
+
+def test_streamed_in_blocks(archived_log, log_file, monkeypatch):
+    monkeypatch.setattr(fc2archive, "STREAM_RECORDS", 64)
+    with fc2archive.open_log(archived_log) as reader:
+        blocks = list(reader.blocks())
+    assert [len(block) // RECORD_LEN for block in blocks] == [64, 64, 64, 8]
+    assert b"".join(blocks) == log_file.read_bytes()
+
+def test_empty_member(tmp_path):
+    path = tmp_path / f"{LOG_NAME}.gz"
+    with gzip.open(path, mode="wb") as gzip_file:
+        gzip_file.write(b"x" * (RECORD_LEN - 1))
+    with fc2archive.open_log(f"{path}/{LOG_NAME}") as reader:
+        assert len(reader) == 0
+        assert [bytes(block) for block in reader.blocks()] == [b""]
+        assert list(reader) == []
+
+def test_archive_opened_once(archived_log, monkeypatch):
+    opened = []
+    class CountingArchive(fc2archive.Archive):
+        def __init__(self, path):
+            opened.append(path)
+            super().__init__(path)
+    monkeypatch.setattr(fc2archive, "Archive", CountingArchive)
+    archive, member = fc2archive.split_path(archived_log)
+    for path in fc2archive.expand_paths([archive]):
+        assert fc2archive.exists(path)
+        fc2archive.log_stat(path)
+        with fc2archive.open_log(path) as reader:
+            reader.count
+            reader.record(1)
+            list(reader.blocks())
+    assert len(opened) == 1
+
+# Only a gzip file has to be decompressed for its size, and only once.
+def test_count_from_index(archived_log, monkeypatch):
+    reads = []
+    open_member = fc2archive.Archive.open
+    def counting_open(self, member):
+        reads.append(member)
+        return open_member(self, member)
+    monkeypatch.setattr(fc2archive.Archive, "open", counting_open)
+    with fc2archive.open_log(archived_log) as reader:
+        reader.count
+        reader.count
+    gzipped = fc2archive.archive_type(fc2archive.split_path(archived_log)[0]) == "gzip"
+    assert len(reads) == (1 if gzipped else 0)
+
+def test_changed_archive_opened_again(log_file, monkeypatch):
+    monkeypatch.setattr(fc2archive, "_archives", {})
+    path, member = make_archive("zip", log_file.parent, log_file)
+    assert len(fc2archive.members(str(path))) == 1 + len(OTHER_LOGS)
+    with zipfile.ZipFile(path, mode="a") as zip_file:
+        zip_file.writestr("logs/20250601150000.fc2", log_file.read_bytes())
+    os.utime(path, ns=(0, 0))
+    assert len(fc2archive.members(str(path))) == 2 + len(OTHER_LOGS)
+
+def test_missing_member(archived_log):
+    archive, member = fc2archive.split_path(archived_log)
+    assert not fc2archive.exists(f"{archive}/20250601160000.fc2")
+    with pytest.raises(FileNotFoundError):
+        fc2archive.open_log(f"{archive}/20250601160000.fc2")
+
+def test_find_logs(archived_log, log_file):
+    archive, member = fc2archive.split_path(archived_log)
+    found = fc2archive.find_logs(str(log_file.parent))
+    assert str(log_file) in found
+    assert archived_log in found
+    assert all(path.endswith(fc2archive.LOG_EXTENSION) for path in found)
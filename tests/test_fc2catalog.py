@@ -0,0 +1,34 @@
+'''
+fc2catalog summaries only check the fields the catalog stores.
+'''
+
+import math
+import struct
+import pytest
+import fc2catalog
+from conftest import needs_numpy
+
+pytestmark = needs_numpy
+
+RECORD_LEN = 512
+
+def damage(log_file, record, offset, value):
+    with open(log_file, mode="r+b") as flight_file:
+        flight_file.seek(record * RECORD_LEN + offset)
+        flight_file.write(value)
+
+def test_unstored_fields_not_checked(log_file):
+    before = fc2catalog.summarize_log(str(log_file))
+    # A NaN heading, which the catalog doesn't store.
+    damage(log_file, 150, 376, struct.pack("<f", math.nan))
+    after = fc2catalog.summarize_log(str(log_file))
+    assert after["bad_records"] == before["bad_records"]
+    assert after["summary"] == before["summary"]
+
+def test_stored_fields_checked(log_file):
+    before = fc2catalog.summarize_log(str(log_file))
+    # A NaN altitude.
+    damage(log_file, 150, 328, struct.pack("<f", math.nan))
+    after = fc2catalog.summarize_log(str(log_file))
+    assert after["bad_records"] == before["bad_records"] + 1
+    assert after["summary"]["records"] == before["summary"]["records"] - 1
@@ -0,0 +1,36 @@
+'''
+fc2health summaries of a synthetic flight: the motor states cover the whole
+flight, and only the fields health reads are checked.
+'''
+
+import struct
+import pytest
+import fc2health
+import fc2synth
+from conftest import needs_numpy
+
+pytestmark = needs_numpy
+
+RECORD_LEN = 512
+RECORDS = 2000
+
+@pytest.fixture
+def synthetic_log(tmp_path):
+    return fc2synth.write_synthetic(str(tmp_path), RECORDS)
+
+def test_motor_states_cover_whole_flight(synthetic_log):
+    flights = fc2health.summarize_log(synthetic_log)
+    assert len(flights) == 1
+    flight = flights[0]
+    # The motors are off for the last 4% of the log, after landing.
+    assert flight["Off (s)"] > 0
+    total = sum(flight[f"{state} (s)"] for state in fc2health.MOTOR_STATES)
+    assert total > flight["minutes"] * 60
+
+def test_only_health_fields_checked(synthetic_log):
+    before = fc2health.summarize_log(synthetic_log)
+    # A latitude far out of range, which health doesn't read.
+    with open(synthetic_log, mode="r+b") as log_file:
+        log_file.seek(1000 * RECORD_LEN + 47)
+        log_file.write(struct.pack("<i", 2_000_000_000))
+    assert fc2health.summarize_log(synthetic_log) == before
@@ -0,0 +1,96 @@
+'''
+The manifest behind --incremental: a log is only skipped if the log, the
+options that change the output and every output are all as they were.
+'''
+
+import os
+import pytest
+import fc2manifest
+from conftest import HAVE_NUMPY, expected, read_bytes, run_tool
+
+SKIPPED = "Skipping 1 unchanged logs."
+NOTHING_SKIPPED = "Skipping 0 unchanged logs."
+
+@pytest.fixture
+def manifest(log_file):
+    output = log_file.parent / "out.csv"
+    output.write_text("")
+    manifest = fc2manifest.Manifest(str(log_file.parent / fc2manifest.MANIFEST_NAME))
+    manifest.record(str(log_file), "v1", [str(output)], {"split": False})
+    return manifest, str(log_file), str(output)
+
+def test_unchanged_is_current(manifest):
+    manifest, log, output = manifest
+    assert manifest.is_current(log, "v1", [output], {"split": False})
+
+def test_saved_entries_are_current(manifest):
+    manifest, log, output = manifest
+    manifest.save()
+    again = fc2manifest.Manifest(manifest.path)
+    assert again.is_current(log, "v1", [output], {"split": False})
+
+def test_changed_options_are_not_current(manifest):
+    manifest, log, output = manifest
+    assert not manifest.is_current(log, "v1", [output], {"split": True})
+    assert not manifest.is_current(log, "v1", [output], {"split": False, "rate": 10.0})
+    assert not manifest.is_current(log, "v2", [output], {"split": False})
+
+def test_missing_output_is_not_current(manifest):
+    manifest, log, output = manifest
+    other = os.path.join(os.path.dirname(output), "out.gpx")
+    assert not manifest.is_current(log, "v1", [output, other], {"split": False})
+    os.remove(output)
+    assert not manifest.is_current(log, "v1", [output], {"split": False})
+
+def test_changed_log_is_not_current(manifest):
+    manifest, log, output = manifest
+    with open(log, mode="ab") as log_file:
+        log_file.write(bytes(512))
+    assert not manifest.is_current(log, "v1", [output], {"split": False})
+
+def convert(log_file, *args):
+    result = run_tool("csv_extractor.py", ["-i"] + list(args) + [log_file.name], log_file.parent, numpy=HAVE_NUMPY)
+    assert result.returncode == 0, result.stderr
+    return result.stdout + result.stderr
+
+def test_incremental_skips_unchanged(log_file):
+    assert NOTHING_SKIPPED in convert(log_file)
+    assert SKIPPED in convert(log_file)
+    assert read_bytes(log_file.with_suffix(".csv")) == expected("csv_extractor.py")
+
+def test_incremental_converts_new_sinks(log_file):
+    convert(log_file)
+    assert NOTHING_SKIPPED in convert(log_file, "-f", "csv,gpx")
+    assert log_file.with_suffix(".gpx").exists()
+    assert SKIPPED in convert(log_file, "-f", "csv,gpx")
+
+def test_incremental_converts_when_split_changes(log_file):
+    convert(log_file)
+    assert NOTHING_SKIPPED in convert(log_file, "-s")
+    assert log_file.with_suffix(".flights.json").exists()
+
+def test_incremental_converts_when_trim_changes(log_file):
+    convert(log_file, "-s")
+    assert NOTHING_SKIPPED in convert(log_file, "-s", "--trim")
+    assert SKIPPED in convert(log_file, "-s", "--trim")
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="resampling needs NumPy")
+def test_incremental_converts_when_rate_changes(log_file):
+    convert(log_file)
+    assert NOTHING_SKIPPED in convert(log_file, "-r", "5")
+    assert read_bytes(log_file.with_suffix(".csv")) != expected("csv_extractor.py")
+    assert SKIPPED in convert(log_file, "-r", "5")
+    assert NOTHING_SKIPPED in convert(log_file, "-r", "2")
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="derived fields need NumPy")
+def test_incremental_converts_when_derived_changes(log_file):
+    convert(log_file)
+    assert NOTHING_SKIPPED in convert(log_file, "-d")
+    headings = log_file.with_suffix(".csv").read_text().splitlines()[0]
+    assert "Power (w)" in headings
+    assert SKIPPED in convert(log_file, "-d")
+
+def test_incremental_converts_when_validation_changes(log_file):
+    convert(log_file)
+    assert NOTHING_SKIPPED in convert(log_file, "--no-validate")
+    assert SKIPPED in convert(log_file, "--no-validate")
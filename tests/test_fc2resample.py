@@ -0,0 +1,43 @@
+'''
+fc2resample keeps every flight of a log whose clock starts again, and a NaN
+angle only spoils the samples next to it.
+'''
+
+import math
+import csv_extractor
+import fc2resample
+from conftest import needs_numpy
+
+pytestmark = needs_numpy
+
+np = fc2resample.np
+
+FIELDS = {flfd.name: flfd for flfd in csv_extractor.ATOM2_FORMAT}
+SCHEMA = [FIELDS["elapsed (ms)"], FIELDS["alt (m)"], FIELDS["heading (deg)"]]
+
+# Two flights of 10 records 100 ms apart, the clock starting again for the
+# second one.
+def two_flights():
+    elapsed = np.concatenate([np.arange(0, 1000, 100), np.arange(0, 1000, 100)]).astype(np.uint64)
+    return {
+        "elapsed (ms)": elapsed,
+        "alt (m)": np.concatenate([np.linspace(0, 9, 10), np.linspace(100, 109, 10)]),
+        "heading (deg)": np.concatenate([np.full(10, 350.0), np.full(10, 10.0)]),
+    }
+
+def test_clock_restart_keeps_both_flights():
+    result = fc2resample.resample(SCHEMA, two_flights(), 20)
+    assert result["elapsed (ms)"].tolist() == list(range(0, 901, 50)) * 2
+    alt = result["alt (m)"]
+    assert alt[0] == 0 and alt[18] == 9
+    assert alt[19] == 100 and alt[-1] == 109
+    assert result["heading (deg)"].tolist() == [350.0] * 19 + [10.0] * 19
+
+def test_nan_angle_stays_local():
+    columns = two_flights()
+    columns["heading (deg)"][3] = np.nan
+    heading = fc2resample.resample(SCHEMA, columns, 20)["heading (deg)"]
+    nan = [n for n, value in enumerate(heading.tolist()) if math.isnan(value)]
+    # The samples at 250, 300 and 350 ms touch the NaN record.
+    assert nan == [5, 6, 7]
+    assert heading[8:19].tolist() == [350.0] * 11
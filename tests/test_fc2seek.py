@@ -0,0 +1,49 @@
+'''
+fc2seek finds every record inside a time window, even in a log whose clock
+restarts part way through, with or without NumPy.
+'''
+
+import struct
+import pytest
+import fc2decode
+import fc2reader
+import fc2seek
+from conftest import HAVE_NUMPY
+
+RECORD_LEN = 512
+RECORDS = 1000
+INTERVAL = 100
+
+# A log of blank records with only the elapsed time filled in, restarting
+# at record restart if given.
+def write_log(path, restart=None):
+    data = bytearray(RECORDS * RECORD_LEN)
+    for n in range(RECORDS):
+        elapsed = (n if restart == None or n < restart else n - restart) * INTERVAL
+        struct.pack_into("<Q", data, n * RECORD_LEN + fc2seek.ELAPSED_OFFSET, elapsed)
+    path.write_bytes(bytes(data))
+    return str(path)
+
+@pytest.fixture(params=[pytest.param(True, id="numpy", marks=pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")),
+                        pytest.param(False, id="python")])
+def engine(request, monkeypatch):
+    monkeypatch.setattr(fc2decode, "HAVE_NUMPY", request.param)
+    return request.param
+
+def window(fileName, start, end):
+    with fc2reader.FC2Reader(fileName) as reader:
+        with fc2seek.seek_window(reader, start, end) as found:
+            return list(found.records)
+
+def test_in_order(tmp_path, engine):
+    log = write_log(tmp_path / "20250601123045.fc2")
+    assert window(log, 30000, 40000) == list(range(300, 401))
+    assert window(log, None, 150) == [0, 1]
+    assert window(log, 99950, None) == []
+    assert window(log, -500, 0) == [0]
+
+def test_restarted_clock(tmp_path, engine):
+    log = write_log(tmp_path / "20250601123045.fc2", restart=500)
+    found = window(log, 30000, 40000)
+    assert found == list(range(300, 401)) + list(range(800, 901))
+    assert window(log, None, 100) == [0, 1, 500, 501]
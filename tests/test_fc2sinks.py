@@ -0,0 +1,49 @@
+'''
+The track sinks write valid XML and JSON whatever the log is called, and
+leave out altitudes that aren't numbers.
+'''
+
+import json
+import math
+import xml.etree.ElementTree as ElementTree
+import fc2sinks
+
+HEADINGS = [fc2sinks.LAT, fc2sinks.LON, fc2sinks.ALT, fc2sinks.ELAPSED]
+
+# Three points, one of them without an altitude, and one without a position.
+COLUMNS = {
+    fc2sinks.LAT: [51.5, 51.6, "", 51.7],
+    fc2sinks.LON: [-0.1, -0.2, "", -0.3],
+    fc2sinks.ALT: [10.0, math.nan, 12.0, 13.0],
+    fc2sinks.ELAPSED: [0, 100, 200, 300],
+}
+
+def write(sinkClass, tmp_path):
+    sink = sinkClass(str(tmp_path / "R&D <test>"), HEADINGS, 1748781045000)
+    sink.write(COLUMNS)
+    sink.close()
+    return sink.fileName
+
+def test_gpx(tmp_path):
+    root = ElementTree.parse(write(fc2sinks.GPXSink, tmp_path)).getroot()
+    ns = {"gpx": "http://www.topografix.com/GPX/1/1"}
+    assert root.find("gpx:trk/gpx:name", ns).text.endswith("R&D <test>.gpx")
+    points = root.findall("gpx:trk/gpx:trkseg/gpx:trkpt", ns)
+    assert [point.findtext("gpx:ele", None, ns) for point in points] == ["10.0", None, "13.0"]
+
+def test_kml(tmp_path):
+    root = ElementTree.parse(write(fc2sinks.KMLSink, tmp_path)).getroot()
+    ns = {"kml": "http://www.opengis.net/kml/2.2"}
+    placemark = root.find("kml:Document/kml:Placemark", ns)
+    assert placemark.findtext("kml:name", None, ns).endswith("R&D <test>.kml")
+    coordinates = placemark.findtext("kml:LineString/kml:coordinates", None, ns).split()
+    assert coordinates == ["-0.1,51.5,10.0", "-0.2,51.6", "-0.3,51.7,13.0"]
+
+def test_geojson(tmp_path, monkeypatch):
+    # Spool the times to disk after the first one.
+    monkeypatch.setattr(fc2sinks, "TIMES_SPOOL_BYTES", 30)
+    with open(write(fc2sinks.GeoJSONSink, tmp_path)) as geojson_file:
+        feature = json.load(geojson_file)["features"][0]
+    assert feature["geometry"]["coordinates"] == [[-0.1, 51.5, 10.0], [-0.2, 51.6], [-0.3, 51.7, 13.0]]
+    assert feature["properties"]["coordTimes"] == ["2025-06-01T12:30:45.000Z", "2025-06-01T12:30:45.100Z",
+                                                   "2025-06-01T12:30:45.300Z"]
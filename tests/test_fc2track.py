@@ -0,0 +1,48 @@
+'''
+fc2track gives the same simplified path and events on lists, without NumPy,
+as it does on NumPy arrays.
+'''
+
+import pytest
+import fc2decode
+import fc2flight
+import fc2track
+from conftest import HAVE_NUMPY
+
+def load(fileName):
+    with fc2flight.load_flight(str(fileName)) as flight:
+        track, marks = fc2track.load_track(flight)
+        tolerance, index = track.for_zoom(16, 50)
+        return {
+            "records": track.record_numbers(range(len(track))),
+            "ranks": [float(rank) for rank in track.rank],
+            "levels": {t: [int(i) for i in track.level(t)] for t in fc2track.LEVEL_TOLERANCES},
+            "zoom": (tolerance, track.points(index), track.record_numbers(index)),
+            "marks": marks,
+            "position": track.position(0),
+        }
+
+def test_python_track(log_file, monkeypatch):
+    monkeypatch.setattr(fc2decode, "HAVE_NUMPY", False)
+    track = load(log_file)
+    assert len(track["records"]) > 0
+    assert track["ranks"][0] == track["ranks"][-1] == float("inf")
+    assert [name for name, n, position in track["marks"]][:1] == ["take-off 1"]
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy to compare with")
+def test_python_track_matches_numpy(log_file, monkeypatch):
+    withNumpy = load(log_file)
+    monkeypatch.setattr(fc2decode, "HAVE_NUMPY", False)
+    withLists = load(log_file)
+    assert withLists["records"] == withNumpy["records"]
+    assert withLists["ranks"] == pytest.approx(withNumpy["ranks"])
+    assert withLists["levels"] == withNumpy["levels"]
+    assert withLists["zoom"] == withNumpy["zoom"]
+    assert withLists["marks"] == withNumpy["marks"]
+    assert withLists["position"] == withNumpy["position"]
+
+def test_concatenate_chunks(log_file):
+    with fc2flight.load_flight(str(log_file)) as flight:
+        parts = [columns[fc2track.LAT] for records, columns in flight.chunks([fc2track.LAT], 64)]
+        whole = fc2track.Track(fc2track.concatenate(parts), fc2track.concatenate(parts))
+        assert len(whole) == len(fc2track.Track(flight[fc2track.LAT], flight[fc2track.LAT]))
@@ -0,0 +1,69 @@
+'''
+fc2validate finds the same problems whether it works on NumPy arrays or on
+lists, and the list path is taken whenever fc2decode.HAVE_NUMPY is off, even
+if NumPy itself can be imported (as fc2bench does for its "python" engine).
+'''
+
+import math
+import struct
+import pytest
+import fc2decode
+import fc2flight
+import fc2validate
+from conftest import HAVE_NUMPY, LOG_RECORDS, run_tool
+
+RECORD_LEN = 512
+
+# (record, offset, bytes) of the damage done to the test log, and the
+# reason each record should be dropped for.
+DAMAGE = [
+    (150, 47, struct.pack("<i", 2_000_000_000), "lat (deg) is out of range"),
+    (160, 328, struct.pack("<f", math.nan), "alt (m) is not a number"),
+    (170, 5, struct.pack("<Q", 10**12), "elapsed (ms) is out of order"),
+]
+
+@pytest.fixture
+def damaged_log(log_file):
+    data = bytearray(log_file.read_bytes())
+    for record, offset, value, reason in DAMAGE:
+        pos = record * RECORD_LEN + offset
+        data[pos:pos + len(value)] = value
+    log_file.write_bytes(bytes(data))
+    return log_file
+
+def problems(fileName):
+    with fc2flight.load_flight(str(fileName)) as flight:
+        found = flight.problems()
+        return found.records(), found.summary(), list(found.good())
+
+@pytest.fixture(params=[pytest.param(True, id="numpy", marks=pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy")),
+                        pytest.param(False, id="python")])
+def engine(request, monkeypatch):
+    monkeypatch.setattr(fc2decode, "HAVE_NUMPY", request.param)
+    return request.param
+
+def test_finds_damage(damaged_log, engine):
+    records, summary, good = problems(damaged_log)
+    for record, offset, value, reason in DAMAGE:
+        assert reason in records[record]
+        assert not good[record]
+    assert sum(1 for flag in good if not flag) == len(DAMAGE)
+    assert len(good) == LOG_RECORDS
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="needs NumPy to compare with")
+def test_list_path_matches_numpy(damaged_log, monkeypatch):
+    withNumpy = problems(damaged_log)
+    monkeypatch.setattr(fc2decode, "HAVE_NUMPY", False)
+    withLists = problems(damaged_log)
+    assert withLists[0] == withNumpy[0]
+    assert withLists[1] == withNumpy[1]
+    assert [bool(flag) for flag in withNumpy[2]] == withLists[2]
+
+def test_bad_records_quarantined(damaged_log):
+    result = run_tool("csv_extractor.py", [damaged_log.name], damaged_log.parent, numpy=HAVE_NUMPY)
+    assert result.returncode == 0, result.stderr
+    lines = damaged_log.with_suffix(".csv").read_text().splitlines()
+    assert len(lines) == 1 + LOG_RECORDS - len(DAMAGE)
+    quarantine = (damaged_log.parent / f"{damaged_log.stem}{fc2validate.QUARANTINE_SUFFIX}").read_text()
+    for record, offset, value, reason in DAMAGE:
+        assert f"{record}, {record * RECORD_LEN}, dropped, " in quarantine